@@ -0,0 +1,100 @@
+"""Нагрузочный тест FSM-хранилищ: N одновременных диалогов /weather
+(start_point -> end_point -> forecast_interval -> clear) в одном или
+нескольких процессах, работающих с одним файлом SQLite
+
+    python -m benchmarks.bench_fsm_storage --conversations 1000 --workers 4
+"""
+from typing import Any
+import argparse
+import asyncio
+import multiprocessing
+import pathlib
+import tempfile
+import time
+
+from aiogram.fsm.storage.base import BaseStorage, StorageKey
+from aiogram.fsm.storage.memory import MemoryStorage
+
+from src.bot.bot import WeatherStates
+from src.bot.storage import SQLiteStorage
+
+
+BOT_ID = 1
+
+
+async def _conversation(storage: BaseStorage, chat_id: int) -> int:
+    key = StorageKey(bot_id=BOT_ID, chat_id=chat_id, user_id=chat_id)
+    operations = 0
+
+    await storage.set_state(key, WeatherStates.start_point)
+    assert await storage.get_state(key) == WeatherStates.start_point.state
+    await storage.update_data(key, {"start_point": "Москва"})
+    await storage.set_state(key, WeatherStates.end_point)
+    operations += 5
+
+    assert await storage.get_state(key) == WeatherStates.end_point.state
+    await storage.update_data(key, {"end_point": "Казань"})
+    await storage.set_state(key, WeatherStates.forecast_interval)
+    operations += 4
+
+    assert await storage.get_state(key) == WeatherStates.forecast_interval.state
+    data = await storage.get_data(key)
+    assert data == {"start_point": "Москва", "end_point": "Казань"}
+    await storage.set_state(key, None)
+    await storage.set_data(key, {})
+    operations += 4
+    return operations
+
+
+async def _run_conversations(storage: BaseStorage, chat_ids: range) -> tuple[int, float]:
+    started = time.perf_counter()
+    operations = sum(await asyncio.gather(*(_conversation(storage, chat_id) for chat_id in chat_ids)))
+    await storage.close()
+    return operations, time.perf_counter() - started
+
+
+def _worker(path: str, chat_ids: range, results: Any) -> None:
+    results.put(asyncio.run(_run_conversations(SQLiteStorage(path), chat_ids)))
+
+
+def _report(name: str, conversations: int, operations: int, seconds: float) -> None:
+    print(
+        f"{name:<22} {conversations:>7} conversations  "
+        f"{operations / seconds:12,.0f} ops/s  {conversations / seconds:10,.0f} conversations/s"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--conversations", type=int, default=1000)
+    parser.add_argument("--workers", type=int, default=4)
+    args = parser.parse_args()
+
+    operations, seconds = asyncio.run(_run_conversations(MemoryStorage(), range(args.conversations)))
+    _report("memory", args.conversations, operations, seconds)
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = str(pathlib.Path(directory) / "fsm.sqlite3")
+        operations, seconds = asyncio.run(_run_conversations(SQLiteStorage(path), range(args.conversations)))
+        _report("sqlite, 1 process", args.conversations, operations, seconds)
+
+        results: Any = multiprocessing.Queue()
+        per_worker = args.conversations // args.workers
+        processes = [
+            multiprocessing.Process(
+                target=_worker,
+                args=(path, range(args.conversations + i * per_worker, args.conversations + (i + 1) * per_worker), results),
+            )
+            for i in range(args.workers)
+        ]
+        started = time.perf_counter()
+        for process in processes:
+            process.start()
+        operations = sum(results.get()[0] for _ in processes)
+        for process in processes:
+            process.join()
+        _report(f"sqlite, {args.workers} processes", per_worker * args.workers, operations, time.perf_counter() - started)
+
+
+if __name__ == "__main__":
+    main()
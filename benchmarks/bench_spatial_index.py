@@ -0,0 +1,70 @@
+"""Сравнение SpatialIndex с линейным перебором на 100k точек
+
+    python -m benchmarks.bench_spatial_index
+"""
+import random
+import time
+
+from src.misc import types
+from src.misc.weather.spatial import SpatialIndex, haversine_km
+
+
+POINTS = 100_000
+QUERIES = 1_000
+RADIUS_KM = 25.0
+
+
+def _random_location(rng: random.Random) -> types.Location:
+    # Примерно территория России, чтобы плотность была похожа на реальную
+    return types.Location(lat=rng.uniform(42.0, 70.0), lon=rng.uniform(20.0, 180.0))
+
+
+def linear_nearest(locations: list[types.Location], query: types.Location) -> tuple[float, int]:
+    return min(
+        (haversine_km(query.lat, query.lon, location.lat, location.lon), i)
+        for i, location in enumerate(locations)
+    )
+
+
+def linear_within_radius(locations: list[types.Location], query: types.Location, radius_km: float) -> int:
+    return sum(
+        1 for location in locations
+        if haversine_km(query.lat, query.lon, location.lat, location.lon) <= radius_km
+    )
+
+
+def main() -> None:
+    rng = random.Random(42)
+    locations = [_random_location(rng) for _ in range(POINTS)]
+    queries = [_random_location(rng) for _ in range(QUERIES)]
+
+    started = time.perf_counter()
+    index = SpatialIndex.from_locations(locations)
+    print(f"build: {time.perf_counter() - started:.3f} s for {POINTS} points")
+
+    started = time.perf_counter()
+    indexed_nearest = [index.nearest(query, k=1)[0] for query in queries]
+    indexed_time = (time.perf_counter() - started) / QUERIES
+    print(f"nearest, index:  {indexed_time * 1e6:10.1f} us/query")
+
+    linear_queries = queries[:QUERIES // 20]
+    started = time.perf_counter()
+    linear_results = [linear_nearest(locations, query) for query in linear_queries]
+    linear_time = (time.perf_counter() - started) / len(linear_queries)
+    print(f"nearest, linear: {linear_time * 1e6:10.1f} us/query ({linear_time / indexed_time:.0f}x slower)")
+    assert [i for _, i in linear_results] == [i for _, i in indexed_nearest[:len(linear_queries)]]
+
+    started = time.perf_counter()
+    indexed_counts = [len(index.within_radius(query, RADIUS_KM)) for query in queries]
+    indexed_time = (time.perf_counter() - started) / QUERIES
+    print(f"radius {RADIUS_KM:.0f} km, index:  {indexed_time * 1e6:10.1f} us/query")
+
+    started = time.perf_counter()
+    linear_counts = [linear_within_radius(locations, query, RADIUS_KM) for query in linear_queries]
+    linear_time = (time.perf_counter() - started) / len(linear_queries)
+    print(f"radius {RADIUS_KM:.0f} km, linear: {linear_time * 1e6:10.1f} us/query ({linear_time / indexed_time:.0f}x slower)")
+    assert linear_counts == indexed_counts[:len(linear_queries)]
+
+
+if __name__ == "__main__":
+    main()
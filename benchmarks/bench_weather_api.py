@@ -0,0 +1,362 @@
+"""Офлайн-бенчмарки пути запроса погоды на фейковом AccuWeather
+(benchmarks.fake_accuweather): WeatherApiClient, sync_api.get_weather,
+колбэк update_weather_data для маршрутов из N городов и пакетная проверка
+WeatherModel. Ключ и квота AccuWeather не нужны
+
+Результаты (p50/p99, пропускная способность, число запросов к фейковому
+API) пишутся в JSON; --compare сравнивает с прошлым прогоном и завершается
+с кодом 1, если что-то стало хуже больше чем на --threshold
+
+    python -m benchmarks.bench_weather_api --output bench.json
+    python -m benchmarks.bench_weather_api --cities 2 8 16 --latency-ms 80 --error-rate 0.05
+    python -m benchmarks.bench_weather_api --output new.json --compare bench.json
+"""
+from __future__ import annotations
+from typing import Any, Awaitable, Callable, Optional
+import argparse
+import asyncio
+import dataclasses
+import datetime
+import json
+import os
+import pathlib
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import time
+
+from loguru import logger
+
+from benchmarks.fake_accuweather import FakeAccuWeather
+from src.misc import types
+from src.misc.weather import store as weather_store
+from src.misc.weather.api import WeatherApiClient
+from src.misc.weather.cache import ForecastCache, get_shared_cache
+from src.misc.weather.cities import Cities
+from src.misc.weather.model import WeatherModel
+from src.misc.weather.upstream import UpstreamPolicy
+
+
+FAKE_API_KEY = "0" * 32
+"""AccuWeather проверяет только длину ключа"""
+
+
+@dataclasses.dataclass
+class Result:
+    name: str
+    iterations: int
+    items: int
+    """Единиц работы за итерацию: городов маршрута, строк и т.п."""
+    p50_ms: float
+    p99_ms: float
+    mean_ms: float
+    throughput_per_s: float
+    """items в секунду"""
+    errors: int = 0
+    upstream_requests: int = 0
+    """Запросов к фейковому AccuWeather за все итерации"""
+
+
+def _summarize(
+    name: str, samples: list[float], items: int, errors: int=0, upstream_requests: int=0,
+) -> Result:
+    if len(samples) > 1:
+        percentiles = statistics.quantiles(samples, n=100, method="inclusive")
+        p50, p99 = percentiles[49], percentiles[98]
+    else:
+        p50 = p99 = samples[0]
+    return Result(
+        name=name,
+        iterations=len(samples),
+        items=items,
+        p50_ms=p50 * 1000,
+        p99_ms=p99 * 1000,
+        mean_ms=statistics.fmean(samples) * 1000,
+        throughput_per_s=items * len(samples) / sum(samples) if sum(samples) > 0 else 0.0,
+        errors=errors,
+        upstream_requests=upstream_requests,
+    )
+
+
+def _print_result(result: Result) -> None:
+    print(
+        f"{result.name:<44} p50 {result.p50_ms:9.2f} ms  p99 {result.p99_ms:9.2f} ms  "
+        f"{result.throughput_per_s:10.1f}/s  upstream {result.upstream_requests:5d}  errors {result.errors}"
+    )
+
+
+class Suite:
+    def __init__(self, fake: FakeAccuWeather, iterations: int, cities: list[int], rows: int) -> None:
+        self.fake = fake
+        self.iterations = iterations
+        self.cities = cities
+        self.rows = rows
+        self.results: list[Result] = []
+
+    def _add(self, result: Result) -> None:
+        _print_result(result)
+        self.results.append(result)
+
+    def _locations(self, n: int) -> list[types.Location]:
+        """Города из config.toml, а сверх них - случайные точки"""
+        locations = list(Cities._load_config().values())[:n]
+        rng = random.Random(n)
+        while len(locations) < n:
+            locations.append(types.Location(lat=rng.uniform(42.0, 70.0), lon=rng.uniform(20.0, 180.0)))
+        return locations
+
+    async def _measure_async(
+        self, name: str, items: int, call: Callable[[], Awaitable[int]],
+        before: Optional[Callable[[], None]]=None,
+    ) -> None:
+        """call возвращает число ошибок за итерацию"""
+        samples: list[float] = []
+        errors = 0
+        self.fake.reset_stats()
+        for _ in range(self.iterations):
+            if before is not None:
+                before()
+            started = time.perf_counter()
+            errors += await call()
+            samples.append(time.perf_counter() - started)
+        self._add(_summarize(name, samples, items, errors, sum(self.fake.requests.values())))
+
+    def _measure(
+        self, name: str, items: int, call: Callable[[], int],
+        before: Optional[Callable[[], None]]=None,
+    ) -> None:
+        samples: list[float] = []
+        errors = 0
+        self.fake.reset_stats()
+        for _ in range(self.iterations):
+            if before is not None:
+                before()
+            started = time.perf_counter()
+            errors += call()
+            samples.append(time.perf_counter() - started)
+        self._add(_summarize(name, samples, items, errors, sum(self.fake.requests.values())))
+
+    async def bench_client(self) -> None:
+        upstream = UpstreamPolicy(base_url=self.fake.base_url)
+        uncached = WeatherApiClient(logger=logger, upstream=upstream)
+        cache = ForecastCache()
+        cached = WeatherApiClient(logger=logger, cache=cache, upstream=upstream)
+        try:
+            for n in self.cities:
+                locations = self._locations(n)
+
+                def route(client: WeatherApiClient, days: int) -> Callable[[], Awaitable[int]]:
+                    async def call() -> int:
+                        results = await client.get_weather_for_locations(locations, days=days)
+                        return sum(result.error is not None for result in results)
+                    return call
+
+                await self._measure_async(f"client/current/no_cache/{n}", n, route(uncached, 1))
+                await self._measure_async(f"client/forecast5/no_cache/{n}", n, route(uncached, 5))
+                await self._measure_async(
+                    f"client/forecast5/cold_cache/{n}", n, route(cached, 5), before=cache.clear,
+                )
+                await route(cached, 5)()
+                await self._measure_async(f"client/forecast5/warm_cache/{n}", n, route(cached, 5))
+        finally:
+            await uncached.close()
+            await cached.close()
+
+    def bench_sync_api(self) -> None:
+        from src.site import sync_api
+
+        location = self._locations(1)[0]
+        shared_cache = get_shared_cache()
+
+        def get_weather(days: int) -> Callable[[], int]:
+            def call() -> int:
+                try:
+                    sync_api.get_weather(location, days=days)
+                except Exception:
+                    return 1
+                return 0
+            return call
+
+        sync_api.start()
+        try:
+            self._measure("sync_api/get_weather/current/cold", 1, get_weather(1), before=shared_cache.clear)
+            self._measure("sync_api/get_weather/forecast5/cold", 1, get_weather(5), before=shared_cache.clear)
+            self._measure("sync_api/get_weather/forecast5/warm", 1, get_weather(5))
+        finally:
+            sync_api.shutdown()
+
+    def bench_update_weather_data(self) -> None:
+        # src.site.app как атрибут пакета - это объект Dash, а не модуль
+        from src.site.app import route_memo, update_weather_data
+        from src.site import sync_api
+
+        names = list(Cities._load_config())
+        shared_cache = get_shared_cache()
+        memo_ttl = route_memo.ttl
+
+        sync_api.start()
+        try:
+            for n in self.cities:
+                if not 2 <= n <= len(names):
+                    print(f"update_weather_data/{n}: маршрут из {n} городов не собрать из config.toml, пропуск")
+                    continue
+                route = names[:n]
+
+                def call() -> int:
+                    error_message, _ = update_weather_data(
+                        1, route[0], route[-1], ",".join(route[1:-1]),
+                    )
+                    return int(bool(error_message))
+
+                route_memo.ttl = 0
+                self._measure(f"update_weather_data/cold/{n}", n, call, before=shared_cache.clear)
+                self._measure(f"update_weather_data/warm_cache/{n}", n, call)
+                route_memo.ttl = memo_ttl
+                self._measure(f"update_weather_data/memo/{n}", n, call)
+        finally:
+            route_memo.ttl = memo_ttl
+            sync_api.shutdown()
+
+    def bench_model(self) -> None:
+        rng = random.Random(42)
+        texts = ["Ясно", "Облачно", "Гроза", "Небольшой дождь", "Снег", "Град"]
+        phrases = ["Приятно", "Прохладно", "Очень холодно", "Сыро"]
+        weather = [
+            types.Weather(
+                weather_text=rng.choice(texts),
+                temperature_c=rng.uniform(-10.0, 40.0),
+                real_feel_temperature_phrase=rng.choice(phrases),
+                humidity=rng.uniform(0.0, 100.0),
+                wind_speed_km_h=rng.uniform(0.0, 70.0),
+                precipitation_metric_mm=rng.uniform(0.0, 10.0),
+                is_precipitation=rng.random() < 0.3,
+            )
+            for _ in range(self.rows)
+        ]
+        frame = WeatherModel.weather_to_frame(weather)
+
+        def batch() -> int:
+            WeatherModel.check_bad_weather_batch(frame)
+            return 0
+
+        def per_row() -> int:
+            for item in weather:
+                WeatherModel.check_bad_weather(item)
+            return 0
+
+        self._measure(f"model/check_bad_weather_batch/{self.rows}", self.rows, batch)
+        self._measure(f"model/check_bad_weather/{self.rows}", self.rows, per_row)
+
+
+def _git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True, text=True, check=True,
+            cwd=pathlib.Path(__file__).parent,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(baseline: dict[str, Any], results: list[Result], threshold: float) -> bool:
+    """Напечатать изменения относительно baseline
+
+    Returns:
+        bool: Есть ли регрессии больше threshold
+    """
+    previous = {item["name"]: item for item in baseline.get("results", [])}
+    regressed = False
+    print(f"\nСравнение с {baseline.get('meta', {}).get('git_revision') or 'baseline'}")
+    for result in results:
+        old = previous.get(result.name)
+        if old is None:
+            continue
+        p50 = result.p50_ms / old["p50_ms"] - 1 if old["p50_ms"] else 0.0
+        p99 = result.p99_ms / old["p99_ms"] - 1 if old["p99_ms"] else 0.0
+        throughput = result.throughput_per_s / old["throughput_per_s"] - 1 if old["throughput_per_s"] else 0.0
+        worse = p50 > threshold or p99 > threshold or throughput < -threshold
+        regressed |= worse
+        print(
+            f"{result.name:<44} p50 {p50:+7.1%}  p99 {p99:+7.1%}  throughput {throughput:+7.1%}"
+            + ("  РЕГРЕССИЯ" if worse else "")
+        )
+    return regressed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=20)
+    parser.add_argument("--cities", type=int, nargs="+", default=[2, 8, 16], help="Длины маршрутов")
+    parser.add_argument("--rows", type=int, default=10_000, help="Строк для WeatherModel")
+    parser.add_argument("--latency-ms", type=float, default=50.0)
+    parser.add_argument("--jitter-ms", type=float, default=20.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--quota-error-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--only", nargs="+", choices=["client", "sync_api", "site", "model"])
+    parser.add_argument("--output", type=pathlib.Path, help="Куда записать результаты в JSON")
+    parser.add_argument("--compare", type=pathlib.Path, help="JSON прошлого прогона")
+    parser.add_argument("--threshold", type=float, default=0.1, help="Допустимое ухудшение, доля")
+    args = parser.parse_args()
+    only = set(args.only or ["client", "sync_api", "site", "model"])
+
+    fake = FakeAccuWeather(
+        latency=args.latency_ms / 1000,
+        jitter=args.jitter_ms / 1000,
+        error_rate=args.error_rate,
+        quota_error_rate=args.quota_error_rate,
+        seed=args.seed,
+    )
+    # Только фейковый API: настоящий ключ из .env сюда не попадает
+    os.environ["ACCUWEATHER_API_KEY"] = FAKE_API_KEY
+    os.environ["ACCUWEATHER_BASE_URL"] = fake.start()
+    # Без персистентного хранилища: бенчмарк не должен читать и портить
+    # forecasts.sqlite3 рядом с config.toml
+    weather_store._shared_store_loaded = True
+    weather_store._shared_store = None
+
+    suite = Suite(fake, iterations=args.iterations, cities=args.cities, rows=args.rows)
+    try:
+        if "client" in only:
+            asyncio.run(suite.bench_client())
+        if "sync_api" in only:
+            suite.bench_sync_api()
+        if "site" in only:
+            suite.bench_update_weather_data()
+        if "model" in only:
+            suite.bench_model()
+    finally:
+        fake.stop()
+
+    report = {
+        "meta": {
+            "created_at": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+            "git_revision": _git_revision(),
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "iterations": args.iterations,
+            "fake_accuweather": {
+                "latency_ms": args.latency_ms,
+                "jitter_ms": args.jitter_ms,
+                "error_rate": args.error_rate,
+                "quota_error_rate": args.quota_error_rate,
+                "seed": args.seed,
+            },
+        },
+        "results": [dataclasses.asdict(result) for result in suite.results],
+    }
+    if args.output is not None:
+        args.output.write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding="utf-8")
+        print(f"\nРезультаты записаны в {args.output}")
+
+    if args.compare is not None:
+        baseline = json.loads(args.compare.read_text(encoding="utf-8"))
+        if compare(baseline, suite.results, args.threshold):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
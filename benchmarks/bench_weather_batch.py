@@ -0,0 +1,128 @@
+"""Память и скорость обхода большого набора прогнозов: список обычных
+dataclass-объектов Weather (как до slots=True), список слотовых Weather и
+колоночный WeatherBatch
+
+    python -m benchmarks.bench_weather_batch
+"""
+import dataclasses
+import gc
+import random
+import time
+import tracemalloc
+from typing import Any, Callable
+
+from src.misc import types
+from src.misc.weather.model import WeatherModel
+
+
+LOCATIONS = 20_000
+DAYS = 5
+
+_TEXTS = ["Ясно", "Облачно", "Гроза", "Небольшой дождь", "Снег", "Штормовой ветер", "Град"]
+_PHRASES = ["Приятно", "Прохладно", "Очень холодно", "Сыро", "Жарко"]
+
+
+@dataclasses.dataclass
+class DictWeather:
+    """types.Weather до перехода на slots=True, frozen=True"""
+    weather_text: str
+    temperature_c: float
+    real_feel_temperature_phrase: str
+    humidity: float
+    wind_speed_km_h: float
+    precipitation_metric_mm: float
+    is_precipitation: bool
+
+
+def _random_fields(rng: random.Random) -> dict[str, Any]:
+    # Строки как из JSON-ответа: у каждой записи свой объект str
+    return dict(
+        weather_text="".join(rng.choice(_TEXTS)),
+        temperature_c=rng.uniform(-10.0, 40.0),
+        real_feel_temperature_phrase="".join(rng.choice(_PHRASES)),
+        humidity=rng.uniform(0.0, 100.0),
+        wind_speed_km_h=rng.uniform(0.0, 70.0),
+        precipitation_metric_mm=rng.uniform(0.0, 10.0),
+        is_precipitation=rng.random() < 0.3,
+    )
+
+
+def _measure(name: str, build: Callable[[], Any]) -> Any:
+    gc.collect()
+    tracemalloc.start()
+    value = build()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{name:<32} {size / 2**20:8.2f} MiB")
+    return value
+
+
+def _timed(name: str, call: Callable[[], Any], repeat: int=5) -> Any:
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = call()
+        best = min(best, time.perf_counter() - started)
+    print(f"{name:<32} {best * 1000:8.2f} ms")
+    return result
+
+
+def main() -> None:
+    rng = random.Random(42)
+    rows = [
+        (types.Location(lat=rng.uniform(-60, 70), lon=rng.uniform(-180, 180)), day, _random_fields(rng))
+        for _ in range(LOCATIONS)
+        for day in range(DAYS)
+    ]
+    print(f"{len(rows):,} прогнозов\n")
+
+    print("Память")
+    dict_weather = _measure("list[Weather] без slots", lambda: [
+        DictWeather(**dict(fields)) for _, _, fields in rows
+    ])
+    slot_weather = _measure("list[Weather] slots/frozen", lambda: [
+        types.Weather(**dict(fields)) for _, _, fields in rows
+    ])
+
+    def build_batch() -> types.WeatherBatch:
+        batch = types.WeatherBatch()
+        for (location, day, _), weather in zip(rows, slot_weather):
+            batch.append(weather, location=location, day=day)
+        return batch
+
+    batch = _measure("WeatherBatch", build_batch)
+
+    print("\nТри колонки величин (как для графика)")
+    _timed("list[Weather] без slots", lambda: (
+        [w.temperature_c for w in dict_weather],
+        [w.wind_speed_km_h for w in dict_weather],
+        [w.precipitation_metric_mm for w in dict_weather],
+    ))
+    _timed("list[Weather] slots/frozen", lambda: (
+        [w.temperature_c for w in slot_weather],
+        [w.wind_speed_km_h for w in slot_weather],
+        [w.precipitation_metric_mm for w in slot_weather],
+    ))
+    _timed("WeatherBatch", lambda: (
+        batch.temperature_c.tolist(),
+        batch.wind_speed_km_h.tolist(),
+        batch.precipitation_metric_mm.tolist(),
+    ))
+
+    print("\nСредняя температура")
+    expected = _timed("list[Weather] slots/frozen", lambda: sum(w.temperature_c for w in slot_weather) / len(slot_weather))
+    actual = _timed("WeatherBatch.to_numpy", lambda: float(batch.to_numpy()["temperature_c"].mean()))
+    assert abs(expected - actual) < 1e-6
+
+    print("\nDataFrame для check_bad_weather_batch")
+    frame = _timed("weather_to_frame(list)", lambda: WeatherModel.weather_to_frame(slot_weather))
+    frame["lat"] = [location.lat for location, _, _ in rows]
+    frame["lon"] = [location.lon for location, _, _ in rows]
+    batch_frame = _timed("WeatherBatch.to_pandas", batch.to_pandas)
+    expected_mask = _timed("правила по weather_to_frame", lambda: WeatherModel.check_bad_weather_batch(frame)[0])
+    batch_mask = _timed("правила по WeatherBatch", lambda: WeatherModel.check_bad_weather_batch(batch_frame)[0])
+    assert expected_mask.tolist() == batch_mask.tolist()
+
+
+if __name__ == "__main__":
+    main()
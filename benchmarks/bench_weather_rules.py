@@ -0,0 +1,90 @@
+"""Пропускная способность правил плохой погоды: исходная функция с
+захардкоженными порогами против скомпилированного RuleSet и векторной
+проверки через pandas
+
+    python -m benchmarks.bench_weather_rules
+"""
+import random
+import time
+
+from src.misc import types
+from src.misc.weather.model import WeatherModel
+from src.misc.weather.rules import WeatherRules
+
+
+CELLS = 50_000
+
+_TEXTS = ["Ясно", "Облачно", "Гроза", "Небольшой дождь", "Снег", "Штормовой ветер", "Град"]
+_PHRASES = ["Приятно", "Прохладно", "Очень холодно", "Сыро", "Жарко"]
+
+
+def baseline_check_bad_weather(weather: types.Weather) -> bool:
+    """Реализация WeatherModel.check_bad_weather до вынесения правил в конфиг"""
+    if not 0 <= weather.temperature_c < 35:
+        return True
+    if weather.wind_speed_km_h > 50:
+        return True
+    bad_weather_keywords = ["гром", "шторм", "град"]
+    if any(keyword.lower() in weather.weather_text.lower()
+           for keyword in bad_weather_keywords):
+        return True
+    if weather.is_precipitation and weather.precipitation_metric_mm > 5:
+        return True
+    bad_feel_keywords = ["очень", "сыро"]
+    if any(bad_feel_keyword in weather.real_feel_temperature_phrase.lower()
+           for bad_feel_keyword in bad_feel_keywords):
+        return True
+    return False
+
+
+def _random_weather(rng: random.Random) -> types.Weather:
+    return types.Weather(
+        weather_text=rng.choice(_TEXTS),
+        temperature_c=rng.uniform(-10.0, 40.0),
+        real_feel_temperature_phrase=rng.choice(_PHRASES),
+        humidity=rng.uniform(0.0, 100.0),
+        wind_speed_km_h=rng.uniform(0.0, 70.0),
+        precipitation_metric_mm=rng.uniform(0.0, 10.0),
+        is_precipitation=rng.random() < 0.3,
+    )
+
+
+def _report(name: str, seconds: float) -> None:
+    print(f"{name:<28} {CELLS / seconds:12,.0f} cells/s")
+
+
+def main() -> None:
+    rng = random.Random(42)
+    cells = [_random_weather(rng) for _ in range(CELLS)]
+    rules = WeatherRules.get().default
+
+    started = time.perf_counter()
+    expected = [baseline_check_bad_weather(weather) for weather in cells]
+    _report("baseline function", time.perf_counter() - started)
+
+    started = time.perf_counter()
+    compiled = [rules.is_bad(weather) for weather in cells]
+    _report("compiled RuleSet", time.perf_counter() - started)
+
+    # То, что вызывают бот и сайт: с поиском правил через WeatherRules.get
+    started = time.perf_counter()
+    checked = [WeatherModel.check_bad_weather(weather) for weather in cells]
+    _report("check_bad_weather", time.perf_counter() - started)
+
+    started = time.perf_counter()
+    reasons = [rules.evaluate(weather) for weather in cells]
+    _report("compiled RuleSet, reasons", time.perf_counter() - started)
+
+    frame = WeatherModel.weather_to_frame(cells)
+    started = time.perf_counter()
+    mask, _ = WeatherModel.check_bad_weather_batch(frame)
+    _report("vectorized batch", time.perf_counter() - started)
+
+    assert compiled == expected
+    assert checked == expected
+    assert [bool(fired) for fired in reasons] == expected
+    assert mask.tolist() == expected
+
+
+if __name__ == "__main__":
+    main()
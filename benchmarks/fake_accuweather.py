@@ -0,0 +1,291 @@
+"""Локальный фейковый AccuWeather: отдаёт записанные ответы из
+benchmarks/recordings с настраиваемой задержкой и внедрением ошибок.
+Клиент направляется на него через [upstream] base_url или переменную
+окружения ACCUWEATHER_BASE_URL
+
+    python -m benchmarks.fake_accuweather --port 8090 --latency-ms 80 --error-rate 0.05
+"""
+from __future__ import annotations
+from typing import Any, Optional
+import argparse
+import asyncio
+import collections
+import copy
+import json
+import pathlib
+import random
+import re
+import threading
+import time
+import zlib
+
+from aiohttp import web
+
+
+RECORDINGS_DIR = pathlib.Path(__file__).parent / "recordings"
+
+REQUESTS_EXCEEDED = "The allowed number of requests has been exceeded."
+
+_DAILY_PATH = re.compile(r"^forecasts/v1/daily/(\d+)day/([^/]+)$")
+_HOURLY_PATH = re.compile(r"^forecasts/v1/hourly/(\d+)hour/([^/]+)$")
+_CURRENT_PATH = re.compile(r"^currentconditions/v1/([^/]+)$")
+_GEOPOSITION_PATH = "locations/v1/cities/geoposition/search"
+
+
+class FakeAccuWeather:
+    """aiohttp-сервер с эндпоинтами AccuWeather, которые использует
+    WeatherApiClient: geoposition, current conditions, дневной и почасовой
+    прогноз. Ответы - записанные из recordings_dir; температура сдвигается
+    на постоянную для ключа локации величину, чтобы точки различались, а
+    время почасового прогноза - к ближайшему следующему часу
+
+    Запускается в своём потоке со своим event loop, так что годится и для
+    клиента на текущем loop, и для sync_api с фоновым loop
+
+    Кроме случайных ошибок, в ответы можно подставить заданные заранее
+    (fail_next) - для тестов повторов и circuit breaker
+    """
+
+    FAULT_ERROR = "error"
+    """503, временная ошибка"""
+    FAULT_QUOTA = "quota"
+    """503 с сообщением об исчерпанной квоте"""
+    FAULT_INVALID_KEY = "invalid_key"
+    """401, неверный ключ"""
+    FAULT_BAD_REQUEST = "bad_request"
+    """400, некорректный запрос"""
+    FAULT_NOT_FOUND = "not_found"
+    """404, неизвестная локация"""
+    FAULT_TIMEOUT = "timeout"
+    """Ответ задерживается на hang секунд"""
+    FAULTS = (FAULT_ERROR, FAULT_QUOTA, FAULT_INVALID_KEY, FAULT_BAD_REQUEST, FAULT_NOT_FOUND, FAULT_TIMEOUT)
+
+    def __init__(
+        self,
+        latency: float=0.05,
+        jitter: float=0.0,
+        error_rate: float=0.0,
+        quota_error_rate: float=0.0,
+        recordings_dir: pathlib.Path=RECORDINGS_DIR,
+        seed: Optional[int]=None,
+        hang: float=5.0,
+    ) -> None:
+        """
+        Args:
+            latency: Задержка каждого ответа, секунды
+            jitter: Случайная добавка к задержке от 0 до jitter, секунды
+            error_rate: Доля ответов 503 (временная ошибка, клиент повторяет)
+            quota_error_rate: Доля ответов "квота исчерпана"
+            recordings_dir: Каталог с записанными ответами
+            seed: Зерно генератора задержек и ошибок
+            hang: Задержка ответа для FAULT_TIMEOUT, секунды
+        """
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.quota_error_rate = quota_error_rate
+        self.hang = hang
+        self._rng = random.Random(seed)
+        self._faults: collections.deque[str] = collections.deque()
+
+        self._geoposition = self._read(recordings_dir / "geoposition.json")
+        self._current = self._read(recordings_dir / "currentconditions.json")
+        self._daily = self._read(recordings_dir / "daily_5day.json")
+        self._hourly = self._read(recordings_dir / "hourly_12hour.json")
+
+        self.requests: dict[str, int] = {}
+        """Обслуженные запросы по эндпоинту, включая ответы с ошибкой"""
+        self.errors: dict[str, int] = {}
+        self._stats_lock = threading.Lock()
+
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._runner: Optional[web.AppRunner] = None
+        self.base_url = ""
+
+    @staticmethod
+    def _read(path: pathlib.Path) -> Any:
+        with open(path, "r", encoding="utf-8") as file:
+            return json.load(file)
+
+    def _app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_get("/{path:.*}", self._handle)
+        return app
+
+    def start(self, host: str="127.0.0.1", port: int=0) -> str:
+        """Запустить сервер в фоновом потоке
+
+        Returns:
+            str: base_url для UpstreamPolicy
+        """
+        loop = asyncio.new_event_loop()
+        thread = threading.Thread(target=loop.run_forever, name="fake-accuweather", daemon=True)
+        thread.start()
+        self._loop, self._thread = loop, thread
+        port = asyncio.run_coroutine_threadsafe(self._serve(host, port), loop).result()
+        self.base_url = f"http://{host}:{port}/"
+        return self.base_url
+
+    async def _serve(self, host: str, port: int) -> int:
+        # Клиент, не дождавшийся ответа, отменяет обработчик (FAULT_TIMEOUT)
+        self._runner = web.AppRunner(self._app(), access_log=None, handler_cancellation=True)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, host=host, port=port).start()
+        return self._runner.addresses[0][1]
+
+    def stop(self) -> None:
+        loop, thread, runner = self._loop, self._thread, self._runner
+        self._loop = self._thread = self._runner = None
+        if loop is None or thread is None:
+            return
+        if runner is not None:
+            asyncio.run_coroutine_threadsafe(runner.cleanup(), loop).result(timeout=5.0)
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join(timeout=5.0)
+        if not thread.is_alive():
+            loop.close()
+
+    def __enter__(self) -> FakeAccuWeather:
+        self.start()
+        return self
+
+    def __exit__(self, *_exc_info: Any) -> None:
+        self.stop()
+
+    @property
+    def total_requests(self) -> int:
+        with self._stats_lock:
+            return sum(self.requests.values())
+
+    def reset_stats(self) -> None:
+        with self._stats_lock:
+            self.requests.clear()
+            self.errors.clear()
+            self._faults.clear()
+
+    def fail_next(self, fault: str, count: int=1) -> None:
+        """Ответить на следующие count запросов (к любому эндпоинту) ошибкой
+        fault - одной из FAULTS
+        """
+        if fault not in self.FAULTS:
+            raise ValueError(f"Unknown fault {fault!r}, expected one of {self.FAULTS}")
+        with self._stats_lock:
+            self._faults.extend([fault] * count)
+
+    def _next_fault(self) -> Optional[str]:
+        with self._stats_lock:
+            return self._faults.popleft() if self._faults else None
+
+    def _count(self, counter: dict[str, int], endpoint: str) -> None:
+        with self._stats_lock:
+            counter[endpoint] = counter.get(endpoint, 0) + 1
+
+    async def _handle(self, request: web.Request) -> web.Response:
+        path = request.match_info["path"]
+        endpoint, payload = self._route(path, request.query)
+        if endpoint is None:
+            return web.json_response({"Code": "ResourceNotFound", "Message": path}, status=404)
+        self._count(self.requests, endpoint)
+
+        fault = self._next_fault()
+        if fault is not None:
+            return await self._fault(fault, endpoint)
+
+        delay = self.latency + (self._rng.uniform(0.0, self.jitter) if self.jitter > 0 else 0.0)
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+        roll = self._rng.random()
+        if roll < self.quota_error_rate:
+            self._count(self.errors, endpoint)
+            return web.json_response({"Code": "ServiceUnavailable", "Message": REQUESTS_EXCEEDED}, status=503)
+        if roll < self.quota_error_rate + self.error_rate:
+            self._count(self.errors, endpoint)
+            return web.json_response({"Code": "ServiceUnavailable", "Message": "Injected error"}, status=503)
+        return web.json_response(payload, headers={"RateLimit-Remaining": "1000"})
+
+    async def _fault(self, fault: str, endpoint: str) -> web.Response:
+        self._count(self.errors, endpoint)
+        if fault == self.FAULT_TIMEOUT:
+            await asyncio.sleep(self.hang)
+            return web.json_response({"Code": "ServiceUnavailable", "Message": "Timed out"}, status=503)
+        if fault == self.FAULT_QUOTA:
+            return web.json_response({"Code": "ServiceUnavailable", "Message": REQUESTS_EXCEEDED}, status=503)
+        if fault == self.FAULT_INVALID_KEY:
+            return web.json_response({"Code": "Unauthorized", "Message": "Api Authorization failed"}, status=401)
+        if fault == self.FAULT_BAD_REQUEST:
+            return web.json_response({"Code": "400", "Message": "Invalid request"}, status=400)
+        if fault == self.FAULT_NOT_FOUND:
+            return web.json_response({"Code": "ResourceNotFound", "Message": "Location not found"}, status=404)
+        return web.json_response({"Code": "ServiceUnavailable", "Message": "Injected error"}, status=503)
+
+    def _route(self, path: str, query: Any) -> tuple[Optional[str], Any]:
+        if path == _GEOPOSITION_PATH:
+            geoposition = copy.deepcopy(self._geoposition)
+            geoposition["Key"] = str(zlib.crc32(query.get("q", "").encode()))
+            return "geoposition", geoposition
+        if match := _CURRENT_PATH.match(path):
+            current = copy.deepcopy(self._current)
+            offset = self._offset(match.group(1))
+            for item in current:
+                item["Temperature"]["Metric"]["Value"] += offset
+            return "currentconditions", current
+        if match := _DAILY_PATH.match(path):
+            days, location_key = int(match.group(1)), match.group(2)
+            daily = copy.deepcopy(self._daily)
+            forecasts = daily["DailyForecasts"]
+            daily["DailyForecasts"] = [copy.deepcopy(forecasts[day % len(forecasts)]) for day in range(days)]
+            offset = self._offset(location_key)
+            for forecast in daily["DailyForecasts"]:
+                for bound in ("Minimum", "Maximum"):
+                    forecast["Temperature"][bound]["Value"] += offset
+            return "daily", daily
+        if match := _HOURLY_PATH.match(path):
+            hours, location_key = int(match.group(1)), match.group(2)
+            offset = self._offset(location_key)
+            first_hour = (int(time.time()) // 3600 + 1) * 3600
+            hourly = []
+            for hour in range(hours):
+                forecast = copy.deepcopy(self._hourly[hour % len(self._hourly)])
+                forecast["EpochDateTime"] = first_hour + hour * 3600
+                forecast["Temperature"]["Value"] += offset
+                hourly.append(forecast)
+            return "hourly", hourly
+        return None, None
+
+    @staticmethod
+    def _offset(location_key: str) -> float:
+        """Постоянный для ключа локации сдвиг температуры, -10..+10 °C"""
+        return zlib.crc32(location_key.encode()) % 201 / 10.0 - 10.0
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8090)
+    parser.add_argument("--latency-ms", type=float, default=50.0)
+    parser.add_argument("--jitter-ms", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--quota-error-rate", type=float, default=0.0)
+    parser.add_argument("--recordings", type=pathlib.Path, default=RECORDINGS_DIR)
+    args = parser.parse_args()
+
+    fake = FakeAccuWeather(
+        latency=args.latency_ms / 1000,
+        jitter=args.jitter_ms / 1000,
+        error_rate=args.error_rate,
+        quota_error_rate=args.quota_error_rate,
+        recordings_dir=args.recordings,
+    )
+    print(f"Fake AccuWeather on {fake.start(args.host, args.port)}, Ctrl+C to stop")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        fake.stop()
+
+
+if __name__ == "__main__":
+    main()
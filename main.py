@@ -1,10 +1,24 @@
-import asyncio
+import argparse
 
 from src import app
 
 
 def main() -> None:
-    app.run(debug=True)
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "mode", nargs="?", choices=["dev", "site", "bot"], default="dev",
+        help="dev - сайт на отладочном сервере и бот в одном процессе; "
+             "site - сайт на gunicorn ([server] в config.toml); bot - только бот",
+    )
+    parser.add_argument("--no-debug", action="store_true", help="Без отладки Dash в режиме dev")
+    args = parser.parse_args()
+
+    if args.mode == "site":
+        app.run_site()
+    elif args.mode == "bot":
+        app.run_bot()
+    else:
+        app.run(debug=not args.no_debug)
 
 
 if __name__ == "__main__":
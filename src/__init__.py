@@ -1,21 +1,110 @@
+from typing import Callable
 import threading
 import asyncio
+import signal
 
-from src import site
-from src.bot import bot
+from loguru import logger
+
+# Сайт и бот импортируются в своих режимах: бот отдельно не должен
+# собирать приложение Dash, а сайт на gunicorn - бота
 
 
 class app:
+    BOT_SHUTDOWN_TIMEOUT = 10.0
+
+    @staticmethod
+    def _run_site(debug: bool, on_exit: Callable[[], None]) -> None:
+        from src import site
+
+        try:
+            site.app.run(debug=debug, use_reloader=False)
+        except Exception:
+            logger.exception("Dash site crashed")
+        finally:
+            on_exit()
+
+    @staticmethod
+    def _stop_on_signals(loop: asyncio.AbstractEventLoop, stop_event: asyncio.Event) -> None:
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(signum, stop_event.set)
+            except NotImplementedError:
+                # Windows: остаётся KeyboardInterrupt
+                pass
+
     @staticmethod
-    def _run_site(debug: bool) -> None:
-        site.app.run(debug=debug, use_reloader=False)
+    async def _supervise(debug: bool) -> None:
+        """Сайт в отдельном потоке и бот на текущем loop до SIGINT/SIGTERM
+        или остановки сайта. Падение бота сайт не останавливает
+        """
+        from src.bot import bot
+        from src.site import sync_api
+
+        loop = asyncio.get_running_loop()
+        stop_event = asyncio.Event()
+        app._stop_on_signals(loop, stop_event)
+
+        def on_site_exit() -> None:
+            loop.call_soon_threadsafe(stop_event.set)
+
+        try:
+            sync_api.start()
+        except Exception:
+            logger.exception("Failed to start weather API loop")
+
+        threading.Thread(
+            target=app._run_site,
+            args=(debug, on_site_exit),
+            name="dash-site",
+            daemon=True,
+        ).start()
+
+        bot_task = asyncio.create_task(bot.run(stop_event=stop_event))
+        bot_task.add_done_callback(app._log_bot_exit)
+
+        await stop_event.wait()
+        if not bot_task.done():
+            try:
+                await asyncio.wait_for(bot_task, timeout=app.BOT_SHUTDOWN_TIMEOUT)
+            except Exception:
+                pass
+
+    @staticmethod
+    def _log_bot_exit(task: asyncio.Task) -> None:
+        if not task.cancelled() and task.exception() is not None:
+            logger.opt(exception=task.exception()).error("Telegram bot stopped")
 
     @staticmethod
     def run(debug: bool) -> None:
-        threading.Thread(target=app._run_site, args=(debug,), daemon=True).start()
+        """Сайт на отладочном сервере Flask и бот в одном процессе"""
+        from src.site import sync_api
+
+        try:
+            asyncio.run(app._supervise(debug))
+        except KeyboardInterrupt:
+            return
+        finally:
+            sync_api.shutdown()
+
+    @staticmethod
+    async def _run_bot() -> None:
+        from src.bot import bot
+
+        stop_event = asyncio.Event()
+        app._stop_on_signals(asyncio.get_running_loop(), stop_event)
+        await bot.run(stop_event=stop_event)
+
+    @staticmethod
+    def run_bot() -> None:
+        """Только бот, до SIGINT/SIGTERM"""
         try:
-            asyncio.run(bot.run())
+            asyncio.run(app._run_bot())
         except KeyboardInterrupt:
             return
-        except: pass
-        while 1: pass
+
+    @staticmethod
+    def run_site() -> None:
+        """Только сайт на gunicorn с воркерами из [server]"""
+        from src.site.server import ProductionServer
+
+        ProductionServer.from_config().run()
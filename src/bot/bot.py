@@ -1,4 +1,4 @@
-from typing import Any
+from typing import Any, Optional
 import os
 import asyncio
 
@@ -7,15 +7,32 @@ from aiogram.filters import Command
 from aiogram import Router
 from aiogram import Bot, Dispatcher, types
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton, BotCommand, BotCommandScopeDefault
+from aiogram.fsm.storage.base import BaseStorage
 from aiogram.fsm.storage.memory import MemoryStorage
 from aiogram.fsm.state import State, StatesGroup
 from aiogram.fsm.context import FSMContext
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
+from aiohttp import web
+from loguru import logger
+
+from src.bot.middleware import HandlerTimingMiddleware
+from src.bot.storage import SQLiteStorage
+from src.bot.webhook import BoundedWebhookHandler
+from src.misc import metrics
+from src.misc.config import Config
+from src.misc.types import Location, Weather
+from src.misc.weather.api import WeatherApiClient
+from src.misc.weather.cities import Cities
+from src.misc.weather.model import WeatherModel
 
 
 dotenv.load_dotenv(dotenv.find_dotenv())
 
 
 router = Router()
+router.message.middleware(HandlerTimingMiddleware("message"))
+router.callback_query.middleware(HandlerTimingMiddleware("callback_query"))
 
 class WeatherStates(StatesGroup):
     start_point = State()
@@ -69,35 +86,182 @@ async def process_end_point(message: types.Message, state: FSMContext) -> None:
     await state.set_state(WeatherStates.forecast_interval)
     await message.answer("Выберите временной интервал прогноза:", reply_markup=inline_kb)
 
+FORECAST_INTERVALS = {
+    "forecast_3d": 3,
+    "forecast_7d": 7,
+}
+
+
+def _format_point_report(
+    title: str, city: str, weather: list[Weather], location: Location,
+    stale_age: Optional[float]=None,
+) -> str:
+    lines = [f"{title}: {city}"]
+    if stale_age is not None:
+        lines.append(WeatherModel.generate_stale_notice(stale_age))
+    for day, day_weather in enumerate(weather, start=1):
+        mark = "👎" if WeatherModel.check_bad_weather(day_weather, location) else "👍"
+        lines.append(f"\nДень {day}: {mark}")
+        lines.append(WeatherModel.generate_weather_report_text(day_weather))
+    return "\n".join(lines)
+
 @router.callback_query(WeatherStates.forecast_interval)
-async def process_forecast_interval(callback_query: types.CallbackQuery, state: FSMContext) -> None:
-    intervals = {
-        "forecast_3d": "Прогноз на 3 дня",
-        "forecast_7d": "Прогноз на неделю",
-    }
-    forecast = intervals.get(str(callback_query.data), "Неизвестный интервал!")
+async def process_forecast_interval(
+    callback_query: types.CallbackQuery, state: FSMContext,
+    weather_api_client: WeatherApiClient,
+) -> None:
+    # Сразу снимаем "часики" с кнопки, прогноз придёт отдельным сообщением
+    await callback_query.answer()
+
+    days = FORECAST_INTERVALS.get(str(callback_query.data))
+    if days is None:
+        await callback_query.message.answer("Неизвестный интервал!") # type: ignore
+        return
 
     data = await state.get_data()
-    start_point = data.get("start_point")
-    end_point = data.get("end_point")
-
-    response = (
-        f"Ваш запрос для прогноза:\n"
-        f"Начальная точка: {start_point}\n"
-        f"Конечная точка: {end_point}\n"
-        f"{forecast}"
+    await state.clear()
+    points = [
+        ("Начальная точка", str(data.get("start_point", "")).strip()),
+        ("Конечная точка", str(data.get("end_point", "")).strip()),
+    ]
+
+    locations: list[Location] = []
+    for _, city in points:
+        location = Cities.city_to_location(city)
+        if location is None:
+            response = f"Город \"{city}\" не найден"
+            suggestions = Cities.suggest(city)
+            if suggestions:
+                response += f". Возможно, имелось в виду: {', '.join(suggestions)}"
+            await callback_query.message.answer(response + "\nПопробуйте снова: /weather") # type: ignore
+            return
+        locations.append(location)
+
+    results = await weather_api_client.get_weather_for_locations(
+        locations=locations,
+        days=min(days, WeatherApiClient.FORECAST_DAYS),
     )
-    await callback_query.message.answer(response) # type: ignore
-    await callback_query.answer()
 
-    await state.clear()
+    reports: list[str] = []
+    for (title, city), result in zip(points, results):
+        if result.error is not None:
+            logger.warning(f"Failed to fetch forecast for {city}: {result.error}")
+            reports.append(f"{title}: {city}\nНе удалось получить прогноз: {result.error}")
+            continue
+        reports.append(_format_point_report(title, city, result.weather, result.location, result.stale_age))
+
+    header = f"Прогноз на {days} дн."
+    if days > WeatherApiClient.FORECAST_DAYS:
+        header += f" (доступно {WeatherApiClient.FORECAST_DAYS} дн.)"
+    await callback_query.message.answer("\n\n".join([header] + reports)) # type: ignore
+
+async def _run_polling(dp: Dispatcher, bot: Bot, stop_event: asyncio.Event) -> None:
+    polling = asyncio.create_task(dp.start_polling(bot, handle_signals=False))
+    stopping = asyncio.create_task(stop_event.wait())
+    try:
+        await asyncio.wait({polling, stopping}, return_when=asyncio.FIRST_COMPLETED)
+        if not polling.done():
+            await dp.stop_polling()
+        await polling
+    finally:
+        stopping.cancel()
+
+async def _run_webhook(
+    dp: Dispatcher, bot: Bot, stop_event: asyncio.Event, config: dict[str, Any],
+) -> None:
+    webhook_url = config.get("webhook_url")
+    if not webhook_url:
+        raise RuntimeError("[bot] webhook_url must be set in config.toml for webhook mode")
+    secret_token = os.getenv("BOT_WEBHOOK_SECRET") or None
+
+    handler = BoundedWebhookHandler(
+        dispatcher=dp,
+        bot=bot,
+        max_concurrent_updates=config.get("max_concurrent_updates", 64),
+        backpressure_timeout=config.get("backpressure_timeout", 5.0),
+        secret_token=secret_token,
+    )
+    app = web.Application()
+    handler.register(app, config.get("webhook_path", "/telegram"))
+    app.router.add_get(Config.section("metrics").get("path", "/metrics"), _render_metrics)
+
+    runner = web.AppRunner(app)
+    await runner.setup()
+    in_flight = metrics.REGISTRY.callback(
+        "bot_webhook_updates_in_flight",
+        "Апдейты, принятые по вебхуку и ещё обрабатываемые",
+        metrics.read_value(lambda: handler.in_flight),
+    )
+    try:
+        await web.TCPSite(
+            runner,
+            host=config.get("webhook_host", "0.0.0.0"),
+            port=config.get("webhook_port", 8081),
+        ).start()
+        await bot.set_webhook(
+            url=webhook_url,
+            secret_token=secret_token,
+            allowed_updates=dp.resolve_used_update_types(),
+            max_connections=min(100, handler.max_concurrent_updates),
+        )
+        await dp.emit_startup(bot=bot)
+        try:
+            await stop_event.wait()
+        finally:
+            await bot.delete_webhook()
+            await dp.emit_shutdown(bot=bot)
+    finally:
+        await runner.cleanup()
+        await handler.close()
+        # Колбэк держит handler этого запуска; при перезапуске в том же
+        # процессе регистрируется заново
+        metrics.REGISTRY.unregister(in_flight)
+
+async def _render_metrics(_request: web.Request) -> web.Response:
+    return web.Response(
+        text=metrics.REGISTRY.render(),
+        headers={"Content-Type": metrics.CONTENT_TYPE},
+    )
+
+def _create_storage(config: dict[str, Any]) -> BaseStorage:
+    storage = config.get("storage", "memory")
+    if storage == "memory":
+        return MemoryStorage()
+    if storage == "sqlite":
+        return SQLiteStorage(
+            path=Config.path().parent / config.get("storage_path", "fsm.sqlite3"),
+            state_ttl=config.get("state_ttl", 24 * 3600.0),
+        )
+    raise RuntimeError(f"Unknown [bot] storage {storage!r}, expected \"memory\" or \"sqlite\"")
+
+async def run(stop_event: Optional[asyncio.Event] = None) -> None:
+    """Запустить бота в режиме [bot] mode из config.toml ("polling" или
+    "webhook") до установки stop_event
+    """
+    config = Config.section("bot")
+    stop_event = stop_event or asyncio.Event()
 
-async def run() -> None:
-    bot = Bot(token=os.getenv("BOT_TOKEN", ""))
+    session: Optional[AiohttpSession] = None
+    if config.get("telegram_api_url"):
+        # Например, локальный фейковый Telegram для тестов
+        session = AiohttpSession(api=TelegramAPIServer.from_base(config["telegram_api_url"]))
+    bot = Bot(token=os.getenv("BOT_TOKEN", ""), session=session)
+    weather_api_client = WeatherApiClient.from_config(logger=logger)
     dp = Dispatcher(
         bot=bot,
-        storage=MemoryStorage(),
+        storage=_create_storage(config),
     )
+    # Один клиент и одна сессия на все апдейты; попадает в хендлеры
+    # аргументом weather_api_client
+    dp["weather_api_client"] = weather_api_client
     dp.include_router(router)
-    await set_default_commands(bot)
-    await dp.start_polling(bot)
+    try:
+        await set_default_commands(bot)
+        if config.get("mode", "polling") == "webhook":
+            await _run_webhook(dp, bot, stop_event, config)
+        else:
+            await _run_polling(dp, bot, stop_event)
+    finally:
+        await weather_api_client.close()
+        await dp.storage.close()
+        await bot.session.close()
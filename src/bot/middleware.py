@@ -0,0 +1,40 @@
+from typing import Any, Awaitable, Callable
+import time
+
+from aiogram import BaseMiddleware
+from aiogram.dispatcher.event.handler import HandlerObject
+from aiogram.types import TelegramObject
+
+from src.misc import metrics
+
+
+class HandlerTimingMiddleware(BaseMiddleware):
+    """Внутренняя middleware роутера: длительность каждого обработчика в
+    bot_handler_seconds с типом события, именем обработчика и результатом
+    """
+
+    def __init__(self, event: str) -> None:
+        self.event = event
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: dict[str, Any],
+    ) -> Any:
+        handler_object = data.get("handler")
+        name = (
+            getattr(handler_object.callback, "__name__", "unknown")
+            if isinstance(handler_object, HandlerObject) else "unknown"
+        )
+        status = "error"
+        started = time.perf_counter()
+        try:
+            result = await handler(event, data)
+            status = "ok"
+            return result
+        finally:
+            metrics.BOT_HANDLER_SECONDS.observe(
+                time.perf_counter() - started,
+                event=self.event, handler=name, status=status,
+            )
@@ -0,0 +1,120 @@
+from __future__ import annotations
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Mapping, Optional, TypeVar
+import asyncio
+import json
+import pathlib
+import sqlite3
+import time
+
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, StateType, StorageKey
+
+
+T = TypeVar("T")
+
+
+class SQLiteStorage(BaseStorage):
+    """FSM-хранилище aiogram в SQLite (WAL): состояние диалогов переживает
+    рестарт и общее для нескольких процессов бота на одной машине
+
+    Запись сквозная: set_state и set_data возвращаются после коммита, так
+    что следующий апдейт того же чата, попавший в другой процесс, уже видит
+    новое состояние. В WAL с synchronous=NORMAL коммит не ждёт fsync.
+    Диалоги, не обновлявшиеся state_ttl секунд, считаются пустыми и
+    периодически удаляются
+    """
+
+    VACUUM_INTERVAL = 60.0
+
+    def __init__(
+        self, path: pathlib.Path | str,
+        state_ttl: float=24 * 3600.0,
+    ) -> None:
+        self.path = pathlib.Path(path)
+        self.state_ttl = state_ttl
+
+        # Одно соединение, все обращения к нему - из одного потока
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="fsm-sqlite")
+        self._connection: Optional[sqlite3.Connection] = None
+        self._executor.submit(self._connect).result()
+        self._last_vacuum = 0.0
+
+    def _connect(self) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        connection = sqlite3.connect(self.path, timeout=30.0, isolation_level=None)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        connection.execute(
+            "CREATE TABLE IF NOT EXISTS fsm ("
+            " key TEXT PRIMARY KEY,"
+            " state TEXT,"
+            " data TEXT NOT NULL DEFAULT '{}',"
+            " updated_at REAL NOT NULL)"
+        )
+        connection.execute("CREATE INDEX IF NOT EXISTS fsm_updated_at ON fsm (updated_at)")
+        self._connection = connection
+
+    async def _run(self, call: Callable[[], T]) -> T:
+        return await asyncio.get_running_loop().run_in_executor(self._executor, call)
+
+    @staticmethod
+    def _key(key: StorageKey) -> str:
+        return ":".join(map(str, (
+            key.bot_id, key.chat_id, key.user_id, key.thread_id,
+            key.business_connection_id, key.destiny,
+        )))
+
+    def _write(self, key: str, column: str, value: Optional[str]) -> None:
+        assert self._connection is not None
+        now = time.time()
+        connection = self._connection
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            connection.execute(
+                f"INSERT INTO fsm (key, {column}, updated_at) VALUES (?, ?, ?)"
+                f" ON CONFLICT (key) DO UPDATE SET {column} = excluded.{column}, updated_at = excluded.updated_at",
+                (key, value, now),
+            )
+            # Завершённые диалоги (state.clear()) не храним
+            connection.execute("DELETE FROM fsm WHERE key = ? AND state IS NULL AND data = '{}'", (key,))
+            if now - self._last_vacuum >= self.VACUUM_INTERVAL:
+                connection.execute("DELETE FROM fsm WHERE updated_at < ?", (now - self.state_ttl,))
+                self._last_vacuum = now
+            connection.execute("COMMIT")
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+
+    def _read(self, key: str) -> Optional[tuple[Optional[str], str]]:
+        assert self._connection is not None
+        return self._connection.execute(
+            "SELECT state, data FROM fsm WHERE key = ? AND updated_at >= ?",
+            (key, time.time() - self.state_ttl),
+        ).fetchone()
+
+    async def set_state(self, key: StorageKey, state: StateType=None) -> None:
+        storage_key = self._key(key)
+        value = state.state if isinstance(state, State) else state
+        await self._run(lambda: self._write(storage_key, "state", value))
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        storage_key = self._key(key)
+        row = await self._run(lambda: self._read(storage_key))
+        return row[0] if row is not None else None
+
+    async def set_data(self, key: StorageKey, data: Mapping[str, Any]) -> None:
+        storage_key = self._key(key)
+        value = json.dumps(dict(data), ensure_ascii=False)
+        await self._run(lambda: self._write(storage_key, "data", value))
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        storage_key = self._key(key)
+        row = await self._run(lambda: self._read(storage_key))
+        return json.loads(row[1]) if row is not None else {}
+
+    async def close(self) -> None:
+        if self._connection is not None:
+            await self._run(self._connection.close)
+            self._connection = None
+        self._executor.shutdown(wait=True)
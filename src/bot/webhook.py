@@ -0,0 +1,84 @@
+from typing import Optional
+import asyncio
+import json
+
+from aiohttp import web
+from aiogram import Bot, Dispatcher
+from aiogram.types import Update
+from loguru import logger
+
+
+SECRET_TOKEN_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+
+class BoundedWebhookHandler:
+    """Приём апдейтов Telegram по вебхуку с ограничением числа одновременно
+    обрабатываемых апдейтов. Апдейт подтверждается сразу, а обрабатывается в
+    фоне; если все max_concurrent_updates слотов заняты дольше
+    backpressure_timeout, отвечаем 429 и Telegram доставит апдейт повторно
+    """
+
+    def __init__(
+        self, dispatcher: Dispatcher, bot: Bot,
+        max_concurrent_updates: int=64,
+        backpressure_timeout: float=5.0,
+        secret_token: Optional[str]=None,
+    ) -> None:
+        if max_concurrent_updates < 1:
+            raise ValueError("max_concurrent_updates must be >= 1")
+
+        self.dispatcher = dispatcher
+        self.bot = bot
+        self.max_concurrent_updates = max_concurrent_updates
+        self.backpressure_timeout = backpressure_timeout
+        self.secret_token = secret_token
+
+        self._slots = asyncio.Semaphore(max_concurrent_updates)
+        self._tasks: set[asyncio.Task] = set()
+
+    @property
+    def in_flight(self) -> int:
+        return len(self._tasks)
+
+    def register(self, app: web.Application, path: str) -> None:
+        app.router.add_post(path, self.handle)
+
+    async def handle(self, request: web.Request) -> web.Response:
+        if (self.secret_token is not None
+                and request.headers.get(SECRET_TOKEN_HEADER) != self.secret_token):
+            return web.Response(status=401)
+
+        try:
+            raw_update = await request.json()
+        except json.JSONDecodeError:
+            return web.Response(status=400)
+
+        try:
+            await asyncio.wait_for(self._slots.acquire(), timeout=self.backpressure_timeout)
+        except TimeoutError:
+            logger.warning(f"Webhook backpressure: {self.max_concurrent_updates} updates in flight")
+            return web.Response(status=429, headers={"Retry-After": "1"})
+
+        try:
+            update = Update.model_validate(raw_update, context={"bot": self.bot})
+        except Exception:
+            self._slots.release()
+            return web.Response(status=400)
+
+        task = asyncio.create_task(self._process(update))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return web.Response()
+
+    async def _process(self, update: Update) -> None:
+        try:
+            await self.dispatcher.feed_update(self.bot, update)
+        except Exception:
+            logger.exception(f"Failed to process update {update.update_id}")
+        finally:
+            self._slots.release()
+
+    async def close(self, timeout: float=10.0) -> None:
+        """Дождаться обработки уже принятых апдейтов"""
+        if self._tasks:
+            await asyncio.wait(set(self._tasks), timeout=timeout)
@@ -0,0 +1,60 @@
+from typing import Any, Optional
+import pathlib
+import sys
+import threading
+import time
+
+import tomli
+
+
+class Config:
+    """Общий доступ к config.toml: файл читается один раз и перечитывается
+    только при изменении mtime. mtime проверяется не чаще раза в
+    RECHECK_INTERVAL секунд, чтобы горячие пути (правила погоды, реестр
+    городов) не делали stat на каждый вызов
+    """
+
+    RECHECK_INTERVAL = 1.0
+
+    _lock = threading.Lock()
+    _cached: Optional[tuple[float, dict[str, Any]]] = None
+    _checked_at = float("-inf")
+
+    @staticmethod
+    def path() -> pathlib.Path:
+        return (pathlib.Path(sys.path[0]) / "config.toml").resolve()
+
+    @staticmethod
+    def load() -> dict[str, Any]:
+        cached = Config._cached
+        now = time.monotonic()
+        if cached is not None and now - Config._checked_at < Config.RECHECK_INTERVAL:
+            return cached[1]
+
+        config_file_path = Config.path()
+        try:
+            mtime = config_file_path.stat().st_mtime
+        except FileNotFoundError:
+            raise RuntimeError("config.toml config file not exists")
+
+        with Config._lock:
+            Config._checked_at = now
+            if Config._cached is not None and Config._cached[0] == mtime:
+                return Config._cached[1]
+
+            with open(config_file_path, "r", encoding="utf-8") as file:
+                raw_config = tomli.loads(file.read())
+            Config._cached = (mtime, raw_config)
+            return raw_config
+
+    @staticmethod
+    def reload() -> dict[str, Any]:
+        """Проверить mtime config.toml немедленно, не дожидаясь RECHECK_INTERVAL"""
+        with Config._lock:
+            Config._checked_at = float("-inf")
+        return Config.load()
+
+    @staticmethod
+    def section(name: str) -> dict[str, Any]:
+        """Секция config.toml; пустой dict, если секции нет"""
+        return dict(Config.load().get(name, {}))
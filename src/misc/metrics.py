@@ -0,0 +1,249 @@
+"""Метрики процесса в текстовом формате Prometheus
+
+Счётчики и гистограммы потокобезопасны и общие для сайта и бота в одном
+процессе; render() отдаёт их для /metrics. Метрики, которые уже считаются
+в другом месте (например, CacheStats), подключаются через callback
+"""
+from __future__ import annotations
+from contextlib import contextmanager
+from typing import Callable, Iterator, Sequence
+import bisect
+import math
+import threading
+import time
+
+
+LabelValues = tuple[str, ...]
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str="") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric:
+    TYPE = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str]=()) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: dict[str, str]) -> LabelValues:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def header(self) -> list[str]:
+        return [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.TYPE}",
+        ]
+
+    def render(self) -> list[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    TYPE = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str]=()) -> None:
+        super().__init__(name, documentation, labelnames)
+        self._values: dict[LabelValues, float] = {}
+
+    def inc(self, amount: float=1.0, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels: str) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0.0)
+
+    def render(self) -> list[str]:
+        with self._lock:
+            values = list(self._values.items())
+        return self.header() + [
+            f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+            for key, value in values
+        ]
+
+
+class Histogram(_Metric):
+    TYPE = "histogram"
+
+    def __init__(
+        self, name: str, documentation: str, labelnames: Sequence[str]=(),
+        buckets: Sequence[float]=DEFAULT_BUCKETS,
+    ) -> None:
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # По меткам: счётчики попаданий в бакеты (без кумуляции), сумма
+        self._counts: dict[LabelValues, list[int]] = {}
+        self._sums: dict[LabelValues, float] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        bucket = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts = self._counts.get(key)
+            if counts is None:
+                counts = self._counts[key] = [0] * (len(self.buckets) + 1)
+                self._sums[key] = 0.0
+            counts[bucket] += 1
+            self._sums[key] += value
+
+    @contextmanager
+    def time(self, **labels: str) -> Iterator[None]:
+        """Замерить длительность блока, в том числе завершившегося ошибкой"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def render(self) -> list[str]:
+        with self._lock:
+            snapshot = [(key, list(counts), self._sums[key]) for key, counts in self._counts.items()]
+        lines = self.header()
+        for key, counts, total in snapshot:
+            cumulative = 0
+            for upper, count in zip(self.buckets + (math.inf,), counts):
+                cumulative += count
+                le = f'le="{_format_value(upper)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class CallbackMetric(_Metric):
+    """Значение, которое уже считается в другом месте: читается при render"""
+
+    def __init__(
+        self, name: str, documentation: str, read: Callable[[], dict[LabelValues, float]],
+        labelnames: Sequence[str]=(), kind: str="gauge",
+    ) -> None:
+        super().__init__(name, documentation, labelnames)
+        self.TYPE = kind
+        self._read = read
+
+    def render(self) -> list[str]:
+        return self.header() + [
+            f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+            for key, value in self._read().items()
+        ]
+
+
+class Registry:
+    def __init__(self) -> None:
+        self._metrics: dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric: _Metric) -> _Metric:
+        """Зарегистрировать метрику; повторная регистрация с тем же именем
+        заменяет прежнюю (например, при пересоздании кэша)
+        """
+        with self._lock:
+            self._metrics[metric.name] = metric
+        return metric
+
+    def unregister(self, metric: _Metric) -> None:
+        """Убрать метрику, если её ещё не заменили другой с тем же именем"""
+        with self._lock:
+            if self._metrics.get(metric.name) is metric:
+                del self._metrics[metric.name]
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str]=()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))  # type: ignore[return-value]
+
+    def histogram(
+        self, name: str, documentation: str, labelnames: Sequence[str]=(),
+        buckets: Sequence[float]=DEFAULT_BUCKETS,
+    ) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))  # type: ignore[return-value]
+
+    def callback(
+        self, name: str, documentation: str, read: Callable[[], dict[LabelValues, float]],
+        labelnames: Sequence[str]=(), kind: str="gauge",
+    ) -> CallbackMetric:
+        return self.register(CallbackMetric(name, documentation, read, labelnames, kind))  # type: ignore[return-value]
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines: list[str] = []
+        for metric in metrics:
+            try:
+                lines.extend(metric.render())
+            except Exception:
+                # Одна сломанная метрика не должна ронять весь /metrics
+                continue
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+UPSTREAM_REQUESTS = REGISTRY.counter(
+    "weather_upstream_requests_total",
+    "Запросы к AccuWeather по эндпоинту и результату",
+    ("endpoint", "status"),
+)
+UPSTREAM_LATENCY = REGISTRY.histogram(
+    "weather_upstream_request_seconds",
+    "Длительность запросов к AccuWeather вместе с повторами",
+    ("endpoint",),
+)
+UPSTREAM_RETRIES = REGISTRY.counter(
+    "weather_upstream_retries_total",
+    "Повторы запросов к AccuWeather после временных ошибок",
+)
+STORE_READS = REGISTRY.counter(
+    "weather_store_reads_total",
+    "Обращения к персистентному хранилищу при промахе кэша",
+    ("kind", "result"),
+)
+CITY_LOOKUPS = REGISTRY.counter(
+    "city_lookups_total",
+    "Поиск городов по названию",
+    ("result",),
+)
+ROUTE_MEMO_LOOKUPS = REGISTRY.counter(
+    "site_route_memo_lookups_total",
+    "Обращения к кэшу отрисованных маршрутов сайта",
+    ("result",),
+)
+CALLBACK_SECONDS = REGISTRY.histogram(
+    "site_callback_seconds",
+    "Длительность колбэков Dash по этапам (total - целиком)",
+    ("callback", "phase"),
+)
+BOT_HANDLER_SECONDS = REGISTRY.histogram(
+    "bot_handler_seconds",
+    "Длительность обработчиков бота",
+    ("event", "handler", "status"),
+)
+
+
+def read_value(value: Callable[[], float]) -> Callable[[], dict[LabelValues, float]]:
+    """read для CallbackMetric без меток: одно значение счётчика или gauge"""
+    return lambda: {(): float(value())}
+
@@ -1 +1,2 @@
 from .types import *
+from .batch import *
@@ -0,0 +1,170 @@
+from __future__ import annotations
+from array import array
+from typing import TYPE_CHECKING, Iterable, Iterator, Optional, overload
+import math
+
+from .types import Location, Weather, WeatherResult
+
+if TYPE_CHECKING:
+    import numpy as np
+    import pandas as pd
+
+
+__all__ = ["WeatherBatch"]
+
+
+class WeatherBatch:
+    """Колоночное хранилище большого числа прогнозов: по массиву array на
+    каждую величину и общая таблица интернированных строк для текстовых
+    полей вместо отдельного объекта Weather на строку
+
+    to_numpy и to_pandas не копируют числовые колонки, а смотрят в буферы
+    массивов. Пока такие представления живы, append в батч бросает
+    BufferError (array нельзя перевыделить с экспортированным буфером)
+    """
+
+    FLOAT_COLUMNS = (
+        "temperature_c",
+        "humidity",
+        "wind_speed_km_h",
+        "precipitation_metric_mm",
+        "lat",
+        "lon",
+    )
+    TEXT_COLUMNS = (
+        "weather_text",
+        "real_feel_temperature_phrase",
+    )
+
+    ARRAY_COLUMNS = FLOAT_COLUMNS + TEXT_COLUMNS + ("is_precipitation", "day")
+
+    __slots__ = ARRAY_COLUMNS + ("texts", "_text_ids")
+
+    def __init__(self) -> None:
+        self.temperature_c = array("d")
+        self.humidity = array("d")
+        self.wind_speed_km_h = array("d")
+        self.precipitation_metric_mm = array("d")
+        self.lat = array("d")
+        """Координаты прогноза; NaN, если неизвестны"""
+        self.lon = array("d")
+        self.weather_text = array("I")
+        """Индексы в texts"""
+        self.real_feel_temperature_phrase = array("I")
+        """Индексы в texts"""
+        self.is_precipitation = array("B")
+        self.day = array("H")
+        """Индекс дня прогноза"""
+        self.texts: list[str] = []
+        """Различные строки текстовых колонок, по индексам из них"""
+        self._text_ids: dict[str, int] = {}
+
+    @classmethod
+    def from_weather(
+        cls, weather: Iterable[Weather], location: Optional[Location]=None,
+    ) -> WeatherBatch:
+        """Батч из прогнозов по дням для одной точки (или без координат)"""
+        batch = cls()
+        for day, item in enumerate(weather):
+            batch.append(item, location=location, day=day)
+        return batch
+
+    @classmethod
+    def from_results(cls, results: Iterable[WeatherResult]) -> WeatherBatch:
+        """Батч из результатов WeatherApiClient.get_weather_for_locations;
+        результаты с ошибкой пропускаются
+        """
+        batch = cls()
+        for result in results:
+            for day, item in enumerate(result.weather):
+                batch.append(item, location=result.location, day=day)
+        return batch
+
+    def _intern(self, text: str) -> int:
+        text_id = self._text_ids.get(text)
+        if text_id is None:
+            text_id = self._text_ids[text] = len(self.texts)
+            self.texts.append(text)
+        return text_id
+
+    def append(self, weather: Weather, location: Optional[Location]=None, day: int=0) -> None:
+        self.temperature_c.append(weather.temperature_c)
+        self.humidity.append(weather.humidity)
+        self.wind_speed_km_h.append(weather.wind_speed_km_h)
+        self.precipitation_metric_mm.append(weather.precipitation_metric_mm)
+        self.lat.append(location.lat if location is not None else math.nan)
+        self.lon.append(location.lon if location is not None else math.nan)
+        self.weather_text.append(self._intern(weather.weather_text))
+        self.real_feel_temperature_phrase.append(self._intern(weather.real_feel_temperature_phrase))
+        self.is_precipitation.append(bool(weather.is_precipitation))
+        self.day.append(day)
+
+    def __len__(self) -> int:
+        return len(self.day)
+
+    @overload
+    def __getitem__(self, index: int) -> Weather: ...
+    @overload
+    def __getitem__(self, index: slice) -> list[Weather]: ...
+
+    def __getitem__(self, index: int | slice) -> Weather | list[Weather]:
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        return Weather(
+            weather_text=self.texts[self.weather_text[index]],
+            temperature_c=self.temperature_c[index],
+            real_feel_temperature_phrase=self.texts[self.real_feel_temperature_phrase[index]],
+            humidity=self.humidity[index],
+            wind_speed_km_h=self.wind_speed_km_h[index],
+            precipitation_metric_mm=self.precipitation_metric_mm[index],
+            is_precipitation=bool(self.is_precipitation[index]),
+        )
+
+    def __iter__(self) -> Iterator[Weather]:
+        for index in range(len(self)):
+            yield self[index]
+
+    def location(self, index: int) -> Optional[Location]:
+        lat, lon = self.lat[index], self.lon[index]
+        if math.isnan(lat) or math.isnan(lon):
+            return None
+        return Location(lat=lat, lon=lon)
+
+    @property
+    def nbytes(self) -> int:
+        """Память под колонки (без таблицы строк), байты"""
+        return sum(
+            len(column) * column.itemsize
+            for column in (getattr(self, name) for name in self.ARRAY_COLUMNS)
+        )
+
+    def to_numpy(self) -> dict[str, np.ndarray]:
+        """Колонки как массивы NumPy без копирования; текстовые колонки -
+        индексы в texts
+        """
+        import numpy as np
+
+        columns: dict[str, np.ndarray] = {
+            name: np.frombuffer(getattr(self, name), dtype=np.float64)
+            for name in self.FLOAT_COLUMNS
+        }
+        for name in self.TEXT_COLUMNS:
+            columns[name] = np.frombuffer(getattr(self, name), dtype=np.uintc)
+        columns["is_precipitation"] = np.frombuffer(self.is_precipitation, dtype=np.bool_)
+        columns["day"] = np.frombuffer(self.day, dtype=np.uint16)
+        return columns
+
+    def to_pandas(self) -> pd.DataFrame:
+        """DataFrame с колонками по полям Weather (плюс lat, lon и day) для
+        WeatherModel.check_bad_weather_batch. Числовые колонки не копируются,
+        текстовые - категориальные поверх общей таблицы строк
+        """
+        import pandas as pd
+
+        columns: dict[str, object] = dict(self.to_numpy())
+        categories = pd.Index(self.texts, dtype=object)
+        for name in self.TEXT_COLUMNS:
+            columns[name] = pd.Categorical.from_codes(
+                columns[name].astype("int32", copy=False), categories=categories,
+            )
+        return pd.DataFrame(columns, copy=False)
@@ -1,8 +1,8 @@
-from typing import NewType
+from typing import NewType, Optional
 import dataclasses
 
 
-__all__ = ["LocationKey", "Location", "Weather"]
+__all__ = ["LocationKey", "Location", "Weather", "HourlyWeather", "WeatherResult"]
 
 
 LocationKey = NewType("LocationKey", str)
@@ -14,7 +14,7 @@ class Location:
     lon: float
 
 
-@dataclasses.dataclass
+@dataclasses.dataclass(slots=True, frozen=True)
 class Weather:
     weather_text: str
     temperature_c: float
@@ -27,3 +27,25 @@ class Weather:
     """Measured in mm"""
     is_precipitation: bool
     """is_precipitation"""
+
+
+@dataclasses.dataclass(slots=True, frozen=True)
+class HourlyWeather:
+    time: float
+    """Unix time начала часа прогноза"""
+    weather: Weather
+
+
+@dataclasses.dataclass
+class WeatherResult:
+    location: Location
+    weather: list[Weather]
+    """Пусто, если запрос завершился ошибкой"""
+    error: Optional[Exception] = None
+    """Ошибка запроса для этой локации, если была"""
+    stale_age: Optional[float] = None
+    """Возраст данных в секундах, если AccuWeather недоступен и отданы
+    сохранённые ранее данные; None - данные свежие"""
+    current: Optional[Weather] = None
+    """Текущее состояние, если оно запрошено вместе с прогнозом и не берётся
+    из нулевого дня прогноза"""
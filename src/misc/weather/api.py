@@ -1,4 +1,6 @@
 from __future__ import annotations
+from typing import Any, AsyncIterator, Awaitable, Callable, Iterable, Optional, TypeVar
+import asyncio
 import os
 
 import accuweather
@@ -7,22 +9,322 @@ import dotenv
 import loguru
 import aiohttp
 
-from src.misc import types
+from src.misc import metrics, types
+from src.misc.config import Config
+from src.misc.weather.cache import ForecastCache, get_shared_cache
+from src.misc.weather.singleflight import SingleFlight
+from src.misc.weather.spatial import LocationSnapper, get_shared_snapper
+from src.misc.weather.store import ForecastStore, get_shared_store
+from src.misc.weather.upstream import (
+    TRANSIENT_ERRORS, CircuitOpenError, RateLimitedError, UpstreamPolicy, get_shared_upstream,
+)
+
+
+T = TypeVar("T")
+
+
+class QuotaExceededError(RuntimeError):
+    """Исчерпана квота запросов к AccuWeather"""
 
 
 class WeatherApiClient:
-    def __init__(self, logger: loguru.Logger) -> None:
+    FORECAST_DAYS = 5
+    """Горизонт дневного прогноза, который всегда запрашивается целиком"""
+    CONNECTION_LIMIT = 32
+    """Размер пула соединений собственной сессии клиента"""
+    KEEPALIVE_TIMEOUT = 60.0
+
+    def __init__(
+        self, logger: loguru.Logger,
+        session: Optional[aiohttp.ClientSession]=None,
+        cache: Optional[ForecastCache]=None,
+        current_from_forecast: bool=False,
+        hourly_hours: int=12,
+        snapper: Optional[LocationSnapper]=None,
+        store: Optional[ForecastStore]=None,
+        upstream: Optional[UpstreamPolicy]=None,
+    ) -> None:
+        """
+        Args:
+            logger: Логгер
+            session: Общая aiohttp-сессия; если не передана, клиент создаёт
+                свою с пулом keep-alive соединений и закрывает её в close().
+                Создавать клиент нужно внутри event loop, на котором он
+                будет использоваться
+            cache: Кэш ответов; без него каждый вызов идёт в AccuWeather
+            current_from_forecast: Отвечать на get_weather(days=1) нулевым
+                днём дневного прогноза вместо запроса текущего состояния
+            hourly_hours: Горизонт почасового прогноза, часы (AccuWeather
+                поддерживает 1, 12, 24, 72 и 120)
+            snapper: Приведение координат к ближайшей известной точке, чтобы
+                близкие запросы делили кэш и запросы к AccuWeather
+            store: Персистентное хранилище ответов: холодный старт без
+                запросов к API и устаревшие данные при недоступности API
+            upstream: Лимит частоты, таймауты, повторы и circuit breaker
+                для запросов к AccuWeather; без него запросы идут как есть
+        """
         self.logger = logger
         
         dotenv.load_dotenv(dotenv.find_dotenv())
         
-        self._client = aiohttp.ClientSession()
-        
         API_KEY = os.getenv("ACCUWEATHER_API_KEY", None)
         if not API_KEY:
             raise RuntimeError("Environment variable "
                                "\"ACCUWEATHER_API_KEY\" is not set")
         self.API_KEY = API_KEY
+        
+        self._owns_client = session is None
+        self._client = session if session is not None else aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(
+                limit=self.CONNECTION_LIMIT,
+                keepalive_timeout=self.KEEPALIVE_TIMEOUT,
+            ),
+        )
+        self.upstream = upstream
+        self._session = upstream.wrap_session(self._client) if upstream is not None else self._client
+        self.cache = cache
+        self._single_flight = SingleFlight()
+        self.current_from_forecast = current_from_forecast
+        self.hourly_hours = hourly_hours
+        self.snapper = snapper
+        self.store = store
+        self._background: set[asyncio.Task] = set()
+
+    @classmethod
+    def from_config(cls, logger: loguru.Logger) -> WeatherApiClient:
+        """Долгоживущий клиент с общими на процесс кэшем и снаппером и
+        настройками [weather_api] из config.toml. Вызывать внутри event loop
+        """
+        return cls(
+            logger=logger,
+            cache=get_shared_cache(),
+            snapper=get_shared_snapper(),
+            store=get_shared_store(),
+            upstream=get_shared_upstream(),
+            **Config.section("weather_api"),
+        )
+
+    async def close(self) -> None:
+        """Остановить фоновые обновления и закрыть сессию, если она была
+        создана самим клиентом
+        """
+        tasks = list(self._background)
+        for task in tasks:
+            task.cancel()
+        # Дождаться отмены, чтобы запросы не шли в уже закрытую сессию
+        await asyncio.gather(*tasks, return_exceptions=True)
+        if self._owns_client and not self._client.closed:
+            await self._client.close()
+
+    def _accuweather(self, location: types.Location) -> accuweather.AccuWeather:
+        location_key = (
+            self.cache.get_location_key(location)
+            if self.cache is not None else None
+        )
+        if location_key is not None:
+            return accuweather.AccuWeather(
+                api_key=self.API_KEY,
+                session=self._session,
+                location_key=location_key,
+                language="ru",
+            )
+        return accuweather.AccuWeather(
+            api_key=self.API_KEY,
+            session=self._session,
+            latitude=location.lat,
+            longitude=location.lon,
+            language="ru",
+        )
+
+    def _flight_key(
+        self, kind: str, location: types.Location, days: int=0,
+    ) -> tuple[str, float, float, int]:
+        if self.cache is not None:
+            return self.cache.key(kind, location, days)
+        return (kind, location.lat, location.lon, days)
+
+    async def _request(
+        self, endpoint: str, accu: accuweather.AccuWeather, call: Callable[[], Awaitable[T]],
+    ) -> T:
+        """Запрос к AccuWeather по политике upstream с переводом ошибок
+        библиотеки в исключения клиента. Длительность и результат пишутся
+        в метрики по endpoint
+
+        Raises:
+            QuotaExceededError
+            RuntimeError
+            ValueError
+        """
+        status = "error"
+        try:
+            with metrics.UPSTREAM_LATENCY.time(endpoint=endpoint):
+                if self.upstream is None:
+                    result = await call()
+                else:
+                    # Без ключа локации библиотека сначала делает запрос geoposition
+                    result = await self.upstream.call(call, cost=1 if accu.location_key else 2)
+            status = "ok"
+            return result
+        except accuweather.exceptions.RequestsExceededError:
+            status = "quota_exceeded"
+            raise QuotaExceededError("Current ACCUWEATHER_API_KEY ended, quota exceeded")
+        except accuweather.exceptions.InvalidApiKeyError:
+            status = "invalid_api_key"
+            raise RuntimeError("Invalid ACCUWEATHER_API_KEY")
+        except accuweather.exceptions.InvalidCoordinatesError:
+            status = "invalid_coordinates"
+            raise ValueError("Invalid coordinates were passed")
+        except CircuitOpenError:
+            status = "circuit_open"
+            raise
+        except RateLimitedError:
+            status = "rate_limited"
+            raise
+        except accuweather.exceptions.ApiError:
+            status = "api_error"
+            raise RuntimeError("Error with AccuWeather API")
+        except TRANSIENT_ERRORS as e:
+            status = "unavailable"
+            raise RuntimeError(f"AccuWeather API is unavailable: {e!r}") from e
+        finally:
+            metrics.UPSTREAM_REQUESTS.inc(endpoint=endpoint, status=status)
+            if status != "ok":
+                self.logger.debug(f"AccuWeather {endpoint} request failed: {status}")
+
+    def _remember_location_key(
+        self, location: types.Location, accu: accuweather.AccuWeather,
+    ) -> None:
+        if self.cache is not None and accu.location_key:
+            self.cache.set_location_key(location, types.LocationKey(accu.location_key))
+
+    def _fresh_ttl(self, kind: str) -> float:
+        if self.cache is None:
+            return 0.0
+        if kind == ForecastCache.KIND_CURRENT:
+            return self.cache.current_ttl
+        return self.cache.forecast_ttl
+
+    def _stale_cache_age(self, kind: str) -> float:
+        """Возраст для restore, при котором устаревший ответ проживёт в
+        кэше stale_cache_ttl
+        """
+        assert self.store is not None
+        return max(0.0, self._fresh_ttl(kind) - self.store.stale_cache_ttl)
+
+    async def _save(self, kind: str, location: types.Location, weather: list[types.Weather]) -> None:
+        if self.store is None:
+            return
+        try:
+            await asyncio.to_thread(self.store.put, kind, location, weather)
+        except Exception as e:
+            self.logger.warning(f"Failed to save {kind} weather for {location}: {e}")
+
+    async def _load(self, kind: str, location: types.Location) -> Optional[tuple[list[types.Weather], float]]:
+        if self.store is None:
+            return None
+        try:
+            return await asyncio.to_thread(self.store.get, kind, location)
+        except Exception as e:
+            self.logger.warning(f"Failed to load {kind} weather for {location}: {e}")
+            return None
+
+    def _revalidate_in_background(self, key: Any, fetch: Callable[[], Awaitable[Any]]) -> None:
+        task = asyncio.ensure_future(self._single_flight.do(key, fetch))
+        self._background.add(task)
+
+        def done(task: asyncio.Future) -> None:
+            self._background.discard(task)
+            if not task.cancelled() and task.exception() is not None:
+                self.logger.warning(f"Background weather refresh failed: {task.exception()}")
+
+        task.add_done_callback(done)
+
+    async def _load_or_fetch(
+        self, kind: str, location: types.Location,
+        fetch: Callable[[], Awaitable[Any]],
+        restore: Callable[[list[types.Weather], float], Any],
+    ) -> tuple[Any, Optional[float]]:
+        """Промах кэша: взять ответ из хранилища, если он ещё свежий (или
+        только что устаревший в режиме stale-while-revalidate), иначе
+        запросить AccuWeather; если API недоступен - отдать устаревший ответ.
+        Устаревший ответ кладётся в кэш на stale_cache_ttl
+
+        Returns:
+            tuple[
+                Any: Результат fetch или restore
+                Optional[float]: Возраст устаревших данных, None - свежие
+            ]
+        """
+        key = self._flight_key(kind, location, self.FORECAST_DAYS if kind == ForecastCache.KIND_FORECAST else 0)
+        stored = await self._load(kind, location)
+        if stored is not None:
+            weather, age = stored
+            if age < self._fresh_ttl(kind):
+                metrics.STORE_READS.inc(kind=kind, result="fresh")
+                return restore(weather, age), None
+            assert self.store is not None
+            if (self.store.stale_while_revalidate
+                    and age < self._fresh_ttl(kind) + self.store.revalidate_window):
+                metrics.STORE_READS.inc(kind=kind, result="stale")
+                self._revalidate_in_background(key, fetch)
+                return restore(weather, self._stale_cache_age(kind)), age
+        if self.store is not None:
+            metrics.STORE_READS.inc(kind=kind, result="miss" if stored is None else "expired")
+
+        try:
+            return await self._single_flight.do(key, fetch), None
+        except Exception as e:
+            if stored is None:
+                raise
+            weather, age = stored
+            metrics.STORE_READS.inc(kind=kind, result="fallback")
+            self.logger.warning(f"Serving {kind} weather for {location} {age:.0f}s old: {e}")
+            return restore(weather, self._stale_cache_age(kind)), age
+
+    async def _get_current(self, location: types.Location) -> tuple[types.Weather, Optional[float]]:
+        if self.snapper is not None:
+            location = self.snapper.snap(location)
+        
+        if self.cache is not None:
+            self.cache.record_request(location)
+            cached_weather = self.cache.get_current(location)
+            if cached_weather is not None:
+                return cached_weather, None
+
+        def restore(weather: list[types.Weather], age: float) -> types.Weather:
+            if self.cache is not None:
+                self.cache.set_current(location, weather[0], age=age)
+            return weather[0]
+
+        return await self._load_or_fetch(
+            ForecastCache.KIND_CURRENT, location,
+            fetch=lambda: self._fetch_current_conditions(location),
+            restore=restore,
+        )
+
+    async def _get_forecast(self, location: types.Location) -> tuple[dict[int, types.Weather], Optional[float]]:
+        if self.snapper is not None:
+            location = self.snapper.snap(location)
+        
+        # Прогноз всегда хранится целиком на FORECAST_DAYS дней, а меньшие
+        # горизонты - срезы из него, так что смена периода не стоит запросов
+        if self.cache is not None:
+            self.cache.record_request(location)
+            cached_forecast = self.cache.get_forecast(location, self.FORECAST_DAYS)
+            if cached_forecast is not None:
+                return cached_forecast, None
+
+        def restore(weather: list[types.Weather], age: float) -> dict[int, types.Weather]:
+            forecast = dict(enumerate(weather))
+            if self.cache is not None:
+                self.cache.set_forecast(location, self.FORECAST_DAYS, forecast, age=age)
+            return forecast
+
+        return await self._load_or_fetch(
+            ForecastCache.KIND_FORECAST, location,
+            fetch=lambda: self._fetch_daily_forecast(location),
+            restore=restore,
+        )
 
     async def get_weather_by_location(
         self, location: types.Location,
@@ -40,27 +342,12 @@ class WeatherApiClient:
         Returns:
             types.Weather: Состояние погоды в данный момент для входных координат
         """
+        return (await self._get_current(location))[0]
+
+    async def _fetch_current_conditions(self, location: types.Location) -> types.Weather:
+        accu = self._accuweather(location)
         
-        accu = accuweather.AccuWeather(
-            api_key=self.API_KEY,
-            session=self._client,
-            latitude=location.lat,
-            longitude=location.lon,
-            language="ru",
-        )
-        
-        try:
-            current_conditions = await accu.async_get_current_conditions()
-        except accuweather.exceptions.RequestsExceededError:
-            raise RuntimeError("Current ACCUWEATHER_API_KEY ended, quota exceeded")
-        except accuweather.exceptions.InvalidApiKeyError:
-            raise RuntimeError("Invalid ACCUWEATHER_API_KEY")
-        except accuweather.exceptions.InvalidCoordinatesError:
-            raise ValueError("Invalid coordinates were passed")
-        except accuweather.exceptions.ApiError:
-            raise RuntimeError("Error with AccuWeather API")
-        except Exception as e:
-            raise e
+        current_conditions = await self._request("current_conditions", accu, accu.async_get_current_conditions)
         
         weather_text: str = current_conditions["WeatherText"]
         temperature_celsius: float = current_conditions["Temperature"]["Metric"]["Value"]
@@ -79,6 +366,10 @@ class WeatherApiClient:
             precipitation_metric_mm=precipitation_metric_mm,
             is_precipitation=is_precipitation,
         )
+        if self.cache is not None:
+            self._remember_location_key(location, accu)
+            self.cache.set_current(location, weather)
+        await self._save(ForecastCache.KIND_CURRENT, location, [weather])
         return weather
 
     async def get_weather_by_location_in_period(
@@ -105,29 +396,18 @@ class WeatherApiClient:
         if days <= 0:
             raise ValueError("days must be >= 0")
         
-        accu = accuweather.AccuWeather(
-            api_key=self.API_KEY,
-            session=self._client,
-            latitude=location.lat,
-            longitude=location.lon,
-            language="ru",
-        )
+        forecast, _ = await self._get_forecast(location)
+        return {day: weather for day, weather in forecast.items() if day < days}
+
+    async def _fetch_daily_forecast(
+        self, location: types.Location,
+    ) -> dict[int, types.Weather]:
+        accu = self._accuweather(location)
         
         weather_for_period: dict[int, types.Weather] = {}
-        try:
-            daily_forecast = (await accu.async_get_daily_forecast(
-                days=5,
-            ))[:days]
-        except accuweather.exceptions.RequestsExceededError:
-            raise RuntimeError("Current ACCUWEATHER_API_KEY ended, quota exceeded")
-        except accuweather.exceptions.InvalidApiKeyError:
-            raise RuntimeError("Invalid ACCUWEATHER_API_KEY")
-        except accuweather.exceptions.InvalidCoordinatesError:
-            raise ValueError("Invalid coordinates were passed")
-        except accuweather.exceptions.ApiError:
-            raise RuntimeError("Error with AccuWeather API")
-        except Exception as e:
-            raise e
+        daily_forecast = await self._request(
+            "daily_forecast", accu, lambda: accu.async_get_daily_forecast(days=self.FORECAST_DAYS),
+        )
         
         for day, raw_forecast in enumerate(daily_forecast):
             weather_text: str = raw_forecast["ShortPhraseDay"]
@@ -149,4 +429,219 @@ class WeatherApiClient:
             )
             weather_for_period[day] = forecast
 
+        if self.cache is not None:
+            self._remember_location_key(location, accu)
+            self.cache.set_forecast(location, self.FORECAST_DAYS, weather_for_period)
+        await self._save(ForecastCache.KIND_FORECAST, location, list(weather_for_period.values()))
         return weather_for_period
+
+    async def get_hourly_forecast(self, location: types.Location) -> list[types.HourlyWeather]:
+        """Почасовой прогноз на hourly_hours часов вперёд
+
+        Args:
+            location: Координаты, для которых требуется узнать состояние погоды
+
+        Raises:
+            QuotaExceededError
+            RuntimeError
+            ValueError
+
+        Returns:
+            list[types.HourlyWeather]: Прогноз по часам в порядке времени
+        """
+        if self.snapper is not None:
+            location = self.snapper.snap(location)
+        
+        if self.cache is not None:
+            self.cache.record_request(location)
+            cached_hourly = self.cache.get_hourly(location, self.hourly_hours)
+            if cached_hourly is not None:
+                return cached_hourly
+        
+        return await self._single_flight.do(
+            self._flight_key(ForecastCache.KIND_HOURLY, location, self.hourly_hours),
+            lambda: self._fetch_hourly_forecast(location),
+        )
+
+    async def _fetch_hourly_forecast(self, location: types.Location) -> list[types.HourlyWeather]:
+        accu = self._accuweather(location)
+        
+        hourly_forecast = await self._request(
+            "hourly_forecast", accu, lambda: accu.async_get_hourly_forecast(hours=self.hourly_hours, metric=True),
+        )
+        
+        hourly: list[types.HourlyWeather] = []
+        for raw_forecast in hourly_forecast:
+            hourly.append(types.HourlyWeather(
+                time=float(raw_forecast["EpochDateTime"]),
+                weather=types.Weather(
+                    weather_text=raw_forecast["IconPhrase"],
+                    temperature_c=raw_forecast["Temperature"]["Value"],
+                    real_feel_temperature_phrase=raw_forecast["RealFeelTemperature"]["Phrase"],
+                    humidity=raw_forecast["RelativeHumidity"],
+                    wind_speed_km_h=raw_forecast["Wind"]["Speed"]["Value"],
+                    precipitation_metric_mm=raw_forecast["TotalLiquid"]["Value"],
+                    is_precipitation=raw_forecast["HasPrecipitation"],
+                ),
+            ))
+        hourly.sort(key=lambda item: item.time)
+
+        if self.cache is not None:
+            self._remember_location_key(location, accu)
+            self.cache.set_hourly(location, self.hourly_hours, hourly)
+        return hourly
+
+    def refresh_cost(self, location: types.Location) -> int:
+        """Запросов к AccuWeather, которые сделает refresh(location): прогноз,
+        текущее состояние, если оно не берётся из прогноза, и geoposition,
+        пока ключ локации не в кэше
+        """
+        if self.snapper is not None:
+            location = self.snapper.snap(location)
+        calls = 1 if self.current_from_forecast else 2
+        if self.cache is None or not self.cache.has_location_key(location):
+            calls += 1
+        return calls
+
+    async def refresh(self, location: types.Location) -> None:
+        """Запросить у AccuWeather свежий прогноз (и текущее состояние, если
+        оно не берётся из прогноза) в обход кэша и положить в кэш
+
+        Raises:
+            QuotaExceededError
+            RuntimeError
+            ValueError
+        """
+        if self.snapper is not None:
+            location = self.snapper.snap(location)
+        
+        await self._single_flight.do(
+            self._flight_key(ForecastCache.KIND_FORECAST, location, self.FORECAST_DAYS),
+            lambda: self._fetch_daily_forecast(location),
+        )
+        if not self.current_from_forecast:
+            await self._single_flight.do(
+                self._flight_key(ForecastCache.KIND_CURRENT, location),
+                lambda: self._fetch_current_conditions(location),
+            )
+
+    async def get_weather(
+        self, location: types.Location, days: int=1,
+    ) -> list[types.Weather]:
+        """Получить погоду по местоположению: текущее состояние для одного дня
+        либо дневной прогноз на период. В режиме current_from_forecast один
+        день тоже берётся из дневного прогноза
+
+        Args:
+            location: Координаты, для которых требуется узнать состояние погоды
+            days: Количество дней (по дефолту 1 - текущее состояние)
+
+        Raises:
+            RuntimeError
+            ValueError
+            ...
+
+        Returns:
+            list[types.Weather]: Состояние погоды по дням
+        """
+        return (await self.get_weather_with_age(location=location, days=days))[0]
+
+    async def get_weather_with_age(
+        self, location: types.Location, days: int=1,
+    ) -> tuple[list[types.Weather], Optional[float]]:
+        """То же, что get_weather, но вместе с возрастом данных, если вместо
+        свежих отданы сохранённые ранее (см. ForecastStore)
+
+        Returns:
+            tuple[
+                list[types.Weather]: Состояние погоды по дням
+                Optional[float]: Возраст устаревших данных, секунды; None - свежие
+            ]
+        """
+        if days <= 0:
+            raise ValueError("days must be >= 0")
+        if days == 1 and not self.current_from_forecast:
+            weather, age = await self._get_current(location)
+            return [weather], age
+        forecast, age = await self._get_forecast(location)
+        return [weather for day, weather in forecast.items() if day < days], age
+
+    async def get_weather_for_locations(
+        self, locations: Iterable[types.Location], days: int=1,
+        max_concurrency: int=8, with_current: bool=False,
+    ) -> list[types.WeatherResult]:
+        """Получить погоду сразу для нескольких местоположений (например, для
+        всех городов маршрута). Запросы выполняются конкурентно на текущем
+        event loop, но не более max_concurrency одновременно
+
+        Args:
+            locations: Координаты точек маршрута
+            days: Количество дней (по дефолту 1 - текущее состояние)
+            max_concurrency: Максимальное число одновременных запросов к API
+            with_current: Вместе с прогнозом на days дней запросить текущее
+                состояние (WeatherResult.current), если оно не берётся из
+                прогноза
+
+        Raises:
+            ValueError: Если max_concurrency < 1
+
+        Returns:
+            list[types.WeatherResult]: Результаты в порядке входных
+                местоположений; ошибка по каждой точке лежит в поле error
+        """
+        return [
+            result async for _, result
+            in self._fetch_for_locations(locations, days, max_concurrency, with_current, ordered=True)
+        ]
+
+    async def iter_weather_for_locations(
+        self, locations: Iterable[types.Location], days: int=1,
+        max_concurrency: int=8, with_current: bool=False,
+    ) -> AsyncIterator[tuple[int, types.WeatherResult]]:
+        """То же, что get_weather_for_locations, но результаты отдаются по
+        мере готовности, начиная с самого быстрого
+
+        Raises:
+            ValueError: Если max_concurrency < 1
+
+        Yields:
+            tuple[
+                int: Индекс местоположения во входной последовательности
+                types.WeatherResult: Результат для него
+            ]
+        """
+        async for item in self._fetch_for_locations(locations, days, max_concurrency, with_current, ordered=False):
+            yield item
+
+    async def _fetch_for_locations(
+        self, locations: Iterable[types.Location], days: int,
+        max_concurrency: int, with_current: bool, ordered: bool,
+    ) -> AsyncIterator[tuple[int, types.WeatherResult]]:
+        if max_concurrency < 1:
+            raise ValueError("max_concurrency must be >= 1")
+
+        semaphore = asyncio.Semaphore(max_concurrency)
+
+        async def fetch(index: int, location: types.Location) -> tuple[int, types.WeatherResult]:
+            async with semaphore:
+                try:
+                    weather, age = await self.get_weather_with_age(location=location, days=days)
+                    current = None
+                    if with_current and not self.current_from_forecast:
+                        # После прогноза, чтобы взять из кэша его ключ локации,
+                        # а не делать второй запрос geoposition
+                        current, current_age = await self._get_current(location)
+                        if current_age is not None:
+                            age = max(age or 0.0, current_age)
+                except Exception as e:
+                    return index, types.WeatherResult(location=location, weather=[], error=e)
+            return index, types.WeatherResult(location=location, weather=weather, stale_age=age, current=current)
+
+        tasks = [asyncio.ensure_future(fetch(index, location)) for index, location in enumerate(locations)]
+        try:
+            for task in tasks if ordered else asyncio.as_completed(tasks):
+                yield await task
+        finally:
+            # Потребитель ушёл раньше (например, клиент закрыл поток)
+            for task in tasks:
+                task.cancel()
@@ -0,0 +1,262 @@
+from __future__ import annotations
+from collections import Counter, OrderedDict
+from typing import Any, Hashable, Optional
+import dataclasses
+import sys
+import threading
+import time
+
+from src.misc import metrics, types
+from src.misc.config import Config
+
+
+@dataclasses.dataclass
+class CacheStats:
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+    """Вытеснены по LRU из-за лимита памяти"""
+    expirations: int = 0
+    """Удалены по истечении TTL"""
+
+
+@dataclasses.dataclass
+class _Entry:
+    value: Any
+    expires_at: float
+    size: int
+
+
+class ForecastCache:
+    """TTL + LRU кэш ответов AccuWeather. Ключ - координаты, округлённые до
+    precision знаков, и горизонт прогноза в днях. Потокобезопасен: общий
+    для сайта и бота
+    """
+
+    KIND_CURRENT = "current"
+    KIND_FORECAST = "forecast"
+    KIND_LOCATION_KEY = "location_key"
+    KIND_HOURLY = "hourly"
+
+    MAX_TRACKED_LOCATIONS = 10_000
+    """Сколько самых популярных точек помнит most_requested"""
+
+    def __init__(
+        self,
+        current_ttl: float=600.0,
+        forecast_ttl: float=3600.0,
+        hourly_ttl: float=1800.0,
+        location_key_ttl: float=7 * 24 * 3600.0,
+        max_bytes: int=16 * 1024 * 1024,
+        precision: int=2,
+    ) -> None:
+        """
+        Args:
+            current_ttl: TTL текущего состояния погоды, секунды
+            forecast_ttl: TTL дневного прогноза, секунды
+            hourly_ttl: TTL почасового прогноза, секунды
+            location_key_ttl: TTL ключа локации AccuWeather, секунды
+            max_bytes: Примерный лимит памяти под записи, байты
+            precision: Число знаков после запятой при округлении координат
+        """
+        if max_bytes <= 0:
+            raise ValueError("max_bytes must be > 0")
+
+        self.current_ttl = current_ttl
+        self.forecast_ttl = forecast_ttl
+        self.hourly_ttl = hourly_ttl
+        self.location_key_ttl = location_key_ttl
+        self.max_bytes = max_bytes
+        self.precision = precision
+
+        self.stats: dict[str, CacheStats] = {}
+        """Статистика по виду записей (KIND_*): обращения за ключами локаций
+        не смешиваются с обращениями за прогнозами
+        """
+        self._requests: Counter[tuple[float, float]] = Counter()
+        self._entries: OrderedDict[Hashable, _Entry] = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls) -> ForecastCache:
+        """Создать кэш по секции [forecast_cache] из config.toml"""
+        return cls(**Config.section("forecast_cache"))
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def size_bytes(self) -> int:
+        return self._size
+
+    def key(self, kind: str, location: types.Location, days: int=0) -> tuple[str, float, float, int]:
+        return (
+            kind,
+            round(location.lat, self.precision),
+            round(location.lon, self.precision),
+            days,
+        )
+
+    def get_current(self, location: types.Location) -> Optional[types.Weather]:
+        return self._get(self.key(self.KIND_CURRENT, location))
+
+    def set_current(self, location: types.Location, weather: types.Weather, age: float=0.0) -> None:
+        """Положить текущее состояние; age - сколько секунд назад оно получено"""
+        self._set(self.key(self.KIND_CURRENT, location), weather, self.current_ttl - age)
+
+    def get_forecast(self, location: types.Location, days: int) -> Optional[dict[int, types.Weather]]:
+        forecast = self._get(self.key(self.KIND_FORECAST, location, days))
+        return dict(forecast) if forecast is not None else None
+
+    def set_forecast(
+        self, location: types.Location, days: int, forecast: dict[int, types.Weather], age: float=0.0,
+    ) -> None:
+        """Положить прогноз; age - сколько секунд назад он получен"""
+        self._set(self.key(self.KIND_FORECAST, location, days), dict(forecast), self.forecast_ttl - age)
+
+    def get_hourly(self, location: types.Location, hours: int) -> Optional[list[types.HourlyWeather]]:
+        hourly = self._get(self.key(self.KIND_HOURLY, location, hours))
+        return list(hourly) if hourly is not None else None
+
+    def set_hourly(self, location: types.Location, hours: int, hourly: list[types.HourlyWeather]) -> None:
+        self._set(self.key(self.KIND_HOURLY, location, hours), list(hourly), self.hourly_ttl)
+
+    def get_location_key(self, location: types.Location) -> Optional[types.LocationKey]:
+        return self._get(self.key(self.KIND_LOCATION_KEY, location))
+
+    def has_location_key(self, location: types.Location) -> bool:
+        """Есть ли живой ключ локации; не трогает статистику и порядок LRU"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(self.key(self.KIND_LOCATION_KEY, location))
+            return entry is not None and entry.expires_at > now
+
+    def set_location_key(self, location: types.Location, location_key: types.LocationKey) -> None:
+        self._set(self.key(self.KIND_LOCATION_KEY, location), location_key, self.location_key_ttl)
+
+    def record_request(self, location: types.Location) -> None:
+        """Учесть пользовательский запрос погоды для most_requested"""
+        key = (round(location.lat, self.precision), round(location.lon, self.precision))
+        with self._lock:
+            self._requests[key] += 1
+            if len(self._requests) > 2 * self.MAX_TRACKED_LOCATIONS:
+                self._requests = Counter(dict(self._requests.most_common(self.MAX_TRACKED_LOCATIONS)))
+
+    def most_requested(self, n: int) -> list[types.Location]:
+        """n самых часто запрашиваемых точек (с округлёнными координатами)"""
+        with self._lock:
+            return [types.Location(lat=lat, lon=lon) for (lat, lon), _ in self._requests.most_common(n)]
+
+    def stats_snapshot(self) -> dict[str, CacheStats]:
+        """Копия статистики по видам записей"""
+        with self._lock:
+            return {kind: dataclasses.replace(stats) for kind, stats in self.stats.items()}
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+    def _get(self, key: Hashable) -> Any:
+        now = time.monotonic()
+        with self._lock:
+            stats = self._stats(key)
+            entry = self._entries.get(key)
+            if entry is None:
+                stats.misses += 1
+                return None
+            if entry.expires_at <= now:
+                self._pop(key)
+                stats.expirations += 1
+                stats.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            stats.hits += 1
+            return entry.value
+
+    def _set(self, key: Hashable, value: Any, ttl: float) -> None:
+        if ttl <= 0:
+            return
+        size = _estimate_size(value)
+        if size > self.max_bytes:
+            return
+
+        with self._lock:
+            if key in self._entries:
+                self._pop(key)
+            self._entries[key] = _Entry(
+                value=value,
+                expires_at=time.monotonic() + ttl,
+                size=size,
+            )
+            self._size += size
+            while self._size > self.max_bytes:
+                oldest_key = next(iter(self._entries))
+                self._pop(oldest_key)
+                self._stats(oldest_key).evictions += 1
+
+    def _stats(self, key: Hashable) -> CacheStats:
+        """Статистика вида записи по ключу; вызывать под замком"""
+        kind = key[0] if isinstance(key, tuple) else ""
+        stats = self.stats.get(kind)
+        if stats is None:
+            stats = self.stats[kind] = CacheStats()
+        return stats
+
+    def _pop(self, key: Hashable) -> None:
+        entry = self._entries.pop(key)
+        self._size -= entry.size
+
+
+def _estimate_size(value: Any) -> int:
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(
+            _estimate_size(k) + _estimate_size(v) for k, v in value.items()
+        )
+    if isinstance(value, list):
+        return sys.getsizeof(value) + sum(_estimate_size(item) for item in value)
+    if dataclasses.is_dataclass(value) and not isinstance(value, type):
+        return sys.getsizeof(value) + sum(
+            _estimate_size(getattr(value, field.name))
+            for field in dataclasses.fields(value)
+        )
+    return sys.getsizeof(value)
+
+
+_shared_cache: Optional[ForecastCache] = None
+_shared_cache_lock = threading.Lock()
+
+
+def get_shared_cache() -> ForecastCache:
+    """Общий на процесс кэш прогнозов (создаётся при первом обращении)"""
+    global _shared_cache
+    with _shared_cache_lock:
+        if _shared_cache is None:
+            _shared_cache = ForecastCache.from_config()
+            _register_metrics(_shared_cache)
+        return _shared_cache
+
+
+def _register_metrics(cache: ForecastCache) -> None:
+    metrics.REGISTRY.callback(
+        "weather_cache_events_total",
+        "Обращения к кэшу прогнозов и вытеснения из него по виду записей",
+        lambda: {
+            (kind, event): float(getattr(stats, event))
+            for kind, stats in cache.stats_snapshot().items()
+            for event in ("hits", "misses", "evictions", "expirations")
+        },
+        labelnames=("kind", "event"),
+        kind="counter",
+    )
+    metrics.REGISTRY.callback(
+        "weather_cache_bytes",
+        "Примерный объём записей в кэше прогнозов",
+        metrics.read_value(lambda: cache.size_bytes),
+    )
+    metrics.REGISTRY.callback(
+        "weather_cache_entries",
+        "Число записей в кэше прогнозов",
+        metrics.read_value(lambda: len(cache)),
+    )
@@ -1,34 +1,187 @@
-from typing import Any, Optional
-import pathlib
-import sys
+from __future__ import annotations
+from typing import TYPE_CHECKING, Any, Optional
+import bisect
+import threading
 
-import tomli
+from src.misc import metrics, types
+from src.misc.config import Config
 
-from src.misc import types
+if TYPE_CHECKING:
+    from src.misc.weather.gazetteer import Gazetteer
+
+
+def normalize_city_name(city: str) -> str:
+    """Нормализовать название города для поиска: регистр, "ё" и пробелы"""
+    return " ".join(city.casefold().replace("ё", "е").split())
+
+
+def _deletes(name: str) -> set[str]:
+    return {name[:i] + name[i + 1:] for i in range(len(name))}
+
+
+def _edit_distance(a: str, b: str) -> int:
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, start=1):
+        current = [i]
+        for j, char_b in enumerate(b, start=1):
+            current.append(min(
+                previous[j] + 1,
+                current[j - 1] + 1,
+                previous[j - 1] + (char_a != char_b),
+            ))
+        previous = current
+    return previous[-1]
+
+
+class CityRegistry:
+    """Индекс городов из config.toml: поиск по нормализованному названию за
+    O(1), по префиксу - бинарным поиском по отсортированным названиям, с
+    опечатками - по заранее посчитанным удалениям одного символа
+    (symmetric delete). Если в config.toml задан [gazetteer], города, которых
+    нет в city_coordinates, ищутся в отображённом в память справочнике
+    """
+
+    _lock = threading.Lock()
+    _instance: Optional[CityRegistry] = None
+    _instance_source: Optional[dict[str, Any]] = None
+
+    def __init__(
+        self, cities: dict[str, types.Location],
+        gazetteer: Optional[Gazetteer]=None,
+    ) -> None:
+        self.gazetteer = gazetteer
+        self._cities: dict[str, tuple[str, types.Location]] = {}
+        for city, location in cities.items():
+            self._cities.setdefault(normalize_city_name(city), (city, location))
+
+        self._sorted_names = sorted(self._cities)
+
+        self._deletes_index: dict[str, list[str]] = {}
+        for name in self._sorted_names:
+            for deleted in _deletes(name):
+                self._deletes_index.setdefault(deleted, []).append(name)
+
+    @staticmethod
+    def get() -> CityRegistry:
+        """Общий на процесс реестр; перестраивается только при изменении
+        config.toml
+        """
+        raw_config = Config.load()
+        instance = CityRegistry._instance
+        if instance is not None and CityRegistry._instance_source is raw_config:
+            return instance
+        with CityRegistry._lock:
+            if (CityRegistry._instance is None
+                    or CityRegistry._instance_source is not raw_config):
+                cities_config: dict[str, types.Location] = {}
+                for city, coords in raw_config["city_coordinates"].items():
+                    cities_config[city] = types.Location(lat=coords["lat"], lon=coords["lon"])
+                previous = CityRegistry._instance.gazetteer if CityRegistry._instance else None
+                gazetteer = CityRegistry._open_gazetteer(raw_config)
+                CityRegistry._instance = CityRegistry(cities_config, gazetteer=gazetteer)
+                CityRegistry._instance_source = raw_config
+                # Справочник сменился или отключён: отпустить mmap и файл
+                if previous is not None and previous is not gazetteer:
+                    previous.close()
+            return CityRegistry._instance
+
+    @staticmethod
+    def _open_gazetteer(raw_config: dict[str, Any]) -> Optional[Gazetteer]:
+        gazetteer_path = raw_config.get("gazetteer", {}).get("path")
+        if not gazetteer_path:
+            return None
+
+        from src.misc.weather.gazetteer import Gazetteer
+
+        path = Config.path().parent / gazetteer_path
+        previous = CityRegistry._instance.gazetteer if CityRegistry._instance else None
+        if previous is not None and previous.path == path:
+            return previous
+        return Gazetteer(path)
+
+    def __len__(self) -> int:
+        return len(self._cities)
+
+    def __contains__(self, city: str) -> bool:
+        return self.lookup(city) is not None
+
+    def names(self) -> list[str]:
+        return [self._cities[name][0] for name in self._sorted_names]
+
+    def lookup(self, city: str) -> Optional[types.Location]:
+        entry = self._cities.get(normalize_city_name(city))
+        if entry is not None:
+            return entry[1]
+        if self.gazetteer is not None:
+            return self.gazetteer.lookup(city)
+        return None
+
+    def items(self) -> list[tuple[str, types.Location]]:
+        return [self._cities[name] for name in self._sorted_names]
+
+    def suggest_prefix(self, prefix: str, limit: int=10) -> list[str]:
+        """Названия городов, начинающиеся с prefix, в алфавитном порядке"""
+        prefix = normalize_city_name(prefix)
+        if not prefix:
+            return []
+        start = bisect.bisect_left(self._sorted_names, prefix)
+        suggestions: list[str] = []
+        for name in self._sorted_names[start:]:
+            if not name.startswith(prefix) or len(suggestions) >= limit:
+                break
+            suggestions.append(self._cities[name][0])
+        if self.gazetteer is not None and len(suggestions) < limit:
+            for name in self.gazetteer.suggest_prefix(prefix, limit=limit):
+                if len(suggestions) >= limit:
+                    break
+                if name not in suggestions:
+                    suggestions.append(name)
+        return suggestions
+
+    def suggest_similar(self, city: str, limit: int=5, max_distance: int=2) -> list[str]:
+        """Названия городов, отличающиеся от city не более чем на
+        max_distance правок (но найденные через одно удаление с каждой
+        стороны), от ближайших к дальним
+        """
+        city = normalize_city_name(city)
+        if not city:
+            return []
+
+        candidates: set[str] = set()
+        for key in _deletes(city) | {city}:
+            if key in self._cities:
+                candidates.add(key)
+            candidates.update(self._deletes_index.get(key, ()))
+
+        ranked = sorted(
+            (distance, name)
+            for name in candidates
+            if (distance := _edit_distance(city, name)) <= max_distance
+        )
+        return [self._cities[name][0] for _, name in ranked[:limit]]
+
+    def suggest(self, query: str, limit: int=5) -> list[str]:
+        """Подсказки для ввода: сначала по префиксу, затем с опечатками"""
+        suggestions = self.suggest_prefix(query, limit=limit)
+        for name in self.suggest_similar(query, limit=limit):
+            if len(suggestions) >= limit:
+                break
+            if name not in suggestions:
+                suggestions.append(name)
+        return suggestions
 
 
 class Cities:
     @staticmethod
     def _load_config() -> dict[str, types.Location]:
-        cities_config_file_path = (pathlib.Path(sys.path[0]) / "config.toml").resolve()
-        if not cities_config_file_path.exists():
-            raise RuntimeError("config.toml config file not exists")
-        
-        raw_cities_config: dict[str, Any]
-        with open(cities_config_file_path, "r", encoding="utf-8") as file:
-            raw_cities_config = tomli.loads(file.read())
-        
-        cities_config: dict[str, types.Location] = {}
-        for city, coords in raw_cities_config["city_coordinates"].items():
-            cities_config[city] = types.Location(lat=coords["lat"], lon=coords["lon"])
-
-        return cities_config
-    
+        return dict(CityRegistry.get().items())
+
     @staticmethod
     def city_to_location(city: str) -> Optional[types.Location]:
-        cities_config = Cities._load_config()
-        
-        if not city in cities_config:
-            return None
-        
-        return cities_config[city]
+        location = CityRegistry.get().lookup(city)
+        metrics.CITY_LOOKUPS.inc(result="hit" if location is not None else "miss")
+        return location
+
+    @staticmethod
+    def suggest(query: str, limit: int=5) -> list[str]:
+        return CityRegistry.get().suggest(query, limit=limit)
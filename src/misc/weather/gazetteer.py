@@ -0,0 +1,277 @@
+"""Компактный справочник населённых пунктов (газеттир)
+
+Импорт потоково читает CSV/TSV (в том числе дамп GeoNames) и пишет бинарный
+файл, который при загрузке отображается в память через mmap: координаты
+лежат в непрерывных массивах float64, названия - в общем UTF-8 блоке со
+смещениями. Поиск идёт бинарным поиском по байтам нормализованных названий,
+объекты types.Location создаются только для найденных записей.
+
+Формат файла (little-endian):
+    header: magic b"CGZ1", uint32 count, uint32 keys_size, uint32 names_size
+    float64[count] lat, float64[count] lon
+    uint32[count + 1] смещения ключей, uint32[count + 1] смещения названий
+    keys: нормализованные названия (UTF-8), отсортированы по байтам
+    names: исходные названия (UTF-8) в том же порядке
+
+Использование:
+    python -m src.misc.weather.gazetteer cities500.txt data/cities.gaz
+"""
+from __future__ import annotations
+from array import array
+from typing import Iterable, Iterator, Optional
+import argparse
+import csv
+import mmap
+import pathlib
+import struct
+import sys
+
+from src.misc import types
+from src.misc.weather.cities import normalize_city_name
+
+
+MAGIC = b"CGZ1"
+_HEADER = struct.Struct("<4sIII")
+
+# Колонки дампа GeoNames (geoname table, без заголовка)
+_GEONAMES_NAME = 1
+_GEONAMES_ALTERNATE_NAMES = 3
+_GEONAMES_LAT = 4
+_GEONAMES_LON = 5
+_GEONAMES_FEATURE_CLASS = 6
+_GEONAMES_POPULATION = 14
+
+
+def _read_geonames(
+    rows: Iterator[list[str]], alternate_names: bool,
+) -> Iterator[tuple[str, float, float, int]]:
+    for row in rows:
+        if len(row) <= _GEONAMES_POPULATION or row[_GEONAMES_FEATURE_CLASS] != "P":
+            continue
+        lat = float(row[_GEONAMES_LAT])
+        lon = float(row[_GEONAMES_LON])
+        population = int(row[_GEONAMES_POPULATION] or 0)
+        yield row[_GEONAMES_NAME], lat, lon, population
+        if alternate_names and row[_GEONAMES_ALTERNATE_NAMES]:
+            for name in row[_GEONAMES_ALTERNATE_NAMES].split(","):
+                yield name, lat, lon, population
+
+
+def _read_with_header(
+    header: list[str], rows: Iterator[list[str]],
+) -> Iterator[tuple[str, float, float, int]]:
+    columns = {column.strip().lower(): i for i, column in enumerate(header)}
+
+    def column(*names: str) -> int:
+        for name in names:
+            if name in columns:
+                return columns[name]
+        raise ValueError(f"Gazetteer file has no {names[0]!r} column")
+
+    name_column = column("name", "city")
+    lat_column = column("lat", "latitude")
+    lon_column = column("lon", "lng", "longitude")
+    population_column = columns.get("population")
+
+    for row in rows:
+        if not row:
+            continue
+        population = 0
+        if population_column is not None and row[population_column]:
+            population = int(row[population_column])
+        yield row[name_column], float(row[lat_column]), float(row[lon_column]), population
+
+
+def read_gazetteer_rows(
+    source: pathlib.Path, alternate_names: bool=False,
+) -> Iterator[tuple[str, float, float, int]]:
+    """Потоково прочитать (название, широта, долгота, население) из
+    CSV/TSV. Файл без заголовка с табуляцией считается дампом GeoNames,
+    иначе колонки ищутся по заголовку (name, lat, lon, population)
+    """
+    with open(source, "r", encoding="utf-8", newline="") as file:
+        first_line = file.readline()
+        delimiter = "\t" if "\t" in first_line else ","
+        file.seek(0)
+        rows = csv.reader(file, delimiter=delimiter, quoting=csv.QUOTE_NONE if delimiter == "\t" else csv.QUOTE_MINIMAL)
+        first_row = next(rows, None)
+        if first_row is None:
+            return
+        if delimiter == "\t" and first_row[0].isdigit():
+            yield from _read_geonames(iter([first_row]), alternate_names)
+            yield from _read_geonames(rows, alternate_names)
+        else:
+            yield from _read_with_header(first_row, rows)
+
+
+def write_gazetteer(
+    entries: Iterable[tuple[str, float, float, int]], destination: pathlib.Path,
+) -> int:
+    """Записать справочник в бинарный формат. При совпадении
+    нормализованных названий остаётся самый населённый пункт
+
+    Returns:
+        int: Количество записанных городов
+    """
+    if sys.byteorder != "little":
+        raise RuntimeError("Gazetteer format requires a little-endian platform")
+
+    # На время импорта держим только ключ -> индекс и плотные массивы
+    index: dict[bytes, int] = {}
+    names: list[str] = []
+    lats = array("d")
+    lons = array("d")
+    populations = array("q")
+    for name, lat, lon, population in entries:
+        name = name.strip()
+        key = normalize_city_name(name).encode("utf-8")
+        if not key:
+            continue
+        i = index.get(key)
+        if i is None:
+            index[key] = len(names)
+            names.append(name)
+            lats.append(lat)
+            lons.append(lon)
+            populations.append(population)
+        elif population > populations[i]:
+            names[i], lats[i], lons[i], populations[i] = name, lat, lon, population
+    del populations
+
+    keys = sorted(index)
+    key_offsets = array("I", [0])
+    name_offsets = array("I", [0])
+    sorted_lats = array("d")
+    sorted_lons = array("d")
+    encoded_names: list[bytes] = []
+    keys_size = names_size = 0
+    for key in keys:
+        i = index[key]
+        encoded_name = names[i].encode("utf-8")
+        keys_size += len(key)
+        names_size += len(encoded_name)
+        key_offsets.append(keys_size)
+        name_offsets.append(names_size)
+        sorted_lats.append(lats[i])
+        sorted_lons.append(lons[i])
+        encoded_names.append(encoded_name)
+
+    destination.parent.mkdir(parents=True, exist_ok=True)
+    temporary = destination.with_suffix(destination.suffix + ".tmp")
+    with open(temporary, "wb") as file:
+        file.write(_HEADER.pack(MAGIC, len(keys), keys_size, names_size))
+        sorted_lats.tofile(file)
+        sorted_lons.tofile(file)
+        key_offsets.tofile(file)
+        name_offsets.tofile(file)
+        for key in keys:
+            file.write(key)
+        for encoded_name in encoded_names:
+            file.write(encoded_name)
+    temporary.replace(destination)
+    return len(keys)
+
+
+def import_gazetteer(
+    source: pathlib.Path, destination: pathlib.Path, alternate_names: bool=False,
+) -> int:
+    """Импортировать CSV/TSV справочник в бинарный формат"""
+    return write_gazetteer(read_gazetteer_rows(source, alternate_names), destination)
+
+
+class Gazetteer:
+    """Отображённый в память справочник городов. Размер резидентной памяти
+    определяется только реально прочитанными страницами файла
+    """
+
+    def __init__(self, path: pathlib.Path) -> None:
+        if sys.byteorder != "little":
+            raise RuntimeError("Gazetteer format requires a little-endian platform")
+
+        self.path = path
+        with open(path, "rb") as file:
+            self._mmap = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        buffer = memoryview(self._mmap)
+        magic, count, keys_size, names_size = _HEADER.unpack_from(buffer)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a gazetteer file")
+
+        offset = _HEADER.size
+        self._count = count
+        self.lat = buffer[offset:offset + 8 * count].cast("d")
+        offset += 8 * count
+        self.lon = buffer[offset:offset + 8 * count].cast("d")
+        offset += 8 * count
+        self._key_offsets = buffer[offset:offset + 4 * (count + 1)].cast("I")
+        offset += 4 * (count + 1)
+        self._name_offsets = buffer[offset:offset + 4 * (count + 1)].cast("I")
+        offset += 4 * (count + 1)
+        self._keys = buffer[offset:offset + keys_size]
+        offset += keys_size
+        self._names = buffer[offset:offset + names_size]
+
+    def __len__(self) -> int:
+        return self._count
+
+    def close(self) -> None:
+        for view in (self.lat, self.lon, self._key_offsets, self._name_offsets, self._keys, self._names):
+            view.release()
+        self._mmap.close()
+
+    def _key(self, i: int) -> bytes:
+        return bytes(self._keys[self._key_offsets[i]:self._key_offsets[i + 1]])
+
+    def name(self, i: int) -> str:
+        return str(self._names[self._name_offsets[i]:self._name_offsets[i + 1]], "utf-8")
+
+    def location(self, i: int) -> types.Location:
+        return types.Location(lat=self.lat[i], lon=self.lon[i])
+
+    def _bisect_left(self, key: bytes) -> int:
+        low, high = 0, self._count
+        while low < high:
+            middle = (low + high) // 2
+            if self._key(middle) < key:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def find(self, city: str) -> Optional[int]:
+        """Индекс города по названию (без учёта регистра и пробелов)"""
+        key = normalize_city_name(city).encode("utf-8")
+        i = self._bisect_left(key)
+        if i < self._count and self._key(i) == key:
+            return i
+        return None
+
+    def lookup(self, city: str) -> Optional[types.Location]:
+        i = self.find(city)
+        return self.location(i) if i is not None else None
+
+    def suggest_prefix(self, prefix: str, limit: int=10) -> list[str]:
+        key = normalize_city_name(prefix).encode("utf-8")
+        if not key:
+            return []
+        suggestions: list[str] = []
+        i = self._bisect_left(key)
+        while i < self._count and len(suggestions) < limit and self._key(i).startswith(key):
+            suggestions.append(self.name(i))
+            i += 1
+        return suggestions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Import a CSV/TSV city gazetteer")
+    parser.add_argument("source", type=pathlib.Path, help="GeoNames dump or CSV with name,lat,lon columns")
+    parser.add_argument("destination", type=pathlib.Path, help="Output gazetteer file")
+    parser.add_argument("--alternate-names", action="store_true", help="Also index GeoNames alternate names")
+    args = parser.parse_args()
+
+    count = import_gazetteer(args.source, args.destination, alternate_names=args.alternate_names)
+    print(f"Imported {count} cities into {args.destination}")
+
+
+if __name__ == "__main__":
+    main()
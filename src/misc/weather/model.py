@@ -1,33 +1,76 @@
+from typing import Any, Iterable, Mapping, Optional, Union
+
+import pandas as pd
+
 from src.misc import types
+from src.misc.weather.rules import WeatherRules
+
+
+_WEATHER_COLUMNS = (
+    "weather_text",
+    "temperature_c",
+    "real_feel_temperature_phrase",
+    "humidity",
+    "wind_speed_km_h",
+    "precipitation_metric_mm",
+    "is_precipitation",
+)
+_TEXT_COLUMNS = ("weather_text", "real_feel_temperature_phrase")
 
 
 class WeatherModel:
     @staticmethod
-    def check_bad_weather(weather: types.Weather) -> bool:
-        # очень жарко или холодно
-        if not 0 <= weather.temperature_c < 35:
-            return True
-        
-        # сильный ветер
-        if weather.wind_speed_km_h > 50:
-            return True
-        
-        # идут неприятные осадки: шторм, град
-        bad_weather_keywords = ["гром", "шторм", "град"]
-        if any(keyword.lower() in weather.weather_text.lower()
-               for keyword in bad_weather_keywords):
-            return True
-        
-        # идут осадки и влажно (дождь, снег, но влажно)
-        if weather.is_precipitation and weather.precipitation_metric_mm > 5:
-            return True
-        
-        bad_feel_keywords = ["очень", "сыро"]
-        if any(bad_feel_keyword in weather.real_feel_temperature_phrase.lower()
-               for bad_feel_keyword in bad_feel_keywords):
-            return True
-
-        return False
+    def bad_weather_reasons(
+        weather: types.Weather, location: Optional[types.Location]=None,
+    ) -> list[str]:
+        """Коды всех сработавших правил плохой погоды (см. REASONS). Правила
+        берутся из [weather_rules] в config.toml, с учётом региона location
+        """
+        return WeatherRules.get().evaluate(weather, location)
+
+    @staticmethod
+    def check_bad_weather(
+        weather: types.Weather, location: Optional[types.Location]=None,
+    ) -> bool:
+        return WeatherRules.get().for_location(location).is_bad(weather)
+
+    @staticmethod
+    def weather_to_frame(weather: Iterable[types.Weather]) -> pd.DataFrame:
+        """Собрать прогнозы в колоночный DataFrame для check_bad_weather_batch"""
+        columns: dict[str, list[Any]] = {column: [] for column in _WEATHER_COLUMNS}
+        for item in weather:
+            for column, values in columns.items():
+                values.append(getattr(item, column))
+        frame = pd.DataFrame(columns)
+        # Текстов мало различных: категории экономят память и сравнения
+        for column in _TEXT_COLUMNS:
+            frame[column] = frame[column].astype("category")
+        return frame
+
+    @staticmethod
+    def check_bad_weather_batch(
+        forecasts: Union[pd.DataFrame, Mapping[str, Any], types.WeatherBatch],
+    ) -> tuple[pd.Series, pd.DataFrame]:
+        """Векторная версия check_bad_weather для множества прогнозов сразу
+
+        Args:
+            forecasts: DataFrame (или dict колонок, например массивов NumPy,
+                или types.WeatherBatch) с колонками по полям types.Weather;
+                необязательные колонки lat и lon включают региональные правила
+
+        Returns:
+            tuple[
+                pd.Series: Маска плохой погоды, совпадает с check_bad_weather
+                pd.DataFrame: Булевы колонки REASONS - какие правила сработали
+            ]
+        """
+        if isinstance(forecasts, types.WeatherBatch):
+            forecasts = forecasts.to_pandas()
+        elif not isinstance(forecasts, pd.DataFrame):
+            forecasts = pd.DataFrame(forecasts)
+
+        reasons = WeatherRules.get().evaluate_batch(forecasts)
+        return reasons.any(axis=1), reasons
 
     @staticmethod
     def generate_weather_report_markdown(weather: types.Weather) -> str:
@@ -43,3 +86,16 @@ class WeatherModel:
         else:
             report += "Осадки: Нет;<br />"
         return report
+
+    @staticmethod
+    def generate_weather_report_text(weather: types.Weather) -> str:
+        """Отчёт о погоде простым текстом (для Telegram)"""
+        return WeatherModel.generate_weather_report_markdown(weather).replace("<br />", "\n").rstrip()
+
+    @staticmethod
+    def generate_stale_notice(stale_age: float) -> str:
+        """Пометка для данных, отданных из хранилища вместо свежего ответа API"""
+        minutes = max(1, round(stale_age / 60))
+        if minutes < 120:
+            return f"⚠️ Данные устарели на {minutes} мин."
+        return f"⚠️ Данные устарели на {minutes // 60} ч."
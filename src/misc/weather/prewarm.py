@@ -0,0 +1,180 @@
+from __future__ import annotations
+from typing import IO, Optional
+import asyncio
+import pathlib
+import random
+
+import loguru
+
+from src.misc import types
+from src.misc.config import Config
+from src.misc.weather.api import QuotaExceededError, WeatherApiClient
+from src.misc.weather.cities import CityRegistry
+
+
+class PrewarmScheduler:
+    """Фоновое обновление кэша для городов из config.toml и/или top_n самых
+    запрашиваемых точек, чтобы интерактивные запросы почти всегда
+    обслуживались из кэша
+
+    Обновления размазаны по времени с джиттером так, чтобы укладываться в
+    quota_per_minute запросов к AccuWeather; при QuotaExceededError пауза
+    растёт экспоненциально до max_backoff
+
+    С lock_path прогревом занимается только один процесс на машине (например,
+    один из воркеров gunicorn), остальные ждут, пока замок освободится
+    """
+
+    def __init__(
+        self, client: WeatherApiClient, logger: loguru.Logger,
+        quota_per_minute: float=10.0,
+        refresh_interval: Optional[float]=None,
+        configured_cities: bool=True,
+        top_n: int=0,
+        max_backoff: float=900.0,
+        lock_path: Optional[pathlib.Path]=None,
+    ) -> None:
+        """
+        Args:
+            client: Клиент, в кэш которого кладутся прогнозы
+            logger: Логгер
+            quota_per_minute: Бюджет запросов к AccuWeather в минуту
+            refresh_interval: Как часто обновлять каждую точку, секунды; по
+                умолчанию 80% от TTL прогноза в кэше
+            configured_cities: Обновлять города из city_coordinates
+            top_n: Дополнительно обновлять top_n самых запрашиваемых точек
+            max_backoff: Максимальная пауза после исчерпания квоты, секунды
+            lock_path: Файл межпроцессного замка; None - без замка
+        """
+        if quota_per_minute <= 0:
+            raise ValueError("quota_per_minute must be > 0")
+        if client.cache is None:
+            raise ValueError("Prewarming requires a WeatherApiClient with a cache")
+
+        self.client = client
+        self.logger = logger
+        self.quota_per_minute = quota_per_minute
+        if refresh_interval is None:
+            ttl = client.cache.forecast_ttl
+            if not client.current_from_forecast:
+                ttl = min(ttl, client.cache.current_ttl)
+            refresh_interval = 0.8 * ttl
+        self.refresh_interval = refresh_interval
+        self.configured_cities = configured_cities
+        self.top_n = top_n
+        self.max_backoff = max_backoff
+        self.lock_path = lock_path
+
+        self._backoff = 0.0
+        self._task: Optional[asyncio.Task] = None
+        self._lock_file: Optional[IO[bytes]] = None
+
+    @classmethod
+    def from_config(cls, client: WeatherApiClient, logger: loguru.Logger) -> Optional[PrewarmScheduler]:
+        """Планировщик по секции [prewarm] из config.toml или None, если он
+        выключен
+        """
+        config = Config.section("prewarm")
+        if not config.pop("enabled", False):
+            return None
+        lock_path = config.pop("lock_path", "")
+        return cls(
+            client=client, logger=logger,
+            lock_path=Config.path().parent / lock_path if lock_path else None,
+            **config,
+        )
+
+    def calls_per_location(self, location: types.Location) -> int:
+        """Запросов к AccuWeather на обновление точки, включая geoposition,
+        если ключ локации ещё не в кэше
+        """
+        return self.client.refresh_cost(location)
+
+    def targets(self) -> list[types.Location]:
+        targets: dict[tuple[float, float], types.Location] = {}
+        if self.configured_cities:
+            for _, location in CityRegistry.get().items():
+                targets.setdefault((location.lat, location.lon), location)
+        if self.top_n > 0 and self.client.cache is not None:
+            for location in self.client.cache.most_requested(self.top_n):
+                targets.setdefault((location.lat, location.lon), location)
+        return list(targets.values())
+
+    def start(self) -> asyncio.Task:
+        """Запустить на текущем event loop"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self.run(), name="weather-prewarm")
+        return self._task
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        self._release_lock()
+
+    def _acquire_lock(self) -> bool:
+        """Взять межпроцессный замок прогрева без ожидания; замок держится
+        до stop() или завершения процесса
+        """
+        if self.lock_path is None or self._lock_file is not None:
+            return True
+        try:
+            import fcntl
+        except ImportError:
+            # Windows: без замка
+            return True
+
+        self.lock_path.parent.mkdir(parents=True, exist_ok=True)
+        lock_file = open(self.lock_path, "ab")
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return False
+        self._lock_file = lock_file
+        return True
+
+    def _release_lock(self) -> None:
+        if self._lock_file is not None:
+            self._lock_file.close()
+            self._lock_file = None
+
+    async def run(self) -> None:
+        # Чтобы несколько процессов, запущенных одновременно, не шли в API разом
+        await asyncio.sleep(random.uniform(0, 60 / self.quota_per_minute))
+        while not self._acquire_lock():
+            # Прогревает другой процесс; если он завершится, подхватим
+            await asyncio.sleep(min(self.refresh_interval, 60.0))
+        while True:
+            targets = self.targets()
+            if not targets:
+                await asyncio.sleep(self.refresh_interval)
+                continue
+
+            random.shuffle(targets)
+            for location in targets:
+                # Интервал после точки: не чаще бюджета квоты на её запросы и
+                # так, чтобы весь круг занимал refresh_interval
+                calls = self.calls_per_location(location)
+                await self._refresh(location)
+                min_spacing = 60 / self.quota_per_minute * calls
+                spacing = max(min_spacing, self.refresh_interval / len(targets))
+                await asyncio.sleep(self._backoff or spacing * random.uniform(1.0, 1.2))
+
+    async def _refresh(self, location: types.Location) -> None:
+        try:
+            await self.client.refresh(location)
+        except QuotaExceededError:
+            self._backoff = min(
+                self.max_backoff,
+                max(60 / self.quota_per_minute, self._backoff * 2) * random.uniform(1.0, 1.2),
+            )
+            self.logger.warning(f"AccuWeather quota exceeded, prewarming paused for {self._backoff:.0f}s")
+            return
+        except Exception as e:
+            self.logger.warning(f"Failed to prewarm forecast for {location}: {e}")
+        self._backoff = 0.0
@@ -0,0 +1,211 @@
+"""Прогноз в пути: погода в точках маршрута на момент, когда до них
+доберётся путешественник
+
+Маршрут - ломаная через города; по ней с шагом step_km расставляются точки,
+каждой приписывается время прибытия при постоянной скорости. Почасовой
+прогноз запрашивается один раз на город маршрута, а значения в точках
+получаются линейной интерполяцией по времени (между часами) и по месту
+(между соседними городами) сразу для всех точек через NumPy
+"""
+from __future__ import annotations
+from typing import Optional, Sequence
+import asyncio
+import dataclasses
+import datetime
+
+import numpy as np
+import pandas as pd
+
+from src.misc import types
+from src.misc.config import Config
+from src.misc.weather.api import WeatherApiClient
+
+
+EARTH_RADIUS_KM = 6371.0088
+
+_METRICS = (
+    "temperature_c",
+    "humidity",
+    "wind_speed_km_h",
+    "precipitation_metric_mm",
+)
+
+
+def haversine_km_vec(lat1: np.ndarray, lon1: np.ndarray, lat2: np.ndarray, lon2: np.ndarray) -> np.ndarray:
+    """Векторная версия spatial.haversine_km"""
+    lat1, lon1, lat2, lon2 = map(np.radians, (lat1, lon1, lat2, lon2))
+    a = (np.sin((lat2 - lat1) / 2) ** 2
+         + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2)
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+@dataclasses.dataclass(frozen=True)
+class RouteSamples:
+    """Точки на маршруте: для каждой - участок (индекс начального города),
+    доля пройденного участка, координаты и расстояние от старта
+    """
+    distance_km: np.ndarray
+    segment: np.ndarray
+    fraction: np.ndarray
+    lat: np.ndarray
+    lon: np.ndarray
+
+    def __len__(self) -> int:
+        return len(self.distance_km)
+
+
+class RoutePlanner:
+    def __init__(self, speed_km_h: float=70.0, step_km: float=25.0, max_samples: int=2000) -> None:
+        """
+        Args:
+            speed_km_h: Средняя скорость в пути по умолчанию, км/ч
+            step_km: Шаг точек вдоль маршрута, км
+            max_samples: Максимум точек; на длинных маршрутах шаг растёт
+        """
+        if speed_km_h <= 0:
+            raise ValueError("speed_km_h must be > 0")
+        if step_km <= 0:
+            raise ValueError("step_km must be > 0")
+        if max_samples < 2:
+            raise ValueError("max_samples must be >= 2")
+
+        self.speed_km_h = speed_km_h
+        self.step_km = step_km
+        self.max_samples = max_samples
+
+    @classmethod
+    def from_config(cls) -> RoutePlanner:
+        """Планировщик по секции [route] из config.toml"""
+        return cls(**Config.section("route"))
+
+    def sample(self, waypoints: Sequence[types.Location]) -> RouteSamples:
+        """Расставить точки вдоль ломаной через waypoints с шагом step_km;
+        сами города всегда входят в точки
+        """
+        if len(waypoints) < 2:
+            raise ValueError("A route needs at least 2 waypoints")
+
+        lat = np.array([location.lat for location in waypoints], dtype=np.float64)
+        lon = np.array([location.lon for location in waypoints], dtype=np.float64)
+        lengths = haversine_km_vec(lat[:-1], lon[:-1], lat[1:], lon[1:])
+        cumulative = np.concatenate(([0.0], np.cumsum(lengths)))
+        total = cumulative[-1]
+
+        step = max(self.step_km, total / max(1, self.max_samples - len(waypoints)))
+        distance = np.union1d(np.arange(0.0, total, step), cumulative)
+
+        # Точка ровно в городе относится к участку, который из него выходит
+        segment = np.clip(np.searchsorted(cumulative, distance, side="right") - 1, 0, len(lengths) - 1)
+        segment_length = lengths[segment]
+        fraction = np.divide(
+            distance - cumulative[segment], segment_length,
+            out=np.zeros_like(distance), where=segment_length > 0,
+        )
+        # Линейно по координатам: на участках между соседними городами
+        # отличие от дуги большого круга несущественно
+        return RouteSamples(
+            distance_km=distance,
+            segment=segment,
+            fraction=fraction,
+            lat=lat[segment] + fraction * (lat[segment + 1] - lat[segment]),
+            lon=lon[segment] + fraction * (lon[segment + 1] - lon[segment]),
+        )
+
+    @staticmethod
+    def interpolate(
+        samples: RouteSamples, eta: np.ndarray,
+        hourly: Sequence[Sequence[types.HourlyWeather]],
+    ) -> pd.DataFrame:
+        """Погода в точках маршрута на время прибытия
+
+        Args:
+            samples: Точки маршрута (RoutePlanner.sample)
+            eta: Unix time прибытия в каждую точку
+            hourly: Почасовой прогноз для каждого города маршрута
+
+        Returns:
+            pd.DataFrame: Колонки по полям types.Weather (для
+                WeatherModel.check_bad_weather_batch) плюс distance_km,
+                eta, lat, lon, waypoint - индекс ближайшего города и
+                beyond_horizon - время прибытия вне горизонта прогноза
+                (значения взяты с его края)
+        """
+        if any(not forecast for forecast in hourly):
+            raise ValueError("Every waypoint needs a non-empty hourly forecast")
+
+        index = np.arange(len(samples))
+        start, end = samples.segment, samples.segment + 1
+        nearest = np.where(samples.fraction < 0.5, start, end)
+        beyond_horizon = np.zeros(len(samples), dtype=bool)
+
+        # По городам: интерполяция по времени сразу для всех точек,
+        # затем по месту между городами начала и конца участка
+        by_waypoint = {metric: np.empty((len(hourly), len(samples))) for metric in _METRICS}
+        texts = np.empty(len(samples), dtype=object)
+        phrases = np.empty(len(samples), dtype=object)
+        is_precipitation = np.zeros(len(samples), dtype=bool)
+        for waypoint, forecast in enumerate(hourly):
+            times = np.fromiter((item.time for item in forecast), dtype=np.float64, count=len(forecast))
+            for metric, values in by_waypoint.items():
+                values[waypoint] = np.interp(
+                    eta, times,
+                    np.fromiter((getattr(item.weather, metric) for item in forecast), dtype=np.float64, count=len(forecast)),
+                )
+
+            # Текст и факт осадков - как в ближайший город в ближайший час
+            own = nearest == waypoint
+            if own.any():
+                hour = np.clip(np.searchsorted(times, eta[own], side="right") - 1, 0, len(forecast) - 1)
+                texts[own] = np.array([item.weather.weather_text for item in forecast], dtype=object)[hour]
+                phrases[own] = np.array([item.weather.real_feel_temperature_phrase for item in forecast], dtype=object)[hour]
+                is_precipitation[own] = np.array([bool(item.weather.is_precipitation) for item in forecast])[hour]
+                # Прогноз начинается со следующего часа, так что текущий
+                # час ещё считается покрытым
+                beyond_horizon[own] = (eta[own] < times[0] - 3600) | (eta[own] >= times[-1] + 3600)
+
+        columns: dict[str, object] = {
+            "distance_km": samples.distance_km,
+            "eta": pd.to_datetime(eta, unit="s", utc=True),
+            "lat": samples.lat,
+            "lon": samples.lon,
+            "waypoint": nearest,
+            "weather_text": texts,
+            "real_feel_temperature_phrase": phrases,
+            "is_precipitation": is_precipitation,
+            "beyond_horizon": beyond_horizon,
+        }
+        for metric, values in by_waypoint.items():
+            columns[metric] = (
+                (1 - samples.fraction) * values[start, index]
+                + samples.fraction * values[end, index]
+            )
+        return pd.DataFrame(columns)
+
+    async def timeline(
+        self, client: WeatherApiClient, waypoints: Sequence[types.Location],
+        departure: Optional[datetime.datetime]=None,
+        speed_km_h: Optional[float]=None,
+    ) -> pd.DataFrame:
+        """Прогноз в пути: почасовой прогноз по одному разу на город и
+        интерполяция в точки маршрута (см. interpolate)
+
+        Args:
+            client: Клиент погоды
+            waypoints: Города маршрута по порядку
+            departure: Время отправления (по умолчанию - сейчас)
+            speed_km_h: Средняя скорость, км/ч (по умолчанию speed_km_h)
+
+        Raises:
+            QuotaExceededError
+            RuntimeError
+            ValueError
+        """
+        speed_km_h = speed_km_h if speed_km_h is not None else self.speed_km_h
+        if speed_km_h <= 0:
+            raise ValueError("speed_km_h must be > 0")
+        departure = departure if departure is not None else datetime.datetime.now(datetime.timezone.utc)
+
+        samples = self.sample(waypoints)
+        eta = departure.timestamp() + samples.distance_km / speed_km_h * 3600
+        hourly = await asyncio.gather(*(client.get_hourly_forecast(location) for location in waypoints))
+        return self.interpolate(samples, eta, hourly)
@@ -0,0 +1,235 @@
+"""Правила плохой погоды из config.toml
+
+Секция [weather_rules] задаёт пороги и ключевые слова, подсекции
+[weather_rules.regions.<название>] переопределяют любые из них для
+прямоугольника координат (lat = [min, max], lon = [min, max]). Правила
+компилируются один раз в RuleSet с готовыми регулярными выражениями и
+перекомпилируются только при изменении config.toml
+"""
+from __future__ import annotations
+from typing import Any, Iterable, Optional
+import dataclasses
+import re
+import threading
+
+import numpy as np
+import pandas as pd
+
+from src.misc import types
+from src.misc.config import Config
+
+
+# Коды правил, по которым погода считается плохой
+REASON_TEMPERATURE = "temperature"
+REASON_WIND = "wind"
+REASON_STORM = "storm"
+REASON_PRECIPITATION = "precipitation"
+REASON_FEEL = "feel"
+REASONS = (REASON_TEMPERATURE, REASON_WIND, REASON_STORM, REASON_PRECIPITATION, REASON_FEEL)
+
+DEFAULT_RULES: dict[str, Any] = {
+    "temperature_min": 0.0,
+    "temperature_max": 35.0,
+    "wind_speed_max": 50.0,
+    "precipitation_mm_max": 5.0,
+    "bad_weather_keywords": ["гром", "шторм", "град"],
+    "bad_feel_keywords": ["очень", "сыро"],
+}
+
+
+def _compile_keywords(keywords: Iterable[str]) -> Optional[re.Pattern[str]]:
+    keywords = [keyword.lower() for keyword in keywords if keyword]
+    if not keywords:
+        return None
+    return re.compile("|".join(map(re.escape, keywords)))
+
+
+@dataclasses.dataclass(frozen=True)
+class RuleSet:
+    """Скомпилированный набор правил"""
+    temperature_min: float
+    """Нормальная температура: temperature_min <= t < temperature_max"""
+    temperature_max: float
+    wind_speed_max: float
+    """Measured in km/h"""
+    precipitation_mm_max: float
+    """Measured in mm"""
+    bad_weather_pattern: Optional[re.Pattern[str]]
+    """Ищется в weather_text в нижнем регистре"""
+    bad_feel_pattern: Optional[re.Pattern[str]]
+    """Ищется в real_feel_temperature_phrase в нижнем регистре"""
+
+    @staticmethod
+    def compile(rules: dict[str, Any]) -> RuleSet:
+        unknown = set(rules) - set(DEFAULT_RULES)
+        if unknown:
+            raise ValueError(f"Unknown weather rule options: {', '.join(sorted(unknown))}")
+        return RuleSet(
+            temperature_min=float(rules["temperature_min"]),
+            temperature_max=float(rules["temperature_max"]),
+            wind_speed_max=float(rules["wind_speed_max"]),
+            precipitation_mm_max=float(rules["precipitation_mm_max"]),
+            bad_weather_pattern=_compile_keywords(rules["bad_weather_keywords"]),
+            bad_feel_pattern=_compile_keywords(rules["bad_feel_keywords"]),
+        )
+
+    def is_bad(self, weather: types.Weather) -> bool:
+        """То же, что bool(evaluate(weather)), но с выходом на первом
+        сработавшем правиле
+        """
+        return (
+            not self.temperature_min <= weather.temperature_c < self.temperature_max
+            or weather.wind_speed_km_h > self.wind_speed_max
+            or (self.bad_weather_pattern is not None
+                and self.bad_weather_pattern.search(weather.weather_text.lower()) is not None)
+            or (weather.is_precipitation and weather.precipitation_metric_mm > self.precipitation_mm_max)
+            or (self.bad_feel_pattern is not None
+                and self.bad_feel_pattern.search(weather.real_feel_temperature_phrase.lower()) is not None)
+        )
+
+    def evaluate(self, weather: types.Weather) -> list[str]:
+        """Коды всех сработавших правил (см. REASONS)"""
+        reasons: list[str] = []
+
+        # очень жарко или холодно
+        if not self.temperature_min <= weather.temperature_c < self.temperature_max:
+            reasons.append(REASON_TEMPERATURE)
+
+        # сильный ветер
+        if weather.wind_speed_km_h > self.wind_speed_max:
+            reasons.append(REASON_WIND)
+
+        # идут неприятные осадки: шторм, град
+        if (self.bad_weather_pattern is not None
+                and self.bad_weather_pattern.search(weather.weather_text.lower())):
+            reasons.append(REASON_STORM)
+
+        # идут осадки и влажно (дождь, снег, но влажно)
+        if weather.is_precipitation and weather.precipitation_metric_mm > self.precipitation_mm_max:
+            reasons.append(REASON_PRECIPITATION)
+
+        if (self.bad_feel_pattern is not None
+                and self.bad_feel_pattern.search(weather.real_feel_temperature_phrase.lower())):
+            reasons.append(REASON_FEEL)
+
+        return reasons
+
+    def evaluate_batch(self, forecasts: pd.DataFrame) -> pd.DataFrame:
+        """Векторная версия evaluate: булевы колонки REASONS по строкам"""
+        temperature = forecasts["temperature_c"].astype("float64")
+        wind_speed = forecasts["wind_speed_km_h"].astype("float64")
+        precipitation = forecasts["precipitation_metric_mm"].astype("float64")
+        is_precipitation = forecasts["is_precipitation"].astype(bool)
+
+        def matches(column: str, pattern: Optional[re.Pattern[str]]) -> pd.Series:
+            if pattern is None:
+                return pd.Series(False, index=forecasts.index)
+            # Шаблон проверяется один раз на каждую различную строку при
+            # любом dtype колонки; код -1 (пропуск) попадает на дописанный
+            # в конец False
+            codes, uniques = pd.factorize(forecasts[column])
+            hits = pd.Series(np.asarray(uniques, dtype=object)).str.lower().str.contains(pattern, na=False)
+            hits = np.append(hits.to_numpy(dtype=bool), False)
+            return pd.Series(hits[codes], index=forecasts.index)
+
+        return pd.DataFrame({
+            # NaN, как и в скалярной версии, считается выходом за диапазон
+            REASON_TEMPERATURE: ~(temperature.ge(self.temperature_min) & temperature.lt(self.temperature_max)),
+            REASON_WIND: wind_speed.gt(self.wind_speed_max),
+            REASON_STORM: matches("weather_text", self.bad_weather_pattern),
+            REASON_PRECIPITATION: is_precipitation & precipitation.gt(self.precipitation_mm_max),
+            REASON_FEEL: matches("real_feel_temperature_phrase", self.bad_feel_pattern),
+        }, index=forecasts.index)
+
+
+@dataclasses.dataclass(frozen=True)
+class _Region:
+    name: str
+    lat_min: float
+    lat_max: float
+    lon_min: float
+    lon_max: float
+    rules: RuleSet
+
+    def contains(self, location: types.Location) -> bool:
+        return (self.lat_min <= location.lat <= self.lat_max
+                and self.lon_min <= location.lon <= self.lon_max)
+
+
+class WeatherRules:
+    """Правила по умолчанию плюс региональные переопределения. Первый
+    подходящий по координатам регион (в порядке config.toml) побеждает
+    """
+
+    _lock = threading.Lock()
+    _instance: Optional[WeatherRules] = None
+    _instance_source: Optional[dict[str, Any]] = None
+
+    def __init__(self, default: RuleSet, regions: Iterable[_Region]=()) -> None:
+        self.default = default
+        self.regions = list(regions)
+
+    @staticmethod
+    def from_config(raw_rules: dict[str, Any]) -> WeatherRules:
+        raw_rules = dict(raw_rules)
+        raw_regions: dict[str, Any] = raw_rules.pop("regions", {})
+
+        default_rules = DEFAULT_RULES | raw_rules
+        regions: list[_Region] = []
+        for name, raw_region in raw_regions.items():
+            raw_region = dict(raw_region)
+            try:
+                lat_min, lat_max = raw_region.pop("lat")
+                lon_min, lon_max = raw_region.pop("lon")
+            except (KeyError, ValueError):
+                raise ValueError(f"Weather rules region {name!r} needs lat = [min, max] and lon = [min, max]")
+            regions.append(_Region(
+                name=name,
+                lat_min=lat_min, lat_max=lat_max,
+                lon_min=lon_min, lon_max=lon_max,
+                rules=RuleSet.compile(default_rules | raw_region),
+            ))
+        return WeatherRules(RuleSet.compile(default_rules), regions)
+
+    @staticmethod
+    def get() -> WeatherRules:
+        """Общие на процесс правила; перекомпилируются при изменении config.toml"""
+        raw_config = Config.load()
+        instance = WeatherRules._instance
+        if instance is not None and WeatherRules._instance_source is raw_config:
+            # Горячий путь проверки погоды: без блокировки
+            return instance
+        with WeatherRules._lock:
+            if (WeatherRules._instance is None
+                    or WeatherRules._instance_source is not raw_config):
+                WeatherRules._instance = WeatherRules.from_config(raw_config.get("weather_rules", {}))
+                WeatherRules._instance_source = raw_config
+            return WeatherRules._instance
+
+    def for_location(self, location: Optional[types.Location]) -> RuleSet:
+        if location is not None:
+            for region in self.regions:
+                if region.contains(location):
+                    return region.rules
+        return self.default
+
+    def evaluate(self, weather: types.Weather, location: Optional[types.Location]=None) -> list[str]:
+        return self.for_location(location).evaluate(weather)
+
+    def evaluate_batch(self, forecasts: pd.DataFrame) -> pd.DataFrame:
+        """Векторная оценка; региональные правила применяются, если во
+        входных данных есть колонки lat и lon
+        """
+        reasons = self.default.evaluate_batch(forecasts)
+        if not self.regions or not {"lat", "lon"} <= set(forecasts.columns):
+            return reasons
+
+        lat = forecasts["lat"].astype("float64")
+        lon = forecasts["lon"].astype("float64")
+        unassigned = pd.Series(True, index=forecasts.index)
+        for region in self.regions:
+            in_region = unassigned & lat.between(region.lat_min, region.lat_max) & lon.between(region.lon_min, region.lon_max)
+            if in_region.any():
+                reasons.loc[in_region] = region.rules.evaluate_batch(forecasts.loc[in_region])
+                unassigned &= ~in_region
+        return reasons
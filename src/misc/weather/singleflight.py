@@ -0,0 +1,38 @@
+from typing import Awaitable, Callable, Hashable, TypeVar
+import asyncio
+
+
+T = TypeVar("T")
+
+
+class SingleFlight:
+    """Склеивает одинаковые одновременные запросы: пока запрос с ключом key
+    выполняется, остальные вызовы с тем же ключом ждут его результат (или
+    исключение) вместо отправки своего запроса. Привязан к одному event loop
+    """
+
+    def __init__(self) -> None:
+        self._in_flight: dict[Hashable, asyncio.Future] = {}
+
+    def __len__(self) -> int:
+        return len(self._in_flight)
+
+    async def do(self, key: Hashable, call: Callable[[], Awaitable[T]]) -> T:
+        """Выполнить call() или присоединиться к уже идущему вызову с тем же key
+
+        Отмена одного из ожидающих не отменяет общий запрос для остальных
+        """
+        task = self._in_flight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(call())
+            self._in_flight[key] = task
+            task.add_done_callback(lambda done: self._forget(key, done))
+        return await asyncio.shield(task)
+
+    def _forget(self, key: Hashable, task: asyncio.Future) -> None:
+        if self._in_flight.get(key) is task:
+            del self._in_flight[key]
+        if not task.cancelled():
+            # Помечаем исключение как полученное, даже если все ожидающие
+            # уже отменены
+            task.exception()
@@ -0,0 +1,185 @@
+from __future__ import annotations
+from array import array
+from typing import Iterable, Optional
+import math
+import threading
+
+from src.misc import types
+from src.misc.config import Config
+from src.misc.weather.cities import CityRegistry
+
+
+EARTH_RADIUS_KM = 6371.0088
+_KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+
+
+def haversine_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """Расстояние по большому кругу между двумя точками, км"""
+    phi1 = math.radians(lat1)
+    phi2 = math.radians(lat2)
+    d_phi = phi2 - phi1
+    d_lambda = math.radians(lon2 - lon1)
+    a = (math.sin(d_phi / 2) ** 2
+         + math.cos(phi1) * math.cos(phi2) * math.sin(d_lambda / 2) ** 2)
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+class SpatialIndex:
+    """Сеточный индекс точек на сфере: ячейки cell_size_deg x cell_size_deg
+    градусов, точки хранятся в плотных массивах широт и долгот. Запрос по
+    радиусу просматривает только ячейки, покрывающие радиус, k ближайших
+    ищутся расширяющимся радиусом
+    """
+
+    def __init__(self, cell_size_deg: float=0.25) -> None:
+        if not 0 < cell_size_deg <= 180:
+            raise ValueError("cell_size_deg must be in (0, 180]")
+        self.cell_size_deg = cell_size_deg
+        self._lon_cells = math.ceil(360 / cell_size_deg)
+        self._lats = array("d")
+        self._lons = array("d")
+        self._cells: dict[tuple[int, int], list[int]] = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_locations(cls, locations: Iterable[types.Location], cell_size_deg: float=0.25) -> SpatialIndex:
+        index = cls(cell_size_deg=cell_size_deg)
+        for location in locations:
+            index.add(location)
+        return index
+
+    def __len__(self) -> int:
+        return len(self._lats)
+
+    def _cell(self, lat: float, lon: float) -> tuple[int, int]:
+        return (
+            math.floor((lat + 90) / self.cell_size_deg),
+            math.floor((lon + 180) / self.cell_size_deg) % self._lon_cells,
+        )
+
+    def location(self, i: int) -> types.Location:
+        return types.Location(lat=self._lats[i], lon=self._lons[i])
+
+    def add(self, location: types.Location) -> int:
+        """Добавить точку, вернуть её номер в индексе"""
+        with self._lock:
+            i = len(self._lats)
+            self._lats.append(location.lat)
+            self._lons.append(location.lon)
+            self._cells.setdefault(self._cell(location.lat, location.lon), []).append(i)
+            return i
+
+    def _cells_within(self, lat: float, lon: float, radius_km: float) -> Iterable[tuple[int, int]]:
+        d_lat = radius_km / _KM_PER_DEGREE
+        lat_min = max(-90.0, lat - d_lat)
+        lat_max = min(90.0, lat + d_lat)
+        row_min, _ = self._cell(lat_min, 0)
+        row_max, _ = self._cell(lat_max, 0)
+
+        cos_lat = math.cos(math.radians(max(abs(lat_min), abs(lat_max))))
+        if cos_lat <= 1e-9 or d_lat / cos_lat >= 180:
+            columns: Iterable[int] = range(self._lon_cells)
+        else:
+            d_lon = d_lat / cos_lat
+            column_min = math.floor((lon - d_lon + 180) / self.cell_size_deg)
+            column_max = math.floor((lon + d_lon + 180) / self.cell_size_deg)
+            if column_max - column_min + 1 >= self._lon_cells:
+                columns = range(self._lon_cells)
+            else:
+                columns = [column % self._lon_cells for column in range(column_min, column_max + 1)]
+
+        for row in range(row_min, row_max + 1):
+            for column in columns:
+                yield (row, column)
+
+    def within_radius(self, location: types.Location, radius_km: float) -> list[tuple[float, int]]:
+        """Все точки не дальше radius_km: список (расстояние км, номер точки)
+        по возрастанию расстояния
+        """
+        found: list[tuple[float, int]] = []
+        lats, lons = self._lats, self._lons
+        for cell in self._cells_within(location.lat, location.lon, radius_km):
+            for i in self._cells.get(cell, ()):
+                distance = haversine_km(location.lat, location.lon, lats[i], lons[i])
+                if distance <= radius_km:
+                    found.append((distance, i))
+        found.sort()
+        return found
+
+    def nearest(
+        self, location: types.Location, k: int=1, max_radius_km: Optional[float]=None,
+    ) -> list[tuple[float, int]]:
+        """k ближайших точек (не дальше max_radius_km, если задан)"""
+        if k < 1 or not len(self):
+            return []
+        limit = max_radius_km if max_radius_km is not None else math.pi * EARTH_RADIUS_KM
+        radius_km = min(limit, self.cell_size_deg * _KM_PER_DEGREE)
+        while True:
+            found = self.within_radius(location, radius_km)
+            if len(found) >= k or radius_km >= limit:
+                return found[:k]
+            radius_km = min(limit, radius_km * 2)
+
+    def snap(self, location: types.Location, radius_km: float) -> Optional[types.Location]:
+        """Ближайшая известная точка в пределах radius_km или None"""
+        found = self.nearest(location, k=1, max_radius_km=radius_km)
+        if not found:
+            return None
+        return self.location(found[0][1])
+
+
+class LocationSnapper:
+    """Приводит координаты запроса к канонической ближайшей известной точке
+    в пределах snap_radius_km, чтобы близкие пользователи делили кэш.
+    Неизвестные точки запоминаются (до max_learned_points) и сами становятся
+    каноническими для своих соседей. Потокобезопасен: общий для loop API
+    и потоков сайта
+    """
+
+    def __init__(
+        self, index: SpatialIndex, snap_radius_km: float=2.0,
+        max_learned_points: int=100_000,
+    ) -> None:
+        self.index = index
+        self.snap_radius_km = snap_radius_km
+        self.max_learned_points = max_learned_points
+        self._learned = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, locations: Iterable[types.Location]) -> LocationSnapper:
+        """Создать по секции [spatial_index] из config.toml"""
+        config = Config.section("spatial_index")
+        index = SpatialIndex.from_locations(
+            locations, cell_size_deg=config.pop("cell_size_deg", 0.25),
+        )
+        return cls(index, **config)
+
+    def snap(self, location: types.Location) -> types.Location:
+        if self.snap_radius_km <= 0:
+            return location
+        # Поиск и запоминание под одним замком: индекс не меняется во время
+        # поиска, а одна и та же новая точка не запоминается дважды
+        with self._lock:
+            snapped = self.index.snap(location, self.snap_radius_km)
+            if snapped is not None:
+                return snapped
+            if self._learned < self.max_learned_points:
+                self._learned += 1
+                self.index.add(location)
+            return location
+
+
+_shared_snapper: Optional[LocationSnapper] = None
+_shared_snapper_lock = threading.Lock()
+
+
+def get_shared_snapper() -> LocationSnapper:
+    """Общий на процесс снаппер, засеянный городами из config.toml"""
+    global _shared_snapper
+    with _shared_snapper_lock:
+        if _shared_snapper is None:
+            _shared_snapper = LocationSnapper.from_config(
+                location for _, location in CityRegistry.get().items()
+            )
+        return _shared_snapper
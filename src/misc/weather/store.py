@@ -0,0 +1,145 @@
+from __future__ import annotations
+from typing import Optional
+import dataclasses
+import json
+import pathlib
+import sqlite3
+import threading
+import time
+
+from src.misc import types
+from src.misc.config import Config
+
+
+class ForecastStore:
+    """Персистентное хранилище последних ответов AccuWeather в SQLite (WAL)
+    по виду запроса и координатам. Переживает рестарт и общее для всех
+    процессов на машине: позволяет не ходить в API при холодном старте и
+    отдавать устаревшие данные, когда AccuWeather недоступен
+
+    Методы блокирующие - из event loop вызывать через asyncio.to_thread
+    """
+
+    PURGE_INTERVAL = 3600.0
+
+    def __init__(
+        self, path: pathlib.Path | str,
+        max_stale_age: float=24 * 3600.0,
+        stale_while_revalidate: bool=False,
+        revalidate_window: float=300.0,
+        stale_cache_ttl: float=30.0,
+        precision: int=2,
+    ) -> None:
+        """
+        Args:
+            path: Файл базы
+            max_stale_age: Самые старые данные, которые ещё можно отдать
+                пользователю, если AccuWeather недоступен, секунды
+            stale_while_revalidate: Отдавать только что устаревшие данные
+                сразу и обновлять их в фоне, не дожидаясь AccuWeather
+            revalidate_window: Насколько данные могут быть старше TTL кэша,
+                чтобы их ещё можно было отдать без ожидания AccuWeather,
+                секунды; более старые запрашиваются заново
+            stale_cache_ttl: Сколько держать отданные устаревшие данные в
+                кэше в памяти, секунды: на это время одно фоновое
+                обновление или одна неудачная попытка обслуживают все
+                повторные запросы
+            precision: Число знаков после запятой при округлении координат
+        """
+        self.path = pathlib.Path(path)
+        self.max_stale_age = max_stale_age
+        self.stale_while_revalidate = stale_while_revalidate
+        self.revalidate_window = revalidate_window
+        self.stale_cache_ttl = stale_cache_ttl
+        self.precision = precision
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(
+            self.path, timeout=30.0, isolation_level=None, check_same_thread=False,
+        )
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS forecasts ("
+            " kind TEXT NOT NULL,"
+            " lat REAL NOT NULL,"
+            " lon REAL NOT NULL,"
+            " fetched_at REAL NOT NULL,"
+            " payload TEXT NOT NULL,"
+            " PRIMARY KEY (kind, lat, lon))"
+        )
+        self._connection.execute("CREATE INDEX IF NOT EXISTS forecasts_fetched_at ON forecasts (fetched_at)")
+        self._last_purge = 0.0
+
+    @classmethod
+    def from_config(cls) -> Optional[ForecastStore]:
+        """Хранилище по секции [forecast_store] из config.toml или None, если
+        path не задан
+        """
+        config = Config.section("forecast_store")
+        path = config.pop("path", "")
+        if not path:
+            return None
+        return cls(path=Config.path().parent / path, **config)
+
+    def close(self) -> None:
+        with self._lock:
+            self._connection.close()
+
+    def put(
+        self, kind: str, location: types.Location, weather: list[types.Weather],
+        fetched_at: Optional[float]=None,
+    ) -> None:
+        fetched_at = fetched_at if fetched_at is not None else time.time()
+        payload = json.dumps([dataclasses.asdict(item) for item in weather], ensure_ascii=False)
+        with self._lock:
+            # Из нескольких процессов побеждает самый свежий ответ
+            self._connection.execute(
+                "INSERT INTO forecasts (kind, lat, lon, fetched_at, payload) VALUES (?, ?, ?, ?, ?)"
+                " ON CONFLICT (kind, lat, lon) DO UPDATE"
+                " SET fetched_at = excluded.fetched_at, payload = excluded.payload"
+                " WHERE excluded.fetched_at >= forecasts.fetched_at",
+                (kind, round(location.lat, self.precision), round(location.lon, self.precision), fetched_at, payload),
+            )
+            if fetched_at - self._last_purge >= self.PURGE_INTERVAL:
+                self._connection.execute(
+                    "DELETE FROM forecasts WHERE fetched_at < ?", (fetched_at - self.max_stale_age,),
+                )
+                self._last_purge = fetched_at
+
+    def get(self, kind: str, location: types.Location) -> Optional[tuple[list[types.Weather], float]]:
+        """Последний сохранённый ответ не старше max_stale_age
+
+        Returns:
+            Optional[tuple[
+                list[types.Weather]: Погода
+                float: Возраст данных, секунды
+            ]]
+        """
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT fetched_at, payload FROM forecasts WHERE kind = ? AND lat = ? AND lon = ?",
+                (kind, round(location.lat, self.precision), round(location.lon, self.precision)),
+            ).fetchone()
+        if row is None:
+            return None
+        age = max(0.0, time.time() - row[0])
+        if age > self.max_stale_age:
+            return None
+        return [types.Weather(**item) for item in json.loads(row[1])], age
+
+
+_shared_store: Optional[ForecastStore] = None
+_shared_store_loaded = False
+_shared_store_lock = threading.Lock()
+
+
+def get_shared_store() -> Optional[ForecastStore]:
+    """Общее на процесс хранилище или None, если оно выключено в config.toml"""
+    global _shared_store, _shared_store_loaded
+    with _shared_store_lock:
+        if not _shared_store_loaded:
+            _shared_store = ForecastStore.from_config()
+            _shared_store_loaded = True
+        return _shared_store
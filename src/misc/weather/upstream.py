@@ -0,0 +1,313 @@
+from __future__ import annotations
+from typing import Any, Awaitable, Callable, Optional, TypeVar
+import asyncio
+import math
+import os
+import random
+import re
+import threading
+import time
+
+import accuweather
+import accuweather.exceptions
+import aiohttp
+
+from src.misc import metrics
+from src.misc.config import Config
+
+
+T = TypeVar("T")
+
+ACCUWEATHER_ENDPOINT = "https://dataservice.accuweather.com/"
+
+TRANSIENT_ERRORS: tuple[type[BaseException], ...] = (
+    asyncio.TimeoutError,
+    aiohttp.ClientError,
+)
+"""Сетевые ошибки: таймауты и обрывы соединения"""
+
+_API_ERROR_STATUS = re.compile(r"AccuWeather API: (\d{3})$")
+
+
+def is_transient(error: BaseException) -> bool:
+    """Имеет ли смысл повторить запрос после error: сетевые ошибки и ответы
+    AccuWeather с кодом 5xx. Ответы 4xx (квота, неверный ключ, неизвестная
+    локация) от повтора не изменятся
+
+    Библиотека accuweather поднимает ApiError на любой ответ, кроме 200, 401
+    и исчерпанной квоты, а код ответа есть только в тексте ошибки. ApiError
+    без кода (тело ответа не JSON) обычно приходит от прокси перед
+    AccuWeather и считается временной
+    """
+    if isinstance(error, TRANSIENT_ERRORS):
+        return True
+    if type(error) is accuweather.exceptions.ApiError:
+        match = _API_ERROR_STATUS.search(str(error))
+        return match is None or int(match.group(1)) >= 500
+    return False
+
+
+class UpstreamUnavailableError(RuntimeError):
+    """AccuWeather сейчас недоступен: запрос не выполнялся, чтобы не ждать"""
+
+
+class CircuitOpenError(UpstreamUnavailableError):
+    """Цепь разомкнута после серии ошибок AccuWeather"""
+
+
+class RateLimitedError(UpstreamUnavailableError):
+    """Очередь к AccuWeather длиннее допустимого ожидания"""
+
+
+class TokenBucket:
+    """Потокобезопасный token bucket: не больше rate запросов в секунду в
+    среднем и burst подряд. Общий для всех event loop процесса (сайт и бот)
+
+    Ожидающие не крутятся в цикле: каждый резервирует токен под замком и
+    спит ровно до своей очереди
+    """
+
+    def __init__(self, rate: float, burst: float=1.0) -> None:
+        """
+        Args:
+            rate: Токенов в секунду
+            burst: Ёмкость корзины
+        """
+        if rate <= 0:
+            raise ValueError("rate must be > 0")
+        if burst < 1:
+            raise ValueError("burst must be >= 1")
+
+        self.rate = rate
+        self.burst = burst
+        self._tokens = burst
+        self._updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self, cost: float=1.0, max_wait: Optional[float]=None) -> Optional[float]:
+        """Зарезервировать cost токенов
+
+        Returns:
+            Optional[float]: Сколько секунд подождать перед запросом или
+                None, если ждать пришлось бы дольше max_wait (тогда ничего
+                не резервируется)
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated_at) * self.rate)
+            self._updated_at = now
+
+            wait = max(0.0, (cost - self._tokens) / self.rate)
+            if max_wait is not None and wait > max_wait:
+                return None
+            self._tokens -= cost
+            return wait
+
+    async def acquire(self, cost: float=1.0, max_wait: Optional[float]=None) -> None:
+        """
+        Raises:
+            RateLimitedError
+        """
+        wait = self.reserve(cost, max_wait)
+        if wait is None:
+            raise RateLimitedError("Too many AccuWeather requests queued")
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+
+class CircuitBreaker:
+    """Потокобезопасный circuit breaker: после failure_threshold ошибок
+    подряд запросы отклоняются reset_timeout секунд, затем пропускается
+    один пробный; его успех замыкает цепь, ошибка - снова размыкает
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int=5, reset_timeout: float=30.0) -> None:
+        if failure_threshold < 1:
+            raise ValueError("failure_threshold must be >= 1")
+
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._lock = threading.Lock()
+
+    def before_call(self) -> None:
+        """
+        Raises:
+            CircuitOpenError: Цепь разомкнута или пробный запрос уже идёт
+        """
+        with self._lock:
+            if self.state == self.CLOSED:
+                return
+            now = time.monotonic()
+            retry_in = self._opened_at + self.reset_timeout - now
+            if retry_in <= 0:
+                # Пробный запрос; если он пропал (отмена), через
+                # reset_timeout пропускается следующий
+                self.state = self.HALF_OPEN
+                self._opened_at = now
+                return
+            raise CircuitOpenError(
+                f"AccuWeather API is unavailable, retry in {math.ceil(retry_in)}s"
+            )
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.state = self.CLOSED
+            self._failures = 0
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            if self.state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                self.state = self.OPEN
+                self._opened_at = time.monotonic()
+
+
+class _BaseUrlSession:
+    """Обёртка над aiohttp-сессией, подменяющая адрес AccuWeather (для
+    прокси, зеркала или локального фейкового сервера)
+    """
+
+    def __init__(self, session: aiohttp.ClientSession, base_url: str) -> None:
+        self._session = session
+        self._base_url = base_url.rstrip("/") + "/"
+
+    def _rewrite(self, url: Any) -> Any:
+        url = str(url)
+        if url.startswith(ACCUWEATHER_ENDPOINT):
+            return self._base_url + url[len(ACCUWEATHER_ENDPOINT):]
+        return url
+
+    def get(self, url: Any, *args: Any, **kwargs: Any) -> Any:
+        return self._session.get(self._rewrite(url), *args, **kwargs)
+
+    def request(self, method: str, url: Any, *args: Any, **kwargs: Any) -> Any:
+        return self._session.request(method, self._rewrite(url), *args, **kwargs)
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._session, name)
+
+
+class UpstreamPolicy:
+    """Как ходить в AccuWeather: ограничение частоты, таймаут на попытку,
+    повторы с экспоненциальной задержкой и джиттером для временных ошибок
+    и circuit breaker. Общий на процесс экземпляр - get_shared_upstream()
+    """
+
+    def __init__(
+        self,
+        timeout: float=10.0,
+        retries: int=2,
+        retry_base_delay: float=0.5,
+        retry_max_delay: float=4.0,
+        rate_per_second: float=0.0,
+        burst: float=10.0,
+        max_queue_delay: float=5.0,
+        breaker_failure_threshold: int=5,
+        breaker_reset_timeout: float=30.0,
+        base_url: str="",
+    ) -> None:
+        """
+        Args:
+            timeout: Таймаут одной попытки, секунды
+            retries: Повторов после временной ошибки (0 - без повторов)
+            retry_base_delay: Задержка перед первым повтором, секунды;
+                дальше удваивается, фактическая - случайная от 0 до неё
+            retry_max_delay: Максимальная задержка между повторами, секунды
+            rate_per_second: Не больше стольких запросов к AccuWeather в
+                секунду на процесс (0 - без ограничения)
+            burst: Сколько запросов можно сделать подряд сверх rate
+            max_queue_delay: Дольше этого в очереди лимитера не ждать, а
+                сразу отвечать ошибкой, секунды
+            breaker_failure_threshold: Ошибок подряд до размыкания цепи
+            breaker_reset_timeout: Через сколько секунд пробовать снова
+            base_url: Другой адрес AccuWeather API (пусто - настоящий)
+        """
+        if timeout <= 0:
+            raise ValueError("timeout must be > 0")
+        if retries < 0:
+            raise ValueError("retries must be >= 0")
+
+        self.timeout = timeout
+        self.retries = retries
+        self.retry_base_delay = retry_base_delay
+        self.retry_max_delay = retry_max_delay
+        self.max_queue_delay = max_queue_delay
+        self.base_url = base_url
+        self.limiter = TokenBucket(rate_per_second, burst) if rate_per_second > 0 else None
+        self.breaker = CircuitBreaker(breaker_failure_threshold, breaker_reset_timeout)
+
+    @classmethod
+    def from_config(cls) -> UpstreamPolicy:
+        """Политика по секции [upstream] из config.toml; переменная окружения
+        ACCUWEATHER_BASE_URL, если задана, заменяет base_url
+        """
+        config = Config.section("upstream")
+        base_url = os.getenv("ACCUWEATHER_BASE_URL")
+        if base_url:
+            config["base_url"] = base_url
+        return cls(**config)
+
+    def wrap_session(self, session: aiohttp.ClientSession) -> Any:
+        """Сессия для accuweather.AccuWeather с учётом base_url"""
+        if not self.base_url:
+            return session
+        return _BaseUrlSession(session, self.base_url)
+
+    def retry_delay(self, attempt: int) -> float:
+        """Задержка перед повтором номер attempt (с нуля), full jitter"""
+        return random.uniform(0, min(self.retry_max_delay, self.retry_base_delay * 2 ** attempt))
+
+    async def call(self, call: Callable[[], Awaitable[T]], cost: float=1.0) -> T:
+        """Выполнить запрос к AccuWeather по политике
+
+        Args:
+            call: Запрос; вызывается заново на каждую попытку
+            cost: Сколько HTTP-запросов он делает (для лимитера)
+
+        Raises:
+            CircuitOpenError
+            RateLimitedError
+            ...: Последняя ошибка call
+        """
+        attempt = 0
+        while True:
+            self.breaker.before_call()
+            if self.limiter is not None:
+                await self.limiter.acquire(cost, self.max_queue_delay)
+            try:
+                result = await asyncio.wait_for(call(), timeout=self.timeout)
+            except Exception as e:
+                if not is_transient(e):
+                    # AccuWeather ответил (квота, неверный ключ, 4xx...), он жив
+                    self.breaker.record_success()
+                    raise
+                self.breaker.record_failure()
+                if attempt >= self.retries:
+                    raise
+            else:
+                self.breaker.record_success()
+                return result
+
+            metrics.UPSTREAM_RETRIES.inc()
+            await asyncio.sleep(self.retry_delay(attempt))
+            attempt += 1
+
+
+_shared_upstream: Optional[UpstreamPolicy] = None
+_shared_upstream_lock = threading.Lock()
+
+
+def get_shared_upstream() -> UpstreamPolicy:
+    """Общая на процесс политика: один лимитер и один breaker на сайт и бота"""
+    global _shared_upstream
+    with _shared_upstream_lock:
+        if _shared_upstream is None:
+            _shared_upstream = UpstreamPolicy.from_config()
+        return _shared_upstream
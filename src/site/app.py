@@ -1,14 +1,23 @@
-from typing import Any, Optional
+from typing import Any, Iterator, Optional
+import datetime
+import time
 
 import dash
 from dash import dcc, html, Input, Output, State
-import plotly.graph_objects as go
+import flask
+import plotly.io as pio
+from plotly.io.json import to_json_plotly
 import dash_bootstrap_components as dbc
 
-from src.misc import types
+from src.misc import metrics, types
+from src.misc.config import Config
+from src.misc.weather.api import WeatherApiClient
 from src.misc.weather.cities import Cities
 from src.misc.weather.model import WeatherModel
-from src.site.sync_api import get_weather
+from src.misc.weather.route import RoutePlanner
+from src.site.instrumentation import Instrumentation
+from src.site.memo import RouteMemo
+from src.site.sync_api import get_route_timeline, get_weather_for_locations, iter_weather_for_locations
 
 
 app = dash.Dash(__name__, external_stylesheets=[dbc.themes.BOOTSTRAP])
@@ -16,6 +25,13 @@ app = dash.Dash(__name__, external_stylesheets=[dbc.themes.BOOTSTRAP])
 
 Cities._load_config()
 
+route_memo = RouteMemo.from_config()
+# Города маршрута появляются по мере ответа AccuWeather (Server-Sent Events),
+# а не все разом после самого медленного
+progressive_route = Config.section("site").get("progressive", False)
+route_planner = RoutePlanner.from_config()
+Instrumentation.from_config().register(app.server)
+
 
 app.layout = html.Div([
     html.H1("Погода в любое время года"),
@@ -58,27 +74,36 @@ app.layout = html.Div([
     html.Button("Обновить график", id="update-btn", n_clicks=0),
 
     dcc.Graph(id="weather-graph"),
+    # Данные маршрута на весь горизонт прогноза: график и отчёт по ним
+    # строятся в браузере, так что смена величины или периода не ходит на сервер
+    dcc.Store(id="route-data"),
+    dcc.Store(id="figure-template", data=pio.templates["plotly_white"].to_plotly_json()),
+
+    html.Div(id="weather-text", style={"margin-top": "20px"}),
 
-    html.Div(id="weather-text", style={"margin-top": "20px"})
+    html.H4("Прогноз в пути", style={"margin-top": "20px"}),
+    html.Div([
+        dbc.Col([
+            html.Label("Отправление", style={"padding-right": "20px"}),
+            dcc.Input(id="departure-time", type="text", placeholder="ЧЧ:ММ", debounce=True),
+            html.Div("Время по часам сервера; пусто - сейчас", style={"font-size": "12px", "color": "grey"}),
+        ], width=6),
+        dbc.Col([
+            html.Label("Средняя скорость (км/ч)", style={"padding-right": "20px"}),
+            dcc.Input(id="travel-speed", type="number", min=1, value=route_planner.speed_km_h, debounce=True),
+        ], width=6),
+    ], style={"margin-bottom": "20px"}),
+    html.Button("Прогноз в пути", id="timeline-btn", n_clicks=0),
+    dcc.Graph(id="timeline-graph"),
+    dcc.Store(id="timeline-data"),
 ])
 
-@app.callback(
-    [Output("error-message", "children"), Output("weather-text", "children"), Output("weather-graph", "figure")],
-    [Input("update-btn", "n_clicks")],
-    [State("start-city", "value"),
-     State("end-city", "value"),
-     State("intermediate-cities", "value"),
-     State("graph-type", "value"),
-     State("period-slider", "value")]
-)
-def update_weather_data(
-    _n_clicks: int, start_city: str, end_city: str,
-    raw_intermediate_cities: Optional[str], graph_type: str, days: int,
-) -> tuple[str, Optional[html.Div], go.Figure]:
+def _resolve_route(
+    start_city: Optional[str], end_city: Optional[str], raw_intermediate_cities: Optional[str],
+) -> tuple[str, dict[str, types.Location]]:
+    """Города маршрута по порядку или текст ошибки"""
     if not (start_city and end_city):
-        return "Пожалуйста, введи начальный и конечный город.", None, go.Figure()
-    
-    fig = go.Figure()
+        return "Пожалуйста, введи начальный и конечный город.", {}
     
     start_city = start_city.strip()
     end_city = end_city.strip()
@@ -90,56 +115,447 @@ def update_weather_data(
     for city_name in [start_city] + intermediate_cities + [end_city]:
         city_location = Cities.city_to_location(city=city_name)
         if not city_location:
-            return f"Город \"{city_name}\" отсутствует в словаре config.toml", None, go.Figure()
+            error_message = f"Город \"{city_name}\" отсутствует в словаре config.toml"
+            suggestions = Cities.suggest(city_name)
+            if suggestions:
+                error_message += f". Возможно, имелось в виду: {', '.join(suggestions)}"
+            return error_message, {}
         if city_name in cities_route:
-            return f"Город \"{city_name}\" повторяется", None, go.Figure()
+            return f"Город \"{city_name}\" повторяется", {}
         
         cities_route[city_name] = city_location
+    return "", cities_route
+
+def update_weather_data(
+    _n_clicks: int, start_city: str, end_city: str,
+    raw_intermediate_cities: Optional[str],
+) -> tuple[str, Optional[dict[str, Any]]]:
+    with metrics.CALLBACK_SECONDS.time(callback="update_weather_data", phase="total"):
+        return _update_weather_data(start_city, end_city, raw_intermediate_cities)
+
+def _update_weather_data(
+    start_city: str, end_city: str, raw_intermediate_cities: Optional[str],
+) -> tuple[str, Optional[dict[str, Any]]]:
+    with metrics.CALLBACK_SECONDS.time(callback="update_weather_data", phase="city_lookup"):
+        error_message, cities_route = _resolve_route(start_city, end_city, raw_intermediate_cities)
+    if error_message:
+        return error_message, None
+
+    memo_key = _memo_key(cities_route)
+    rendered = route_memo.get(memo_key)
+    metrics.ROUTE_MEMO_LOOKUPS.inc(result="hit" if rendered is not None else "miss")
+    if rendered is not None:
+        return "", rendered
 
     cities_weather: dict[str, list[types.Weather]] = {}
-    for city_name, city_location in cities_route.items():
-        try:
-            city_weather = get_weather(location=city_location, days=days)
-        except Exception as e:
-            return f"Error: {e}", None, go.Figure()
-        cities_weather[city_name] = city_weather
+    cities_current: dict[str, types.Weather] = {}
+    cities_stale_age: dict[str, float] = {}
+    with metrics.CALLBACK_SECONDS.time(callback="update_weather_data", phase="fetch"):
+        route_weather = get_weather_for_locations(
+            locations=cities_route.values(),
+            days=WeatherApiClient.FORECAST_DAYS,
+            with_current=True,
+        )
+    for city_name, city_result in zip(cities_route.keys(), route_weather):
+        if city_result.error is not None:
+            return f"Error ({city_name}): {city_result.error}", None
+        cities_weather[city_name] = city_result.weather
+        if city_result.current is not None:
+            cities_current[city_name] = city_result.current
+        if city_result.stale_age is not None:
+            cities_stale_age[city_name] = city_result.stale_age
     
-    weather_elements: list[html.Div] = []
-    cities_weather_data: dict[str, dict[str, list[float]]] = {}
-    for i, city_name in enumerate(cities_route.keys()):
-        weather_elements+= [
-            html.Div([
-                html.P(f"{i+1}. {city_name}"),
-                html.Ul([
-                    html.Li([
-                        html.P(f"День {day}: " + ("👎" if WeatherModel.check_bad_weather(weather) else "👍")),
-                        dcc.Markdown(WeatherModel.generate_weather_report_markdown(weather), dangerously_allow_html=True),
-                    ]) for day, weather in enumerate(cities_weather[city_name], start=1)
-                ]),
-            ])
-        ]
-        
-        city_weather_history = {
-            "temperature": [t.temperature_c for t in cities_weather[city_name]],
-            "wind_speed": [t.wind_speed_km_h for t in cities_weather[city_name]],
-            "precipitation": [t.precipitation_metric_mm for t in cities_weather[city_name]],
+    with metrics.CALLBACK_SECONDS.time(callback="update_weather_data", phase="render"):
+        rendered = _route_data(cities_route, cities_weather, cities_current, cities_stale_age)
+    # Устаревшие данные не запоминаем: следующий запрос может получить свежие
+    if not cities_stale_age:
+        route_memo.set(memo_key, rendered)
+    return "", rendered
+
+def _memo_key(cities_route: dict[str, types.Location]) -> tuple[tuple[str, float, float], ...]:
+    # Прогноз всегда запрашивается на весь горизонт вместе с текущим
+    # состоянием (закэшированные запросы на город), а период выбирается в
+    # браузере, поэтому в ключе его нет
+    return tuple((city_name, location.lat, location.lon) for city_name, location in cities_route.items())
+
+_ROUTE_INPUTS = (
+    [Output("error-message", "children"), Output("route-data", "data")],
+    [Input("update-btn", "n_clicks")],
+    [State("start-city", "value"),
+     State("end-city", "value"),
+     State("intermediate-cities", "value")],
+)
+
+if not progressive_route:
+    app.callback(*_ROUTE_INPUTS)(update_weather_data)
+
+def _render_city(
+    i: int, city_name: str, location: types.Location,
+    weather: list[types.Weather], current: Optional[types.Weather], stale_age: Optional[float],
+) -> dict[str, Any]:
+    """Отчёт по городу: заголовок и по элементу на день; список дней
+    обрезается до выбранного периода в браузере, а на период в один день
+    показывается текущее состояние, если оно есть
+    """
+    head = [html.P(f"{i+1}. {city_name}")]
+    if stale_age is not None:
+        head.append(html.P(WeatherModel.generate_stale_notice(stale_age), style={"color": "darkorange"}))
+    report: dict[str, Any] = {
+        "head": head,
+        "days": [_render_day(day, day_weather, location) for day, day_weather in enumerate(weather, start=1)],
+    }
+    if current is not None:
+        report["current"] = [_render_day(1, current, location)]
+    return report
+
+def _render_day(day: int, weather: types.Weather, location: types.Location) -> html.Li:
+    return html.Li([
+        html.P(f"День {day}: " + ("👎" if WeatherModel.check_bad_weather(weather, location) else "👍")),
+        dcc.Markdown(WeatherModel.generate_weather_report_markdown(weather), dangerously_allow_html=True),
+    ])
+
+def _render_city_pending(i: int, city_name: str) -> dict[str, Any]:
+    return {
+        "head": [html.P(f"{i+1}. {city_name}"), html.P("Загрузка прогноза...", style={"color": "grey"})],
+        "days": [],
+    }
+
+def _render_city_error(i: int, city_name: str, error: BaseException) -> dict[str, Any]:
+    return {
+        "head": [html.P(f"{i+1}. {city_name}"), html.P(f"Error: {error}", style={"color": "red"})],
+        "days": [],
+    }
+
+def _route_data(
+    cities_route: dict[str, types.Location],
+    cities_weather: dict[str, list[types.Weather]],
+    cities_current: dict[str, types.Weather],
+    cities_stale_age: dict[str, float],
+) -> dict[str, Any]:
+    """Колонки величин и отчёты по городам для построения графика и
+    отчёта в браузере
+    """
+    return {
+        "cities": [
+            _city_series(city_name, weather, cities_current.get(city_name))
+            for city_name, weather in cities_weather.items()
+        ],
+        "reports": [
+            _render_city(
+                i, city_name, cities_route[city_name], cities_weather[city_name],
+                cities_current.get(city_name), cities_stale_age.get(city_name),
+            )
+            for i, city_name in enumerate(cities_route.keys())
+        ],
+    }
+
+def _city_series(
+    city_name: str, weather: list[types.Weather], current: Optional[types.Weather],
+) -> dict[str, Any]:
+    series: dict[str, Any] = {
+        "name": city_name,
+        "temperature": [t.temperature_c for t in weather],
+        "wind_speed": [t.wind_speed_km_h for t in weather],
+        "precipitation": [t.precipitation_metric_mm for t in weather],
+    }
+    if current is not None:
+        series["current"] = {
+            "temperature": current.temperature_c,
+            "wind_speed": current.wind_speed_km_h,
+            "precipitation": current.precipitation_metric_mm,
         }
-        cities_weather_data[city_name] = city_weather_history
-    
-    for i, (city_name, city_weather_history) in enumerate(cities_weather_data.items()):
-        y_data = city_weather_history.get(graph_type, [])[:days]
-        fig.add_trace(go.Scatter(
-            x=list(range(1, days + 1)),
-            y=y_data,
-            mode="lines+markers",
-            name=f"{city_name}",
-        ))
-
-    fig.update_layout(
-        title=f"Данные погоды метрики {graph_type.capitalize()}",
-        xaxis_title="Дни",
-        yaxis_title=graph_type.capitalize(),
-        template="plotly_white",
+    return series
+
+ROUTE_STREAM_PATH = "/route-stream"
+
+def _sse(event: str, data: Any) -> str:
+    return f"event: {event}\ndata: {to_json_plotly(data)}\n\n"
+
+def _stream_route(
+    start_city: str, end_city: str, raw_intermediate_cities: Optional[str],
+) -> Iterator[str]:
+    """События маршрута: route (города и заглушки), city на каждый город по
+    мере готовности, failure при ошибке маршрута и done в конце. Маршрут из
+    route_memo приходит целиком одним событием result
+    """
+    started = time.perf_counter()
+    error_message, cities_route = _resolve_route(start_city, end_city, raw_intermediate_cities)
+    if error_message:
+        yield _sse("failure", {"message": error_message})
+        return
+
+    memo_key = _memo_key(cities_route)
+    rendered = route_memo.get(memo_key)
+    metrics.ROUTE_MEMO_LOOKUPS.inc(result="hit" if rendered is not None else "miss")
+    if rendered is not None:
+        yield _sse("result", rendered)
+        metrics.CALLBACK_SECONDS.observe(time.perf_counter() - started, callback="route_stream", phase="total")
+        yield _sse("done", {})
+        return
+
+    names = list(cities_route.keys())
+    series: list[dict[str, Any]] = [{"name": city_name} for city_name in names]
+    reports: list[dict[str, Any]] = [{}] * len(names)
+    complete = True
+    yield _sse("route", {
+        "cities": names,
+        "placeholders": [_render_city_pending(i, city_name) for i, city_name in enumerate(names)],
+    })
+
+    first = True
+    for i, city_result in iter_weather_for_locations(
+        locations=cities_route.values(), days=WeatherApiClient.FORECAST_DAYS, with_current=True,
+    ):
+        city_name = names[i]
+        event: dict[str, Any] = {"index": i, "series": {"name": city_name}}
+        if city_result.error is not None:
+            event["report"] = _render_city_error(i, city_name, city_result.error)
+            event["error"] = f"Error ({city_name}): {city_result.error}"
+        else:
+            event["report"] = _render_city(
+                i, city_name, city_result.location, city_result.weather, city_result.current, city_result.stale_age,
+            )
+            event["series"] = _city_series(city_name, city_result.weather, city_result.current)
+        # Ошибки и устаревшие данные не запоминаем, как и в update_weather_data
+        complete &= city_result.error is None and city_result.stale_age is None
+        series[i], reports[i] = event["series"], event["report"]
+        if first:
+            metrics.CALLBACK_SECONDS.observe(
+                time.perf_counter() - started, callback="route_stream", phase="first_city",
+            )
+            first = False
+        yield _sse("city", event)
+
+    if complete:
+        route_memo.set(memo_key, {"cities": series, "reports": reports})
+    metrics.CALLBACK_SECONDS.observe(time.perf_counter() - started, callback="route_stream", phase="total")
+    yield _sse("done", {})
+
+@app.server.route(ROUTE_STREAM_PATH)
+def route_stream() -> flask.Response:
+    args = flask.request.args
+    return flask.Response(
+        flask.stream_with_context(_stream_route(
+            args.get("start", ""), args.get("end", ""), args.get("intermediate", ""),
+        )),
+        mimetype="text/event-stream",
+        # Без буферизации в nginx и без кэширования
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+if progressive_route:
+    # Сразу сбрасываем вывод и открываем поток событий; города приходят
+    # через set_props, уже показанные остаются на своих местах
+    app.clientside_callback(
+        """
+        function(nClicks, startCity, endCity, intermediateCities) {
+            const dc = window.dash_clientside;
+            if (window.routeStream) {
+                window.routeStream.close();
+            }
+            const params = new URLSearchParams({
+                start: startCity || "",
+                end: endCity || "",
+                intermediate: intermediateCities || "",
+            });
+            const source = new EventSource("%s?" + params.toString());
+            window.routeStream = source;
+
+            let cities = [];
+            let reports = [];
+            source.addEventListener("route", function(event) {
+                const route = JSON.parse(event.data);
+                cities = route.cities.map(function(name) { return {name: name}; });
+                reports = route.placeholders;
+                dc.set_props("route-data", {data: {cities: cities.slice(), reports: reports.slice()}});
+            });
+            source.addEventListener("result", function(event) {
+                dc.set_props("route-data", {data: JSON.parse(event.data)});
+            });
+            source.addEventListener("city", function(event) {
+                const city = JSON.parse(event.data);
+                cities[city.index] = city.series;
+                reports[city.index] = city.report;
+                dc.set_props("route-data", {data: {cities: cities.slice(), reports: reports.slice()}});
+                if (city.error) {
+                    dc.set_props("error-message", {children: city.error});
+                }
+            });
+            source.addEventListener("failure", function(event) {
+                dc.set_props("error-message", {children: JSON.parse(event.data).message});
+                source.close();
+            });
+            source.addEventListener("done", function() { source.close(); });
+            // Без этого EventSource переподключается и запрашивает маршрут заново
+            source.onerror = function() { source.close(); };
+            return ["", null];
+        }
+        """ % app.get_relative_path(ROUTE_STREAM_PATH),
+        *_ROUTE_INPUTS,
     )
 
-    return "", html.Div(weather_elements), fig
+app.clientside_callback(
+    """
+    function(routeData, graphType, days, template) {
+        if (!routeData) {
+            return {data: [], layout: {template: template}};
+        }
+        const traces = routeData.cities.map(function(city) {
+            // Один день - текущее состояние, если оно не из прогноза
+            const y = days === 1 && city.current
+                ? [city.current[graphType]]
+                : (city[graphType] || []).slice(0, days);
+            return {
+                type: "scatter",
+                x: y.map(function(_, i) { return i + 1; }),
+                y: y,
+                mode: "lines+markers",
+                name: city.name,
+            };
+        });
+        const title = graphType.charAt(0).toUpperCase() + graphType.slice(1);
+        return {
+            data: traces,
+            layout: {
+                title: {text: "Данные погоды метрики " + title},
+                xaxis: {title: {text: "Дни"}},
+                yaxis: {title: {text: title}},
+                template: template,
+            },
+        };
+    }
+    """,
+    Output("weather-graph", "figure"),
+    [Input("route-data", "data"),
+     Input("graph-type", "value"),
+     Input("period-slider", "value")],
+    [State("figure-template", "data")],
+)
+
+app.clientside_callback(
+    """
+    function(routeData, days) {
+        if (!routeData) {
+            return null;
+        }
+        return routeData.reports.map(function(report) {
+            const children = report.head.slice();
+            const items = days === 1 && report.current ? report.current : report.days.slice(0, days);
+            if (items.length) {
+                children.push({
+                    namespace: "dash_html_components",
+                    type: "Ul",
+                    props: {children: items},
+                });
+            }
+            return {namespace: "dash_html_components", type: "Div", props: {children: children}};
+        });
+    }
+    """,
+    Output("weather-text", "children"),
+    [Input("route-data", "data"),
+     Input("period-slider", "value")],
+)
+
+@app.callback(
+    [Output("error-message", "children", allow_duplicate=True), Output("timeline-data", "data")],
+    [Input("timeline-btn", "n_clicks")],
+    [State("start-city", "value"),
+     State("end-city", "value"),
+     State("intermediate-cities", "value"),
+     State("departure-time", "value"),
+     State("travel-speed", "value")],
+    prevent_initial_call=True,
+)
+def update_route_timeline(
+    _n_clicks: int, start_city: str, end_city: str,
+    raw_intermediate_cities: Optional[str], raw_departure: Optional[str], speed_km_h: Optional[float],
+) -> tuple[str, Optional[dict[str, Any]]]:
+    with metrics.CALLBACK_SECONDS.time(callback="update_route_timeline", phase="total"):
+        return _update_route_timeline(
+            start_city, end_city, raw_intermediate_cities, raw_departure, speed_km_h,
+        )
+
+def _update_route_timeline(
+    start_city: str, end_city: str, raw_intermediate_cities: Optional[str],
+    raw_departure: Optional[str], speed_km_h: Optional[float],
+) -> tuple[str, Optional[dict[str, Any]]]:
+    with metrics.CALLBACK_SECONDS.time(callback="update_route_timeline", phase="city_lookup"):
+        error_message, cities_route = _resolve_route(start_city, end_city, raw_intermediate_cities)
+    if error_message:
+        return error_message, None
+
+    now = datetime.datetime.now().astimezone()
+    departure = now
+    if raw_departure and raw_departure.strip():
+        try:
+            departure_time = datetime.datetime.strptime(raw_departure.strip(), "%H:%M").time()
+        except ValueError:
+            return "Время отправления нужно ввести как ЧЧ:ММ, например 08:30", None
+        departure = datetime.datetime.combine(now.date(), departure_time, tzinfo=now.tzinfo)
+        if departure < now - datetime.timedelta(minutes=1):
+            departure += datetime.timedelta(days=1)
+
+    try:
+        with metrics.CALLBACK_SECONDS.time(callback="update_route_timeline", phase="fetch"):
+            timeline = get_route_timeline(
+                waypoints=list(cities_route.values()),
+                departure=departure,
+                speed_km_h=speed_km_h if speed_km_h else None,
+            )
+    except Exception as e:
+        return f"Error: {e}", None
+
+    with metrics.CALLBACK_SECONDS.time(callback="update_route_timeline", phase="model"):
+        bad, _ = WeatherModel.check_bad_weather_batch(timeline)
+    with metrics.CALLBACK_SECONDS.time(callback="update_route_timeline", phase="render"):
+        names = list(cities_route.keys())
+        return "", {
+            "eta": timeline["eta"].dt.tz_convert(now.tzinfo).dt.strftime("%Y-%m-%d %H:%M").tolist(),
+            "place": [
+                f"{distance:.0f} км, {names[waypoint]}"
+                for distance, waypoint in zip(timeline["distance_km"], timeline["waypoint"])
+            ],
+            "temperature": timeline["temperature_c"].round(1).tolist(),
+            "wind_speed": timeline["wind_speed_km_h"].round(1).tolist(),
+            "precipitation": timeline["precipitation_metric_mm"].round(2).tolist(),
+            "bad": bad.tolist(),
+            "beyond_horizon": bool(timeline["beyond_horizon"].any()),
+        }
+
+app.clientside_callback(
+    """
+    function(timeline, graphType, template) {
+        if (!timeline) {
+            return {data: [], layout: {template: template}};
+        }
+        const title = graphType.charAt(0).toUpperCase() + graphType.slice(1);
+        let heading = "Прогноз в пути: " + title;
+        if (timeline.beyond_horizon) {
+            heading += " (часть пути за горизонтом прогноза)";
+        }
+        return {
+            data: [{
+                type: "scatter",
+                x: timeline.eta,
+                y: timeline[graphType],
+                text: timeline.place,
+                mode: "lines+markers",
+                name: title,
+                marker: {color: timeline.bad.map(function(bad) { return bad ? "crimson" : "seagreen"; })},
+                hovertemplate: "%{x}<br>%{text}<br>%{y}<extra></extra>",
+            }],
+            layout: {
+                title: {text: heading},
+                xaxis: {title: {text: "Время прибытия"}},
+                yaxis: {title: {text: title}},
+                template: template,
+            },
+        };
+    }
+    """,
+    Output("timeline-graph", "figure"),
+    [Input("timeline-data", "data"),
+     Input("graph-type", "value")],
+    [State("figure-template", "data")],
+)
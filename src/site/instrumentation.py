@@ -0,0 +1,117 @@
+from __future__ import annotations
+from typing import Any, Optional
+import cProfile
+import pathlib
+import pstats
+import threading
+import time
+
+import flask
+
+from src.misc import metrics
+from src.misc.config import Config
+
+
+class Instrumentation:
+    """Маршрут /metrics и профилирование отдельных запросов к Flask-серверу
+    Dash. Профилируется запрос с заголовком X-Profile: 1 (или параметром
+    ?profile=1), если профилирование включено в [metrics]; результат
+    пишется в profile_dir, а сводка - в заголовок X-Profile-Summary
+    """
+
+    PROFILE_HEADER = "X-Profile"
+    SUMMARY_HEADER = "X-Profile-Summary"
+    SUMMARY_LINES = 5
+
+    def __init__(
+        self,
+        enabled: bool=True,
+        path: str="/metrics",
+        profiling: bool=False,
+        profile_dir: Optional[pathlib.Path]=None,
+    ) -> None:
+        """
+        Args:
+            enabled: Отдавать метрики по path
+            path: Адрес страницы метрик
+            profiling: Разрешить профилирование запросов по заголовку
+            profile_dir: Куда сохранять .prof файлы (None - только сводка)
+        """
+        self.enabled = enabled
+        self.path = path
+        self.profiling = profiling
+        self.profile_dir = profile_dir
+        # cProfile нельзя запускать в двух потоках одновременно
+        self._profile_lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls) -> Instrumentation:
+        """По секции [metrics] из config.toml"""
+        config = Config.section("metrics")
+        profile_dir = config.get("profile_dir", "")
+        return cls(
+            enabled=config.get("enabled", True),
+            path=config.get("path", "/metrics"),
+            profiling=config.get("profiling", False),
+            profile_dir=Config.path().parent / profile_dir if profile_dir else None,
+        )
+
+    def register(self, server: flask.Flask) -> None:
+        if self.enabled:
+            server.add_url_rule(self.path, "metrics", self._render_metrics)
+        if self.profiling:
+            server.before_request(self._start_profile)
+            server.after_request(self._finish_profile)
+            server.teardown_request(self._abort_profile)
+
+    @staticmethod
+    def _render_metrics() -> flask.Response:
+        return flask.Response(metrics.REGISTRY.render(), content_type=metrics.CONTENT_TYPE)
+
+    def _wants_profile(self) -> bool:
+        request = flask.request
+        return (
+            request.headers.get(self.PROFILE_HEADER) == "1"
+            or request.args.get("profile") == "1"
+        )
+
+    def _start_profile(self) -> None:
+        if not self._wants_profile() or not self._profile_lock.acquire(blocking=False):
+            return
+        profiler = cProfile.Profile()
+        flask.g.profiler = profiler
+        profiler.enable()
+
+    def _finish_profile(self, response: flask.Response) -> flask.Response:
+        profiler: Optional[cProfile.Profile] = flask.g.pop("profiler", None)
+        if profiler is None:
+            return response
+        try:
+            profiler.disable()
+        finally:
+            self._profile_lock.release()
+
+        stats = pstats.Stats(profiler)
+        response.headers[self.SUMMARY_HEADER] = self._summary(stats)
+        if self.profile_dir is not None:
+            self.profile_dir.mkdir(parents=True, exist_ok=True)
+            name = flask.request.path.strip("/").replace("/", "_") or "index"
+            stats.dump_stats(self.profile_dir / f"{time.strftime('%Y%m%d-%H%M%S')}-{name}.prof")
+        return response
+
+    def _abort_profile(self, _error: Optional[BaseException]) -> None:
+        """Запрос упал до after_request: освободить профилировщик"""
+        profiler: Optional[cProfile.Profile] = flask.g.pop("profiler", None)
+        if profiler is not None:
+            profiler.disable()
+            self._profile_lock.release()
+
+    def _summary(self, stats: pstats.Stats) -> str:
+        """Самые дорогие по cumulative функции одной строкой заголовка"""
+        stats.sort_stats(pstats.SortKey.CUMULATIVE)
+        entries: list[str] = []
+        raw_stats: dict[Any, Any] = stats.stats  # type: ignore[attr-defined]
+        for (filename, line, function) in stats.fcn_list[:self.SUMMARY_LINES]:  # type: ignore[attr-defined]
+            cumulative = raw_stats[(filename, line, function)][3]
+            entries.append(f"{pathlib.Path(filename).name}:{line}({function})={cumulative:.4f}s")
+        return "; ".join(entries)
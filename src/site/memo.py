@@ -0,0 +1,63 @@
+from __future__ import annotations
+from collections import OrderedDict
+from typing import Any, Hashable, Optional
+import threading
+import time
+
+from src.misc.config import Config
+
+
+class RouteMemo:
+    """Потокобезопасный TTL + LRU кэш отрисованных маршрутов для колбэков
+    Dash: повторный запрос того же маршрута не ходит в клиент погоды и не
+    пересобирает отчёт. Маршрут хранится на весь горизонт прогноза, период
+    выбирается в браузере
+
+    TTL короче TTL кэша прогнозов, чтобы не показывать данные, которые клиент
+    уже обновил бы
+    """
+
+    def __init__(self, max_entries: int=128, ttl: float=60.0) -> None:
+        """
+        Args:
+            max_entries: Сколько маршрутов помнить
+            ttl: Сколько секунд маршрут считается актуальным
+        """
+        if max_entries <= 0:
+            raise ValueError("max_entries must be > 0")
+
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls) -> RouteMemo:
+        """Кэш по секции [site] из config.toml"""
+        config = Config.section("site")
+        return cls(
+            max_entries=config.get("route_memo_size", 128),
+            ttl=config.get("route_memo_ttl", 60.0),
+        )
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at <= now:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: Hashable, value: Any) -> None:
+        if self.ttl <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
@@ -0,0 +1,189 @@
+from __future__ import annotations
+from typing import Any, Callable
+
+import flask
+from loguru import logger
+
+from src.misc.config import Config
+
+
+COMPRESS_MIMETYPES = [
+    "application/json",
+    "application/javascript",
+    "text/javascript",
+    "text/css",
+    "text/html",
+    "text/plain",
+]
+"""Ответы колбэков Dash (JSON), бандлы компонентов и страница"""
+
+
+class ProductionServer:
+    """Сайт в продакшне: gunicorn с gthread-воркерами вместо отладочного
+    сервера Flask, сжатие ответов (brotli или gzip по Accept-Encoding) и
+    долгое кэширование статики
+
+    Кэш прогнозов в памяти у каждого воркера свой, а общий для воркеров -
+    ForecastStore ([forecast_store]): промах кэша воркера читает ответ,
+    полученный другим воркером, не обращаясь к AccuWeather. Прогрев кэша
+    ведёт один воркер (см. [prewarm] lock_path)
+
+    Нужны пакеты gunicorn и flask-compress (с brotli)
+    """
+
+    def __init__(
+        self,
+        bind: str="0.0.0.0:8050",
+        workers: int=4,
+        threads: int=8,
+        timeout: int=60,
+        graceful_timeout: int=30,
+        keepalive: int=5,
+        max_requests: int=0,
+        max_requests_jitter: int=0,
+        compress: bool=True,
+        compress_min_size: int=500,
+        static_max_age: int=365 * 24 * 3600,
+        access_log: bool=False,
+    ) -> None:
+        """
+        Args:
+            bind: Адрес и порт
+            workers: Процессов-воркеров
+            threads: Потоков на воркер (одновременных запросов)
+            timeout: Воркер, молчащий дольше, перезапускается, секунды
+            graceful_timeout: Сколько ждать завершения запросов при остановке, секунды
+            keepalive: Сколько держать keep-alive соединение, секунды
+            max_requests: Перезапускать воркер после стольких запросов (0 - нет)
+            max_requests_jitter: Случайная добавка к max_requests
+            compress: Сжимать ответы brotli или gzip
+            compress_min_size: Не сжимать ответы меньше, байты
+            static_max_age: Cache-Control max-age для /assets, секунды
+            access_log: Писать access log в stdout
+        """
+        if workers < 1:
+            raise ValueError("workers must be >= 1")
+        if threads < 1:
+            raise ValueError("threads must be >= 1")
+
+        self.bind = bind
+        self.workers = workers
+        self.threads = threads
+        self.timeout = timeout
+        self.graceful_timeout = graceful_timeout
+        self.keepalive = keepalive
+        self.max_requests = max_requests
+        self.max_requests_jitter = max_requests_jitter
+        self.compress = compress
+        self.compress_min_size = compress_min_size
+        self.static_max_age = static_max_age
+        self.access_log = access_log
+
+    @classmethod
+    def from_config(cls) -> ProductionServer:
+        """Сервер по секции [server] из config.toml"""
+        return cls(**Config.section("server"))
+
+    def configure(self, server: flask.Flask) -> None:
+        """Сжатие и кэширование статики для Flask-сервера Dash
+
+        Бандлы компонентов Dash отдаёт с отпечатком версии в URL и сам
+        кэширует их на год; /assets - с ?m=<mtime>, так что им тоже можно
+        долгий max-age
+        """
+        server.config["SEND_FILE_MAX_AGE_DEFAULT"] = self.static_max_age
+        if not self.compress:
+            return
+
+        server.config.update(
+            COMPRESS_ALGORITHM=["br", "gzip"],
+            COMPRESS_MIMETYPES=COMPRESS_MIMETYPES,
+            COMPRESS_MIN_SIZE=self.compress_min_size,
+            # Быстрые уровни: колбэки сжимаются на каждый запрос
+            COMPRESS_BR_LEVEL=4,
+            COMPRESS_LEVEL=6,
+        )
+        _compress_extension()(server)
+
+    def options(self) -> dict[str, Any]:
+        """Настройки gunicorn"""
+        return {
+            "bind": self.bind,
+            "workers": self.workers,
+            "threads": self.threads,
+            "worker_class": "gthread",
+            "timeout": self.timeout,
+            "graceful_timeout": self.graceful_timeout,
+            "keepalive": self.keepalive,
+            "max_requests": self.max_requests,
+            "max_requests_jitter": self.max_requests_jitter,
+            "accesslog": "-" if self.access_log else None,
+            "post_worker_init": _post_worker_init,
+            "worker_exit": _worker_exit,
+        }
+
+    def _load(self) -> flask.Flask:
+        from src import site
+
+        self.configure(site.app.server)
+        return site.app.server
+
+    def run(self) -> None:
+        """Запустить gunicorn и блокироваться до SIGINT/SIGTERM
+
+        Raises:
+            RuntimeError: Не установлен gunicorn или flask-compress
+        """
+        if self.compress:
+            # Проверить до запуска воркеров, а не падать в каждом из них
+            _compress_extension()
+        # Само хранилище здесь не открываем: соединение SQLite не переживает fork
+        if not Config.section("forecast_store").get("path"):
+            logger.warning(
+                "[forecast_store] path is empty: workers won't share forecasts "
+                "and each will query AccuWeather on its own"
+            )
+        _gunicorn_application(self.options(), self._load).run()
+
+
+def _compress_extension() -> Any:
+    try:
+        from flask_compress import Compress
+    except ImportError:
+        raise RuntimeError("Response compression requires flask-compress: pip install flask-compress brotli")
+    return Compress
+
+
+def _post_worker_init(_worker: Any) -> None:
+    from src.site import sync_api
+
+    # Фоновый loop с клиентом погоды - уже после fork, в самом воркере
+    try:
+        sync_api.start()
+    except Exception:
+        logger.exception("Failed to start weather API loop")
+
+
+def _worker_exit(_server: Any, _worker: Any) -> None:
+    from src.site import sync_api
+
+    sync_api.shutdown()
+
+
+def _gunicorn_application(options: dict[str, Any], load: Callable[[], flask.Flask]) -> Any:
+    try:
+        from gunicorn.app.base import BaseApplication
+    except ImportError:
+        raise RuntimeError("Production mode requires gunicorn: pip install gunicorn")
+
+    class Application(BaseApplication):  # type: ignore[misc]
+        def load_config(self) -> None:
+            for key, value in options.items():
+                if value is not None and key in self.cfg.settings:
+                    self.cfg.set(key, value)
+
+        def load(self) -> flask.Flask:
+            return load()
+
+    return Application()
+
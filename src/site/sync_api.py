@@ -1,35 +1,178 @@
+from typing import AsyncIterator, Awaitable, Callable, Iterable, Iterator, Optional, Sequence, TypeVar
 import asyncio
+import datetime
+import queue
+import threading
+
+import pandas as pd
 
 from src.misc.weather import api
+from src.misc.weather.prewarm import PrewarmScheduler
+from src.misc.weather.route import RoutePlanner
 from src.misc import types
 
 from loguru import logger
 
 
-async def _get_weather(location: types.Location, days: int = 1) -> list[types.Weather]:
-    weather_api_client = api.WeatherApiClient(logger=logger)
+T = TypeVar("T")
+
+
+class _WeatherLoop:
+    """Фоновый event loop в отдельном потоке с одним долгоживущим
+    WeatherApiClient и пулом соединений на весь процесс. Потоки Flask
+    отправляют в него корутины и блокируются на результате
+    """
 
-    weather: list[types.Weather]
-    try:
-        if days == 1:
-            weather = [
-                await weather_api_client.get_weather_by_location(
-                    location=location,
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._client: Optional[api.WeatherApiClient] = None
+        self._prewarm: Optional[PrewarmScheduler] = None
+
+    def _ensure_started(self) -> tuple[asyncio.AbstractEventLoop, api.WeatherApiClient]:
+        with self._lock:
+            if self._loop is None or self._client is None:
+                loop = asyncio.new_event_loop()
+                thread = threading.Thread(
+                    target=loop.run_forever,
+                    name="weather-loop",
+                    daemon=True,
                 )
-            ]
-        else:
-            weather = list(
-                (
-                    await weather_api_client.get_weather_by_location_in_period(
-                        location=location,
-                        days=days,
-                    )
-                ).values()
-            )
-    finally:
-        await weather_api_client._client.close()
-
-    return weather
+                thread.start()
+                try:
+                    client = asyncio.run_coroutine_threadsafe(
+                        self._create_client(), loop,
+                    ).result()
+                except BaseException:
+                    loop.call_soon_threadsafe(loop.stop)
+                    thread.join()
+                    loop.close()
+                    raise
+                self._loop, self._thread, self._client = loop, thread, client
+            return self._loop, self._client
+
+    async def _create_client(self) -> api.WeatherApiClient:
+        client = api.WeatherApiClient.from_config(logger=logger)
+        self._prewarm = PrewarmScheduler.from_config(client=client, logger=logger)
+        if self._prewarm is not None:
+            self._prewarm.start()
+        return client
+
+    def start(self) -> None:
+        """Запустить loop заранее (и прогрев кэша, если он включён)"""
+        self._ensure_started()
+
+    def submit(self, call: Callable[[api.WeatherApiClient], Awaitable[T]]) -> T:
+        """Выполнить call(client) на фоновом loop и дождаться результата"""
+        loop, client = self._ensure_started()
+
+        async def run() -> T:
+            return await call(client)
+
+        return asyncio.run_coroutine_threadsafe(run(), loop).result()
+
+    def stream(self, call: Callable[[api.WeatherApiClient], AsyncIterator[T]]) -> Iterator[T]:
+        """Отдавать элементы call(client) с фонового loop по мере готовности.
+        Если итерацию бросили раньше, call отменяется
+        """
+        loop, client = self._ensure_started()
+        items: queue.SimpleQueue[tuple[bool, Optional[T]]] = queue.SimpleQueue()
+
+        async def run() -> None:
+            try:
+                async for item in call(client):
+                    items.put((False, item))
+            finally:
+                items.put((True, None))
+
+        future = asyncio.run_coroutine_threadsafe(run(), loop)
+        try:
+            while True:
+                finished, item = items.get()
+                if finished:
+                    break
+                yield item  # type: ignore[misc]
+            future.result()
+        finally:
+            future.cancel()
+
+    def shutdown(self, timeout: float = 5.0) -> None:
+        """Закрыть сессию и остановить фоновый loop"""
+        with self._lock:
+            loop, thread, client = self._loop, self._thread, self._client
+            self._loop = self._thread = self._client = None
+        if loop is None or thread is None:
+            return
+
+        prewarm, self._prewarm = self._prewarm, None
+        if client is not None:
+            try:
+                if prewarm is not None:
+                    asyncio.run_coroutine_threadsafe(
+                        prewarm.stop(), loop,
+                    ).result(timeout=timeout)
+                asyncio.run_coroutine_threadsafe(
+                    client.close(), loop,
+                ).result(timeout=timeout)
+            except Exception as e:
+                logger.warning(f"Failed to close weather API session: {e}")
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join(timeout=timeout)
+        if not thread.is_alive():
+            loop.close()
+
+
+_weather_loop = _WeatherLoop()
+
 
 def get_weather(location: types.Location, days: int = 1) -> list[types.Weather]:
-    return asyncio.run(_get_weather(location=location, days=days))
+    return _weather_loop.submit(
+        lambda client: client.get_weather(location=location, days=days),
+    )
+
+def get_weather_for_locations(
+    locations: Iterable[types.Location], days: int = 1, max_concurrency: int = 8,
+    with_current: bool = False,
+) -> list[types.WeatherResult]:
+    locations = list(locations)
+    return _weather_loop.submit(
+        lambda client: client.get_weather_for_locations(
+            locations=locations, days=days, max_concurrency=max_concurrency,
+            with_current=with_current,
+        ),
+    )
+
+def iter_weather_for_locations(
+    locations: Iterable[types.Location], days: int = 1, max_concurrency: int = 8,
+    with_current: bool = False,
+) -> Iterator[tuple[int, types.WeatherResult]]:
+    """(индекс, результат) по мере готовности, см.
+    WeatherApiClient.iter_weather_for_locations
+    """
+    locations = list(locations)
+    return _weather_loop.stream(
+        lambda client: client.iter_weather_for_locations(
+            locations=locations, days=days, max_concurrency=max_concurrency,
+            with_current=with_current,
+        ),
+    )
+
+def get_route_timeline(
+    waypoints: Sequence[types.Location],
+    departure: Optional[datetime.datetime] = None,
+    speed_km_h: Optional[float] = None,
+) -> pd.DataFrame:
+    planner = RoutePlanner.from_config()
+    waypoints = list(waypoints)
+    return _weather_loop.submit(
+        lambda client: planner.timeline(
+            client, waypoints, departure=departure, speed_km_h=speed_km_h,
+        ),
+    )
+
+def start() -> None:
+    _weather_loop.start()
+
+def shutdown() -> None:
+    _weather_loop.shutdown()
@@ -0,0 +1,46 @@
+from typing import Any, Awaitable, Callable, Iterator, TypeVar
+import asyncio
+
+import pytest
+from loguru import logger
+
+from benchmarks.fake_accuweather import FakeAccuWeather
+from src.misc.weather.api import WeatherApiClient
+from src.misc.weather.upstream import UpstreamPolicy
+
+
+T = TypeVar("T")
+
+
+@pytest.fixture
+def fake() -> Iterator[FakeAccuWeather]:
+    """Фейковый AccuWeather без задержки; FAULT_TIMEOUT висит 1 секунду"""
+    with FakeAccuWeather(latency=0.0, hang=1.0) as server:
+        yield server
+
+
+@pytest.fixture
+def run_client(
+    fake: FakeAccuWeather, monkeypatch: pytest.MonkeyPatch,
+) -> Callable[..., Any]:
+    """Выполнить сценарий с WeatherApiClient, который ходит в fake по
+    UpstreamPolicy с параметрами из kwargs (быстрые повторы по умолчанию)
+    """
+    monkeypatch.setenv("ACCUWEATHER_API_KEY", "0" * 32)
+
+    def run(
+        scenario: Callable[[WeatherApiClient, UpstreamPolicy], Awaitable[T]], **policy: Any,
+    ) -> T:
+        policy = {"timeout": 0.3, "retry_base_delay": 0.01, "retry_max_delay": 0.02, **policy}
+        upstream = UpstreamPolicy(base_url=fake.base_url, **policy)
+
+        async def main() -> T:
+            client = WeatherApiClient(logger=logger, upstream=upstream)
+            try:
+                return await scenario(client, upstream)
+            finally:
+                await client.close()
+
+        return asyncio.run(main())
+
+    return run
@@ -0,0 +1,70 @@
+import math
+
+import pandas as pd
+import pytest
+
+from src.misc import types
+from src.misc.weather.model import WeatherModel
+from src.misc.weather.rules import REASONS
+
+
+def make_weather(**fields: object) -> types.Weather:
+    defaults: dict[str, object] = {
+        "weather_text": "Ясно",
+        "temperature_c": 20.0,
+        "real_feel_temperature_phrase": "Приятно",
+        "humidity": 50.0,
+        "wind_speed_km_h": 10.0,
+        "precipitation_metric_mm": 0.0,
+        "is_precipitation": False,
+    }
+    return types.Weather(**(defaults | fields))  # type: ignore[arg-type]
+
+
+WEATHER = [
+    make_weather(),
+    make_weather(temperature_c=-5.0),
+    make_weather(temperature_c=math.nan),
+    make_weather(wind_speed_km_h=80.0),
+    make_weather(wind_speed_km_h=math.nan),
+    make_weather(weather_text="Грозовой ШТОРМ"),
+    make_weather(weather_text="Ясно"),
+    make_weather(is_precipitation=True, precipitation_metric_mm=12.0),
+    make_weather(is_precipitation=True, precipitation_metric_mm=math.nan),
+    make_weather(real_feel_temperature_phrase="Очень холодно"),
+    make_weather(weather_text=""),
+]
+
+
+@pytest.mark.parametrize("text_dtype", ["category", object])
+def test_batch_matches_scalar(text_dtype: object) -> None:
+    frame = WeatherModel.weather_to_frame(WEATHER)
+    for column in ("weather_text", "real_feel_temperature_phrase"):
+        frame[column] = frame[column].astype(text_dtype)
+
+    mask, reasons = WeatherModel.check_bad_weather_batch(frame)
+
+    assert mask.tolist() == [WeatherModel.check_bad_weather(weather) for weather in WEATHER]
+    assert [
+        [reason for reason in REASONS if row[reason]] for _, row in reasons.iterrows()
+    ] == [WeatherModel.bad_weather_reasons(weather) for weather in WEATHER]
+
+
+def test_weather_to_frame_uses_categories() -> None:
+    frame = WeatherModel.weather_to_frame(WEATHER)
+
+    assert isinstance(frame["weather_text"].dtype, pd.CategoricalDtype)
+    assert isinstance(frame["real_feel_temperature_phrase"].dtype, pd.CategoricalDtype)
+
+
+@pytest.mark.parametrize("text_dtype", ["category", object])
+def test_batch_treats_missing_text_as_no_match(text_dtype: object) -> None:
+    frame = WeatherModel.weather_to_frame([make_weather(), make_weather()])
+    frame["weather_text"] = pd.Series(["Шторм", None], dtype=text_dtype)
+    frame["real_feel_temperature_phrase"] = pd.Series([None, math.nan], dtype=text_dtype)
+
+    mask, reasons = WeatherModel.check_bad_weather_batch(frame)
+
+    assert mask.tolist() == [True, False]
+    assert reasons["storm"].tolist() == [True, False]
+    assert not reasons["feel"].any()
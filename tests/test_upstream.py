@@ -0,0 +1,116 @@
+from typing import Any, Callable
+import asyncio
+
+import pytest
+
+from benchmarks.fake_accuweather import FakeAccuWeather
+from src.misc.types import Location
+from src.misc.weather.api import QuotaExceededError, WeatherApiClient
+from src.misc.weather.upstream import CircuitBreaker, CircuitOpenError, RateLimitedError, UpstreamPolicy
+
+
+MOSCOW = Location(lat=55.75, lon=37.62)
+
+
+async def get_forecast(client: WeatherApiClient, _upstream: UpstreamPolicy) -> Any:
+    return await client.get_weather(MOSCOW, days=3)
+
+
+def test_retries_server_error_then_succeeds(fake: FakeAccuWeather, run_client: Callable[..., Any]) -> None:
+    fake.fail_next(FakeAccuWeather.FAULT_ERROR, count=2)
+
+    weather = run_client(get_forecast, retries=2)
+
+    assert len(weather) == 3
+    # Две неудачные попытки geoposition, затем geoposition и прогноз
+    assert fake.requests == {"geoposition": 3, "daily": 1}
+
+
+def test_retries_timeout_then_succeeds(fake: FakeAccuWeather, run_client: Callable[..., Any]) -> None:
+    fake.fail_next(FakeAccuWeather.FAULT_TIMEOUT)
+
+    weather = run_client(get_forecast, retries=1, timeout=0.2)
+
+    assert len(weather) == 3
+    assert fake.errors == {"geoposition": 1}
+
+
+def test_gives_up_after_retries(fake: FakeAccuWeather, run_client: Callable[..., Any]) -> None:
+    fake.fail_next(FakeAccuWeather.FAULT_ERROR, count=3)
+
+    with pytest.raises(RuntimeError, match="Error with AccuWeather API"):
+        run_client(get_forecast, retries=2)
+    assert fake.total_requests == 3
+
+
+@pytest.mark.parametrize("fault, error", [
+    (FakeAccuWeather.FAULT_QUOTA, QuotaExceededError),
+    (FakeAccuWeather.FAULT_INVALID_KEY, RuntimeError),
+    (FakeAccuWeather.FAULT_BAD_REQUEST, RuntimeError),
+    (FakeAccuWeather.FAULT_NOT_FOUND, RuntimeError),
+])
+def test_does_not_retry_client_errors(
+    fake: FakeAccuWeather, run_client: Callable[..., Any], fault: str, error: type[Exception],
+) -> None:
+    fake.fail_next(fault)
+
+    async def scenario(client: WeatherApiClient, upstream: UpstreamPolicy) -> str:
+        with pytest.raises(error):
+            await client.get_weather(MOSCOW, days=3)
+        return upstream.breaker.state
+
+    # AccuWeather ответил - он жив, цепь не размыкается
+    assert run_client(scenario, retries=3, breaker_failure_threshold=1) == CircuitBreaker.CLOSED
+    assert fake.total_requests == 1
+
+
+def test_breaker_opens_and_closes_after_cooldown(fake: FakeAccuWeather, run_client: Callable[..., Any]) -> None:
+    fake.fail_next(FakeAccuWeather.FAULT_ERROR, count=3)
+
+    async def scenario(client: WeatherApiClient, upstream: UpstreamPolicy) -> None:
+        for _ in range(3):
+            with pytest.raises(RuntimeError):
+                await client.get_weather(MOSCOW, days=3)
+        assert upstream.breaker.state == CircuitBreaker.OPEN
+
+        # Пока цепь разомкнута, запросы не доходят до AccuWeather
+        with pytest.raises(CircuitOpenError):
+            await client.get_weather(MOSCOW, days=3)
+        assert fake.total_requests == 3
+
+        await asyncio.sleep(0.35)
+        assert len(await client.get_weather(MOSCOW, days=3)) == 3
+        assert upstream.breaker.state == CircuitBreaker.CLOSED
+
+    run_client(scenario, retries=0, breaker_failure_threshold=3, breaker_reset_timeout=0.3)
+
+
+def test_breaker_reopens_when_probe_fails(fake: FakeAccuWeather, run_client: Callable[..., Any]) -> None:
+    fake.fail_next(FakeAccuWeather.FAULT_ERROR, count=2)
+
+    async def scenario(client: WeatherApiClient, upstream: UpstreamPolicy) -> None:
+        with pytest.raises(RuntimeError):
+            await client.get_weather(MOSCOW, days=3)
+        assert upstream.breaker.state == CircuitBreaker.OPEN
+
+        await asyncio.sleep(0.35)
+        # Пробный запрос после паузы снова неудачен - цепь опять разомкнута
+        with pytest.raises(RuntimeError):
+            await client.get_weather(MOSCOW, days=3)
+        assert upstream.breaker.state == CircuitBreaker.OPEN
+        with pytest.raises(CircuitOpenError):
+            await client.get_weather(MOSCOW, days=3)
+        assert fake.total_requests == 2
+
+    run_client(scenario, retries=0, breaker_failure_threshold=1, breaker_reset_timeout=0.3)
+
+
+def test_limiter_fails_fast_when_queue_is_too_long(fake: FakeAccuWeather, run_client: Callable[..., Any]) -> None:
+    async def scenario(client: WeatherApiClient, _upstream: UpstreamPolicy) -> None:
+        # Без ключа локации запрос стоит двух токенов: geoposition и прогноз
+        assert len(await client.get_weather(MOSCOW, days=3)) == 3
+        with pytest.raises(RateLimitedError):
+            await client.get_weather(MOSCOW, days=3)
+
+    run_client(scenario, rate_per_second=1.0, burst=2.0, max_queue_delay=0.05)
+    assert fake.total_requests == 2